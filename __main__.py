@@ -1,27 +1,135 @@
+import argparse
 import logging
-from exchanges import Exchanges
-from imgur import Imgur
-from slack import Slack
-from firestore import FireStore
-from dotenv import load_dotenv
+import os
+import time
 
-load_dotenv()
 logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO, datefmt='%m/%d/%Y %I:%M:%S %p')
 logger = logging.getLogger(__name__)
 
+# Spawned render workers import this file as __mp_main__, so everything the app needs is imported under the guard
 if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    # Loaded before the subsystems below so their module level configuration sees the .env values
+    load_dotenv()
+
+    from metrics import export, span, startup_report, timed
+
+    with timed('import exchanges'):
+        from exchanges import ASYNC_FETCH, EXCHANGE_TIMEOUT, AsyncExchanges, Exchanges
+    with timed('import slack'):
+        from slack import Slack
+    with timed('import firestore'):
+        from firestore import FireStore
+        from firestore.changes import LastSnapshot
+        from firestore.mirror import HistoryMirror
+        from firestore.shards import DAY
+    with timed('import imgur'):
+        from imgur import GRAPH_BREAKDOWN_DAYS, TOTAL, Imgur
+    from pipeline import STAGE_TIMEOUT, Pipeline, Skipped
+
+    parser = argparse.ArgumentParser(prog='crypto-balance-check')
+    parser.add_argument('--no-graph', action='store_true', help='skip rendering and uploading the balance graph')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running and poll, publish, record and graph balances on their own intervals')
+    parser.add_argument('--compact', action='store_true',
+                        help='downsample old balance history according to RETENTION_POLICY and exit')
+    parser.add_argument('--batch', nargs='?', const='', metavar='PORTFOLIOS',
+                        help='run every portfolio in a portfolio config file (default PORTFOLIOS_FILE) and exit')
+    parser.add_argument('--force', action='store_true',
+                        help='publish, record and graph balances even if they have not changed since the last run')
+    args = parser.parse_args()
+
+    if args.compact:
+        FireStore().compact()
+        # The local mirror only appends, rebuild it from the compacted history on the next run
+        HistoryMirror(os.getenv('FIAT_CURRENCY')).reset()
+        raise SystemExit(0)
+
+    if args.batch is not None:
+        from batch import PORTFOLIOS_FILE, Batch, load_portfolios
+        failed = Batch(load_portfolios(args.batch or PORTFOLIOS_FILE), force=args.force).run()
+        logger.info(f'Metrics written to {export()}')
+        raise SystemExit(1 if failed else 0)
+
+    if args.daemon:
+        from daemon import Daemon
+        Daemon(graph=not args.no_graph).run()
+        raise SystemExit(0)
+
     logger.info('Starting crypto-balance-check worker')
 
-    exchanges = Exchanges()
-    slack = Slack()
+    exchanges = AsyncExchanges() if ASYNC_FETCH else Exchanges()
+    with timed('init slack'):
+        slack = Slack()
     firestore = FireStore()
-    imgur = Imgur()
+    history = HistoryMirror(os.getenv('FIAT_CURRENCY'))
+    last_snapshot = LastSnapshot(os.getenv('FIAT_CURRENCY'), firestore)
+
+    def fetch():
+        with span('fetch', exchange='ALL'):
+            return exchanges.get_position_table()
+
+    # Everything downstream waits on this, so quiet runs end here without posting, writing or uploading anything
+    def detect_changes(positions):
+        change = last_snapshot.diff(positions)
+        if not change.significant and not args.force:
+            raise Skipped(f"total moved {change.delta_fiat:+.2f}, below the change thresholds")
+        logger.info(f"Publishing, {change.reason or 'forced'}")
+
+    def publish_summary(positions, _):
+        with span('slack_publish'):
+            slack.publish_all_positions_by_exchange(positions)
+
+    def write_history(positions, _):
+        with span('firestore_write'):
+            point = firestore.update_historic_balances(positions)
+        last_snapshot.save(positions, point[0])
+        return point
+
+    # Only runs that publish read the history, the point written this run is appended locally once it exists
+    def read_history(_):
+        with span('history_read'):
+            history.sync(firestore)
+
+    # Per-exchange graphs are rendered in worker processes, only started once the run is known to publish
+    def start_renderer(_):
+        with timed('init imgur'):
+            imgur = Imgur()
+        if GRAPH_BREAKDOWN_DAYS:
+            imgur.warm()
+        return imgur
+
+    # Rendering and uploading are spanned inside send_graph and send_graphs
+    def send_graphs(imgur, _, point):
+        history.append([point])
+        x, y = history.series_at_resolution(imgur.graph_width())
+        if not GRAPH_BREAKDOWN_DAYS:
+            return {TOTAL: imgur.send_graph(x, y)}
+        timestamps, by_exchange = firestore.get_exchange_histories(int(time.time() - GRAPH_BREAKDOWN_DAYS * DAY))
+        return imgur.send_graphs({TOTAL: (x, y), **{exchange: (timestamps, values)
+                                                    for exchange, values in by_exchange.items()}})
+
+    def publish_graphs(links):
+        with span('slack_publish'):
+            for link in links.values():
+                slack.publish_url(link)
 
-    positions_by_exchange = exchanges.get_all_positions_by_exchange()
-    slack.publish_all_positions_by_exchange(positions_by_exchange)
-    firestore.update_historic_balances(positions_by_exchange)
-    balances = firestore.get_historic_balances()
-    url = imgur.send_graph([b[0] for b in balances], [b[1] for b in balances])
-    slack.publish_url(url)
+    pipeline = Pipeline() \
+        .add('fetch', fetch, timeout=EXCHANGE_TIMEOUT + STAGE_TIMEOUT) \
+        .add('detect changes', detect_changes, 'fetch') \
+        .add('publish summary', publish_summary, 'fetch', 'detect changes') \
+        .add('write history', write_history, 'fetch', 'detect changes')
+    if not args.no_graph:
+        pipeline \
+            .add('read history', read_history, 'detect changes') \
+            .add('start renderer', start_renderer, 'detect changes') \
+            .add('send graphs', send_graphs, 'start renderer', 'read history', 'write history') \
+            .add('publish graphs', publish_graphs, 'send graphs')
+    pipeline.run()
 
+    logger.info('Startup time by subsystem\n' + startup_report())
+    logger.info(f'Metrics written to {export()}')
     logger.info('Exiting crypto-balance-check worker')
+    if pipeline.failed():
+        raise SystemExit(1)
@@ -0,0 +1,111 @@
+import json
+import logging
+import math
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple
+
+from exchanges import EXCHANGE_TIMEOUT, Exchanges
+from firestore import FireStore
+from firestore.changes import LastSnapshot
+from metrics import count, span
+from slack import Slack
+
+logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO, datefmt='%m/%d/%Y %I:%M:%S %p')
+logger = logging.getLogger(__name__)
+
+PORTFOLIOS_FILE = os.getenv('PORTFOLIOS_FILE') or 'portfolios.json'
+# Portfolios processed at once, and of those how many may be fetching from the same exchange at once
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS') or 8)
+BATCH_EXCHANGE_CONCURRENCY = int(os.getenv('BATCH_EXCHANGE_CONCURRENCY') or 4)
+# Settings a portfolio takes from the environment unless it sets its own, credentials are never inherited
+INHERITED = ['FIAT_CURRENCY', 'SLACK_WEBHOOK']
+
+
+class Portfolio(NamedTuple):
+    name: str
+    settings: Dict[str, str]
+
+    @property
+    def fiat(self) -> str:
+        return self.settings.get('FIAT_CURRENCY') or 'CAD'
+
+    # Firestore document and local snapshot name, so portfolios sharing a fiat currency keep separate histories
+    @property
+    def document(self) -> str:
+        return self.settings.get('HISTORY_DOCUMENT') or f'{self.fiat}-{self.name}'
+
+
+# "$NAME" reads the environment variable NAME, so the file itself can be committed without secrets
+def _resolve(value: str) -> str:
+    return os.getenv(value[1:]) if isinstance(value, str) and value.startswith('$') else value
+
+
+# The file is a list of {"name": ..., "settings": {...}} where settings use the same names as the environment
+# variables of a single portfolio run, e.g. FIAT_CURRENCY, SLACK_WEBHOOK, BINANCE_API_KEY, KUCOIN_API_PASSPHRASE
+def load_portfolios(path: str = PORTFOLIOS_FILE) -> List[Portfolio]:
+    with open(path) as f:
+        config = json.load(f)
+
+    portfolios = []
+    for entry in config:
+        name = entry['name']
+        if any(portfolio.name == name for portfolio in portfolios):
+            raise ValueError(f"Portfolio {name} is defined more than once in {path}")
+        settings = {setting: os.getenv(setting) for setting in INHERITED if os.getenv(setting)}
+        settings.update({setting: _resolve(value) for setting, value in entry.get('settings', {}).items()})
+        settings.setdefault('COINBASE_ACCOUNT_CACHE', os.path.join('.cache', f'coinbase-accounts-{name}.json'))
+        if not settings.get('SLACK_WEBHOOK'):
+            raise ValueError(f"Portfolio {name} has no SLACK_WEBHOOK")
+        portfolios.append(Portfolio(name, settings))
+    return portfolios
+
+
+# Runs many portfolios from one process. Market data (Binance tickers, KuCoin fiat prices, Coinbase rates and
+# CoinMarketCap FX rates) goes through the shared price oracle, so it is fetched once per fiat currency however
+# many portfolios need it, and only the account requests scale with the number of portfolios.
+class Batch:
+    def __init__(self, portfolios: List[Portfolio], workers: int = BATCH_WORKERS,
+                 exchange_concurrency: int = BATCH_EXCHANGE_CONCURRENCY, force: bool = False):
+        self.__portfolios = portfolios
+        self.__workers = workers
+        self.__force = force
+        gates: Dict[str, threading.Semaphore] = {}
+        # A fetch can wait behind the other portfolios in flight on the same exchange before its own timeout starts
+        waves = math.ceil(min(workers, len(portfolios) or 1) / exchange_concurrency)
+        self.__exchanges = {portfolio.name: Exchanges(timeout=EXCHANGE_TIMEOUT * waves, settings=portfolio.settings,
+                                                      gates=gates)
+                            for portfolio in portfolios}
+        for exchanges in self.__exchanges.values():
+            for name in exchanges.names():
+                gates.setdefault(name, threading.BoundedSemaphore(exchange_concurrency))
+
+    # Portfolios that failed
+    def run(self) -> List[str]:
+        with ThreadPoolExecutor(self.__workers, thread_name_prefix='portfolio') as pool:
+            succeeded = list(pool.map(self.__run_portfolio, self.__portfolios))
+        failed = [portfolio.name for portfolio, ok in zip(self.__portfolios, succeeded) if not ok]
+        logger.info(f"Ran {len(self.__portfolios)} portfolios, {len(failed)} failed")
+        return failed
+
+    def __run_portfolio(self, portfolio: Portfolio) -> bool:
+        try:
+            with span('portfolio', portfolio=portfolio.name):
+                positions = self.__exchanges[portfolio.name].get_position_table()
+                firestore = FireStore(portfolio.document)
+                last_snapshot = LastSnapshot(portfolio.document, firestore)
+                change = last_snapshot.diff(positions)
+                if not change.significant and not self.__force:
+                    logger.info(f"Skipping {portfolio.name}, total moved {change.delta_fiat:+.2f}")
+                    return True
+                Slack(portfolio.settings['SLACK_WEBHOOK']).publish_all_positions_by_exchange(positions)
+                point = firestore.update_historic_balances(positions)
+                last_snapshot.save(positions, point[0])
+            return True
+        except Exception as e:
+            traceback.print_exc()
+            logger.error(f"{portfolio.name} failed: {e}")
+            count('portfolio_failures_total', portfolio=portfolio.name)
+            return False
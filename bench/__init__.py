@@ -0,0 +1,187 @@
+import contextlib
+import io
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from bench import fixtures
+from bench.standin import StandIn
+
+logger = logging.getLogger(__name__)
+
+SIZES = [10, 100, 1000]
+# Timed runs per stage and size, after one traced run
+REPEATS = 3
+BENCH_RESULTS = os.getenv('BENCH_RESULTS') or '.cache/bench/latest.json'
+# Adapters only call endpoints they have credentials for, the stand-in accepts anything
+CREDENTIALS = ['BINANCE_API_KEY', 'BINANCE_API_SECRET', 'COINBASE_API_KEY', 'COINBASE_API_SECRET',
+               'NEWTON_CLIENT_ID', 'NEWTON_API_SECRET', 'KUCOIN_API_KEY', 'KUCOIN_API_SECRET',
+               'KUCOIN_API_PASSPHRASE']
+
+
+class Result(NamedTuple):
+    stage: str
+    size: str
+    median_ms: float
+    min_ms: float
+    requests: int
+    peak_kib: float
+
+
+# A stage builds the call to measure for a portfolio size, given the stand-in's url
+class Stage(NamedTuple):
+    name: str
+    setup: Callable[[str, int], Callable[[], Any]]
+
+
+def _cold_prices(run: Callable[[], Any]) -> Callable[[], Any]:
+    from exchanges.oracle import PRICE_ORACLE
+
+    def cold():
+        # Every run pays for its prices, otherwise only the first run of a size would
+        PRICE_ORACLE.invalidate()
+        return run()
+    return cold
+
+
+def _binance(url: str, n: int):
+    from exchanges.binance import Binance
+    return _cold_prices(Binance(url).get_positions)
+
+
+def _coinbase(url: str, n: int):
+    from exchanges.coinbase import Coinbase
+    return _cold_prices(Coinbase(url).get_positions)
+
+
+def _kucoin(url: str, n: int):
+    from exchanges.kucoin import KuCoin
+    return _cold_prices(KuCoin(url).get_positions)
+
+
+def _newton(url: str, n: int):
+    from exchanges.newton import Newton
+    return _cold_prices(Newton(url).get_positions)
+
+
+def _position_table(url: str, n: int):
+    from exchanges.table import PositionTable
+    positions_by_exchange = fixtures.positions_by_exchange(n)
+    return lambda: PositionTable.from_positions_by_exchange(positions_by_exchange)
+
+
+# The worker builds the table once after fetching, the stages below start from it
+def _aggregate(url: str, n: int):
+    from exchanges.table import PositionTable
+    table = PositionTable.from_positions_by_exchange(fixtures.positions_by_exchange(n))
+    return table.aggregate
+
+
+def _slack(url: str, n: int):
+    from exchanges.table import PositionTable
+    from slack import Slack
+    table = PositionTable.from_positions_by_exchange(fixtures.positions_by_exchange(n))
+    slack = Slack()
+    return lambda: slack.publish_all_positions_by_exchange(table)
+
+
+STAGES: List[Stage] = [
+    Stage('binance.get_positions', _binance),
+    Stage('coinbase.get_positions', _coinbase),
+    Stage('kucoin.get_positions', _kucoin),
+    Stage('newton.get_positions', _newton),
+    Stage('exchanges.position_table', _position_table),
+    Stage('exchanges.position_table.aggregate', _aggregate),
+    Stage('slack.publish_all_positions_by_exchange', _slack),
+]
+
+
+# Points every client at the stand-in, nothing leaves the machine while benchmarking
+def _redirect(url: str):
+    import exchanges.utils
+    from exchanges.transport import TRANSPORT
+    exchanges.utils.CMC_BASE_URL = url
+    exchanges.utils.BINANCE_BASE_URL = url
+    # Responses differ per size and every run should pay for its requests, like the cold price oracle
+    TRANSPORT.cache = None
+    for credential in CREDENTIALS:
+        os.environ[credential] = 'bench'
+    os.environ['FIAT_CURRENCY'] = fixtures.FIAT
+    os.environ['SLACK_WEBHOOK'] = f'{url}/slack'
+    os.environ['COINBASE_ACCOUNT_CACHE'] = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'coinbase-accounts.json')
+
+
+def _measure(stage: Stage, stand_in: StandIn, size: str, repeats: int) -> Result:
+    # Adapters print and log every request, that output is not part of what is measured
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = stage.setup(stand_in.url, size)
+        # The first run counts requests and traces allocations, tracing is too slow to leave on for the timed runs
+        stand_in.reset_counts()
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        requests = stand_in.request_count()
+
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+    return Result(stage.name, str(size), statistics.median(timings) * 1000, min(timings) * 1000, requests,
+                  peak / 1024)
+
+
+def run(sizes: List[int] = None, repeats: int = REPEATS, stages: List[Stage] = None,
+        recorded: Dict[str, Any] = None) -> List[Result]:
+    stand_in = StandIn().start()
+    _redirect(stand_in.url)
+    results = []
+    try:
+        # Recorded responses are measured at their own size, synthetic ones at every requested size
+        runs = [('recorded', recorded)] if recorded is not None else [(n, fixtures.routes(n)) for n in sizes or SIZES]
+        for size, routes in runs:
+            stand_in.set_routes(routes if recorded is None else {**fixtures.routes(0), **routes})
+            for stage in stages or STAGES:
+                try:
+                    result = _measure(stage, stand_in, 0 if size == 'recorded' else size, repeats)
+                except ImportError as e:
+                    logger.warning(f"Skipping {stage.name}: {e}")
+                    continue
+                results.append(result._replace(size=str(size)))
+                logger.info(f"{result.stage} n={size}: {result.median_ms:.2f} ms")
+    finally:
+        stand_in.stop()
+    return results
+
+
+def save(results: List[Result], path: str = BENCH_RESULTS):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'created': int(time.time()), 'results': [r._asdict() for r in results]}, f, indent=2)
+
+
+def load(path: str) -> List[Result]:
+    with open(path) as f:
+        return [Result(**r) for r in json.load(f)['results']]
+
+
+def report(results: List[Result], baseline: List[Result] = None) -> str:
+    before = {(r.stage, r.size): r for r in baseline or []}
+    lines = [f"{'stage'.ljust(42)} {'n'.rjust(8)} {'median ms'.rjust(10)} {'min ms'.rjust(10)} "
+             f"{'requests'.rjust(8)} {'peak KiB'.rjust(10)}" + (f" {'vs base'.rjust(8)}" if baseline else '')]
+    for r in results:
+        line = f"{r.stage.ljust(42)} {r.size.rjust(8)} {r.median_ms:10.2f} {r.min_ms:10.2f} {r.requests:8d} " \
+               f"{r.peak_kib:10.1f}"
+        if baseline:
+            base = before.get((r.stage, r.size))
+            line += f" {(r.median_ms / base.median_ms - 1) * 100:+7.1f}%" if base and base.median_ms else '        -'
+        lines.append(line)
+    return "\n".join(lines)
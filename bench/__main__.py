@@ -0,0 +1,25 @@
+import argparse
+import logging
+
+import bench
+
+if __name__ == '__main__':
+    # Adapters log every request at INFO, only the benchmark's own progress is shown
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('bench').setLevel(logging.INFO)
+    parser = argparse.ArgumentParser(prog='bench')
+    parser.add_argument('--sizes', default=','.join(str(n) for n in bench.SIZES),
+                        help='comma separated portfolio sizes, in assets per exchange')
+    parser.add_argument('--repeats', type=int, default=bench.REPEATS, help='timed runs per stage and size')
+    parser.add_argument('--stage', action='append', help='only run stages whose name contains this, repeatable')
+    parser.add_argument('--recorded', help='JSON file of request path -> recorded response body to replay')
+    parser.add_argument('--save', default=bench.BENCH_RESULTS, help='where to write the results')
+    parser.add_argument('--baseline', help='earlier results to compare the median latencies against')
+    args = parser.parse_args()
+
+    stages = [s for s in bench.STAGES if not args.stage or any(name in s.name for name in args.stage)]
+    recorded = bench.fixtures.load_recorded(args.recorded) if args.recorded else None
+    baseline = bench.load(args.baseline) if args.baseline else None
+    results = bench.run([int(n) for n in args.sizes.split(',')], args.repeats, stages, recorded)
+    print(bench.report(results, baseline))
+    bench.save(results, args.save)
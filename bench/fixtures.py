@@ -0,0 +1,105 @@
+import json
+from typing import Any, Dict, List
+
+from bench.standin import Route
+from exchanges.interface import Position
+
+FIAT = 'CAD'
+FIAT_CMC_ID = '2784'
+USDT_CMC_ID = '825'
+BRIDGES = ['BTC', 'ETH', 'BNB']
+
+
+def assets(n: int) -> List[str]:
+    return [f'A{i:05d}' for i in range(n)]
+
+
+# Every third asset only trades against a bridge, the way small caps do on Binance
+def binance_ticker(n: int) -> List[Dict]:
+    ticker = [{'symbol': 'BTCUSDT', 'price': '50000'}, {'symbol': 'ETHUSDT', 'price': '3000'},
+              {'symbol': 'BNBUSDT', 'price': '400'}]
+    for i, asset in enumerate(assets(n)):
+        if i % 3 == 2:
+            ticker.append({'symbol': f'{asset}{BRIDGES[i % len(BRIDGES)]}', 'price': f'{0.0001 * (i + 1):.8f}'})
+        else:
+            ticker.append({'symbol': f'{asset}USDT', 'price': f'{0.5 * (i + 1):.8f}'})
+    return ticker
+
+
+def binance_account(n: int) -> Dict:
+    return {'balances': [{'asset': asset, 'free': f'{i + 1}', 'locked': '0.5'} for i, asset in enumerate(assets(n))]}
+
+
+def binance_margin(n: int) -> Dict:
+    return {'assets': [{'baseAsset': {'asset': asset, 'netAsset': f'{i + 1}'},
+                        'quoteAsset': {'asset': 'USDT', 'netAsset': f'-{i + 1}'}}
+                       for i, asset in enumerate(assets(n)[:max(1, n // 10)])]}
+
+
+# Coinbase lists a wallet for every currency it supports, most of them empty: each funded asset comes with two
+# empty wallets, so n funded accounts take 3n to list
+def coinbase_accounts(n: int) -> Route:
+    accounts = []
+    for i, asset in enumerate(assets(n)):
+        for currency, amount in [(asset, f'{i + 1}'), (f'{asset}X', '0.00000000'), (f'{asset}Y', '0.00000000')]:
+            accounts.append({'id': f'account-{len(accounts):05d}', 'balance': {'currency': currency, 'amount': amount}})
+    index = {account['id']: i for i, account in enumerate(accounts)}
+
+    def page(query: Dict[str, List[str]]) -> Dict:
+        limit = int(query.get('limit', ['25'])[0])
+        start = index[query['starting_after'][0]] + 1 if 'starting_after' in query else 0
+        end = start + limit
+        next_uri = f'/v2/accounts?limit={limit}&starting_after={accounts[end - 1]["id"]}' if end < len(accounts) \
+            else None
+        return {'pagination': {'next_uri': next_uri}, 'data': accounts[start:end]}
+    return page
+
+
+def coinbase_rates(n: int) -> Dict:
+    return {'data': {'rates': {asset: f'{1 / (i + 1):.8f}' for i, asset in enumerate(assets(n))}}}
+
+
+# KuCoin wraps every payload as {"code": "200000", "data": ...}
+def kucoin_accounts(n: int) -> Dict:
+    return {'code': '200000', 'data': [{'currency': asset, 'type': ['trade', 'main', 'margin'][i % 3],
+                                        'balance': f'{i + 1}', 'available': f'{i + 1}', 'holds': '0'}
+                                       for i, asset in enumerate(assets(n))]}
+
+
+def kucoin_prices(n: int) -> Dict:
+    return {'code': '200000', 'data': {asset: f'{0.5 * (i + 1):.8f}' for i, asset in enumerate(assets(n))}}
+
+
+def newton_balances(n: int) -> Dict[str, float]:
+    balances = {asset: float(i + 1) for i, asset in enumerate(assets(n))}
+    balances[FIAT] = 100.0
+    return balances
+
+
+# Synthetic responses for every endpoint the adapters call, sized for a portfolio of n assets per exchange
+def routes(n: int) -> Dict[str, Route]:
+    return {
+        '/api/v3/account': binance_account(n),
+        '/sapi/v1/margin/isolated/account': binance_margin(n),
+        '/api/v3/ticker/price': binance_ticker(n),
+        '/v1/fiat/map': {'data': [{'symbol': FIAT, 'id': FIAT_CMC_ID}]},
+        '/v1/tools/price-conversion': {'data': {'quote': {USDT_CMC_ID: {'price': 0.8}}}},
+        '/v2/accounts': coinbase_accounts(n),
+        '/v2/exchange-rates': coinbase_rates(n),
+        '/api/v1/accounts': kucoin_accounts(n),
+        '/api/v1/prices': kucoin_prices(n),
+        '/v1/balances': newton_balances(n),
+    }
+
+
+# Recorded responses are a JSON object of request path -> response body, e.g. captured from a real run.
+# They replace the synthetic responses for the paths they cover.
+def load_recorded(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def positions_by_exchange(n: int, exchanges: int = 4) -> Dict[str, Dict[str, Position]]:
+    return {f'EXCHANGE{e}': {asset: Position(asset, FIAT, i + 1, (i + 1) * 2.5, i % 2, (i % 2) * 2.5)
+                             for i, asset in enumerate(assets(n))}
+            for e in range(exchanges)}
@@ -0,0 +1,162 @@
+import heapq
+import itertools
+import logging
+import os
+import signal
+import threading
+import time
+import traceback
+from typing import Callable, List, Tuple
+
+from exchanges import ASYNC_FETCH, AsyncExchanges, Exchanges
+from exchanges.binance.stream import PriceStream
+from exchanges.oracle import PRICE_ORACLE
+from exchanges.table import PositionTable
+from exchanges.utils import get_binance_ticker
+from firestore import FireStore
+from firestore.changes import LastSnapshot
+from firestore.mirror import HistoryMirror
+from firestore.shards import DAY
+from imgur import GRAPH_BREAKDOWN_DAYS, TOTAL, Imgur
+from metrics import count, export, span
+from slack import Slack
+
+logger = logging.getLogger(__name__)
+
+# Seconds between runs of each daemon job
+BALANCE_INTERVAL = float(os.getenv('DAEMON_BALANCE_INTERVAL') or 5 * 60)
+SLACK_INTERVAL = float(os.getenv('DAEMON_SLACK_INTERVAL') or 60 * 60)
+HISTORY_INTERVAL = float(os.getenv('DAEMON_HISTORY_INTERVAL') or 15 * 60)
+GRAPH_INTERVAL = float(os.getenv('DAEMON_GRAPH_INTERVAL') or 24 * 60 * 60)
+# Value assets from Binance's live ticker stream instead of polling prices over REST
+PRICE_STREAM = (os.getenv('BINANCE_PRICE_STREAM') or 'true').lower() == 'true'
+
+
+# Runs jobs on fixed intervals from a single thread. A job that overruns its interval is rescheduled from when it
+# finished rather than run back to back, and a job that raises is logged and retried at its next slot.
+class Scheduler:
+    def __init__(self):
+        self.__jobs: List[Tuple[float, int, str, float, Callable[[], None]]] = []
+        self.__sequence = itertools.count()
+        self.__stop = threading.Event()
+
+    def every(self, interval: float, name: str, job: Callable[[], None], delay: float = 0):
+        heapq.heappush(self.__jobs, (time.monotonic() + delay, next(self.__sequence), name, interval, job))
+
+    def stop(self):
+        self.__stop.set()
+
+    def run(self):
+        while self.__jobs and not self.__stop.is_set():
+            due, _, name, interval, job = self.__jobs[0]
+            if self.__stop.wait(max(0.0, due - time.monotonic())):
+                break
+            heapq.heappop(self.__jobs)
+            start = time.monotonic()
+            try:
+                with span('job', job=name):
+                    job()
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(f"{name} failed: {e}")
+                count('job_failures_total', job=name)
+            logger.info(f"{name} took {time.monotonic() - start:.2f}s")
+            # Totals accumulate over the daemon's lifetime, the file always holds the latest
+            export()
+            heapq.heappush(self.__jobs, (max(due + interval, time.monotonic()), next(self.__sequence), name, interval, job))
+
+
+# Long-running worker: clients, HTTP connections, price caches and the local history stay warm between ticks,
+# so each tick only fetches what changed
+class Daemon:
+    def __init__(self, graph: bool = True):
+        self.__exchanges = AsyncExchanges() if ASYNC_FETCH else Exchanges()
+        self.__slack = Slack()
+        self.__firestore = FireStore()
+        self.__graph = graph
+        self.__imgur = Imgur() if graph else None
+        self.__history = HistoryMirror(os.getenv('FIAT_CURRENCY'))
+        # Summaries and history points each remember what they last sent, so quiet markets send neither
+        self.__last_summary = LastSnapshot(f"{os.getenv('FIAT_CURRENCY')}-summary")
+        self.__last_point = LastSnapshot(os.getenv('FIAT_CURRENCY'), self.__firestore)
+        self.__positions: PositionTable = None
+        # Newest history point in the last uploaded graph
+        self.__graphed_until: int = None
+        self.__scheduler = Scheduler()
+
+    # At least one exchange answered the last poll
+    def __has_positions(self) -> bool:
+        return self.__positions is not None and bool(self.__positions.exchanges())
+
+    def poll_balances(self):
+        self.__positions = self.__exchanges.get_position_table()
+
+    # The positions when they changed enough since last_snapshot to be sent, otherwise None
+    def __changed(self, last_snapshot: LastSnapshot, name: str) -> PositionTable:
+        if not self.__has_positions():
+            return None
+        change = last_snapshot.diff(self.__positions)
+        if not change.significant:
+            logger.info(f"Skipping {name}, total moved {change.delta_fiat:+.2f}")
+            return None
+        return self.__positions
+
+    def publish_summary(self):
+        if (positions := self.__changed(self.__last_summary, 'summary')) is not None:
+            self.__slack.publish_all_positions_by_exchange(positions)
+            self.__last_summary.save(positions)
+
+    def write_history(self):
+        if (positions := self.__changed(self.__last_point, 'history point')) is None:
+            return
+        point = self.__firestore.update_historic_balances(positions)
+        self.__last_point.save(positions, point[0])
+        # This process is the only writer, so the new point is appended locally instead of being read back
+        self.__history.append([point])
+
+    def upload_graph(self):
+        if (until := self.__history.high_water_mark()) == self.__graphed_until:
+            logger.info("Skipping graph, no balances were recorded since the last one")
+            return
+        x, y = self.__history.series_at_resolution(self.__imgur.graph_width())
+        if not len(x):
+            return
+        if not GRAPH_BREAKDOWN_DAYS:
+            self.__slack.publish_url(self.__imgur.send_graph(x, y))
+        else:
+            timestamps, by_exchange = self.__firestore.get_exchange_histories(
+                int(time.time() - GRAPH_BREAKDOWN_DAYS * DAY))
+            links = self.__imgur.send_graphs({TOTAL: (x, y), **{exchange: (timestamps, values)
+                                                                for exchange, values in by_exchange.items()}})
+            for link in links.values():
+                self.__slack.publish_url(link)
+        self.__graphed_until = until
+
+    def run(self):
+        stream = None
+        if PRICE_STREAM:
+            stream = PriceStream(seed=get_binance_ticker)
+            stream.start()
+            PRICE_ORACLE.use_stream(stream)
+        # Render workers are started once and kept for the daemon's lifetime
+        if self.__graph and GRAPH_BREAKDOWN_DAYS:
+            self.__imgur.warm()
+        # One full sync on start, after that the mirror is kept current by write_history
+        self.__history.sync(self.__firestore)
+        self.__scheduler.every(BALANCE_INTERVAL, 'poll balances', self.poll_balances)
+        self.__scheduler.every(HISTORY_INTERVAL, 'write history', self.write_history)
+        self.__scheduler.every(SLACK_INTERVAL, 'publish summary', self.publish_summary)
+        if self.__graph:
+            self.__scheduler.every(GRAPH_INTERVAL, 'upload graph', self.upload_graph)
+
+        signal.signal(signal.SIGTERM, lambda *_: self.__scheduler.stop())
+        logger.info('Daemon started')
+        try:
+            self.__scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if stream is not None:
+                PRICE_ORACLE.use_stream(None)
+                stream.stop()
+        logger.info('Daemon stopped')
@@ -1,40 +1,178 @@
+import asyncio
+import importlib
 import json
 import logging
-from typing import Dict
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future, TimeoutError
+from typing import Dict, List, Tuple
 
-from exchanges.interface import Exchange, Position
-from exchanges.binance import Binance
-from exchanges.coinbase import Coinbase
-from exchanges.kucoin import KuCoin
-from exchanges.newton import Newton
+from exchanges.interface import AsyncExchange, Exchange, Position
+from exchanges.table import PositionTable
+from metrics import span, timed
 
 logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO, datefmt='%m/%d/%Y %I:%M:%S %p')
 logger = logging.getLogger(__name__)
 
+# Seconds each exchange gets to return its positions before it is left out of the run
+EXCHANGE_TIMEOUT = float(os.getenv('EXCHANGE_TIMEOUT') or 30)
+# Fetch every exchange on one event loop with the async clients instead of a thread per exchange
+ASYNC_FETCH = (os.getenv('ASYNC_FETCH') or 'false').lower() == 'true'
+
+# (module, class, credentials it needs), modules are only imported for exchanges that are configured
+EXCHANGES: List[Tuple[str, str, List[str]]] = [
+    ('exchanges.binance', 'Binance', ['BINANCE_API_KEY', 'BINANCE_API_SECRET']),
+    ('exchanges.coinbase', 'Coinbase', ['COINBASE_API_KEY', 'COINBASE_API_SECRET']),
+    ('exchanges.newton', 'Newton', ['NEWTON_CLIENT_ID', 'NEWTON_API_SECRET']),
+    ('exchanges.kucoin', 'KuCoin', ['KUCOIN_API_KEY', 'KUCOIN_API_SECRET', 'KUCOIN_API_PASSPHRASE']),
+]
+ASYNC_EXCHANGES: List[Tuple[str, str, List[str]]] = [
+    ('exchanges.binance.aio', 'AsyncBinance', ['BINANCE_API_KEY', 'BINANCE_API_SECRET']),
+    ('exchanges.coinbase.aio', 'AsyncCoinbase', ['COINBASE_API_KEY', 'COINBASE_API_SECRET']),
+    ('exchanges.newton.aio', 'AsyncNewton', ['NEWTON_CLIENT_ID', 'NEWTON_API_SECRET']),
+    ('exchanges.kucoin.aio', 'AsyncKuCoin', ['KUCOIN_API_KEY', 'KUCOIN_API_SECRET', 'KUCOIN_API_PASSPHRASE']),
+]
+
+
+# Credentials come from settings when given, otherwise from the environment
+def load_configured(registry: List[Tuple[str, str, List[str]]], settings: Dict[str, str] = None) -> list:
+    ret = []
+    for module, cls, credentials in registry:
+        if not all((os.getenv if settings is None else settings.get)(credential) for credential in credentials):
+            logging.info(f"Skipping {cls}, it is not configured")
+            continue
+        with timed(f'import {module}'):
+            exchange_cls = getattr(importlib.import_module(module), cls)
+        with timed(f'init {module}'):
+            ret.append(exchange_cls() if settings is None else exchange_cls(settings=settings))
+    return ret
+
 
 class Exchanges:
-    def __init__(self):
-        self.__exchanges: [Exchange] = [
-            Binance(),
-            Coinbase(),
-            Newton(),
-            KuCoin()
-        ]
+    # gates: exchange name -> semaphore shared with other Exchanges, bounding how many fetch from it at once
+    def __init__(self, concurrent: bool = True, timeout: float = EXCHANGE_TIMEOUT, settings: Dict[str, str] = None,
+                 gates: Dict[str, threading.Semaphore] = None):
+        self.__exchanges: [Exchange] = load_configured(EXCHANGES, settings)
+        self.__concurrent = concurrent
+        self.__timeout = timeout
+        self.__gates = {} if gates is None else gates
 
-    def get_all_positions(self) -> [Position]:
+    def names(self) -> List[str]:
+        return [exchange.name() for exchange in self.__exchanges]
+
+    def __get_positions(self, exchange: Exchange) -> Dict[str, Position]:
+        gate = self.__gates.get(exchange.name())
+        if gate is not None:
+            gate.acquire()
+        try:
+            with span('fetch', exchange=exchange.name()):
+                return exchange.get_positions()
+        finally:
+            if gate is not None:
+                gate.release()
+
+    # Runs get_positions on a daemon thread so a stuck API can't block the worker, even at exit
+    def __submit(self, exchange: Exchange) -> Future:
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self.__get_positions(exchange))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"{exchange.name()}-positions", daemon=True).start()
+        return future
+
+    def __fetch_concurrently(self) -> Dict[str, Dict[str, Position]]:
+        futures = [(exchange, self.__submit(exchange)) for exchange in self.__exchanges]
+        deadline = time.monotonic() + self.__timeout
+        ret = {}
+        for exchange, future in futures:
+            try:
+                ret[exchange.name()] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                logging.error(f"{exchange.name()} did not respond within {self.__timeout}s, skipping")
+            except Exception as e:
+                traceback.print_exc()
+                logging.error(e)
+        return ret
+
+    # One exchange after the other on the calling thread, without a timeout
+    def __fetch_sequentially(self) -> Dict[str, Dict[str, Position]]:
         ret = {}
         for exchange in self.__exchanges:
-            for p in exchange.get_positions().values():
-                position = ret.get(p.symbol, Position(p.symbol, exchange.fiat))
-                position.spot_amount += p.spot_amount
-                position.spot_amount_in_fiat += p.spot_amount_in_fiat
-                position.margin_amount += p.margin_amount
-                position.margin_amount_in_fiat += p.margin_amount_in_fiat
-                ret[position.symbol] = position
-        return ret.values()
+            try:
+                ret[exchange.name()] = self.__get_positions(exchange)
+            except Exception as e:
+                traceback.print_exc()
+                logging.error(e)
+        return ret
+
+    def __fetch(self) -> Dict[str, Dict[str, Position]]:
+        if self.__concurrent:
+            return self.__fetch_concurrently()
+        return self.__fetch_sequentially()
+
+    def get_all_positions(self) -> [Position]:
+        return aggregate_positions(self.__fetch())
 
     def get_all_positions_by_exchange(self) -> Dict[str, Dict[str, Position]]:
-        return {exchange.name(): exchange.get_positions() for exchange in self.__exchanges}
+        return self.__fetch()
+
+    def get_position_table(self) -> PositionTable:
+        return PositionTable.from_positions_by_exchange(self.__fetch())
+
+
+# Sums each symbol's positions across exchanges
+@span('aggregate', exchange='ALL')
+def aggregate_positions(positions_by_exchange) -> [Position]:
+    return PositionTable.of(positions_by_exchange).aggregate().positions().values()
+
+
+# Fetches every exchange on one event loop, so all balance, margin, ticker and FX requests are in flight at once
+class AsyncExchanges:
+    def __init__(self, timeout: float = EXCHANGE_TIMEOUT, settings: Dict[str, str] = None):
+        self.__exchanges: [AsyncExchange] = load_configured(ASYNC_EXCHANGES, settings)
+        self.__timeout = timeout
+
+    def names(self) -> List[str]:
+        return [exchange.name() for exchange in self.__exchanges]
+
+    async def __fetch(self, exchange: AsyncExchange):
+        try:
+            with span('fetch', exchange=exchange.name()):
+                return await asyncio.wait_for(exchange.get_positions(), self.__timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"{exchange.name()} did not respond within {self.__timeout}s, skipping")
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(e)
+        return None
+
+    async def get_all_positions_by_exchange(self) -> Dict[str, Dict[str, Position]]:
+        results = await asyncio.gather(*(self.__fetch(exchange) for exchange in self.__exchanges))
+        return {exchange.name(): positions for exchange, positions in zip(self.__exchanges, results)
+                if positions is not None}
+
+    # Blocking entry point for callers without an event loop
+    def run(self) -> Dict[str, Dict[str, Position]]:
+        from exchanges.transport import ASYNC_TRANSPORT
+
+        async def run():
+            try:
+                return await self.get_all_positions_by_exchange()
+            finally:
+                await ASYNC_TRANSPORT.close()
+        return asyncio.run(run())
+
+    def get_all_positions(self) -> [Position]:
+        return aggregate_positions(self.run())
+
+    def get_position_table(self) -> PositionTable:
+        return PositionTable.from_positions_by_exchange(self.run())
 
 
 if __name__ == "__main__":
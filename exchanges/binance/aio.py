@@ -0,0 +1,59 @@
+import asyncio
+import json
+import logging
+import traceback
+from typing import Dict
+
+from exchanges.binance import ACCOUNT, MARGIN_ACCOUNT, NAME, to_positions
+from exchanges.binance.auth import BASE_URL, BinanceAuth
+from exchanges.interface import AsyncExchange, Position
+from exchanges.oracle import PRICE_ORACLE
+from exchanges.transport import ASYNC_TRANSPORT
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBinance(AsyncExchange):
+
+    def __init__(self, base_url: str = BASE_URL, settings: Dict[str, str] = None):
+        super().__init__(settings=settings)
+        self.__auth = BinanceAuth(self.setting('BINANCE_API_KEY'), self.setting('BINANCE_API_SECRET'), base_url)
+        self.__valid = self.setting('BINANCE_API_KEY') and self.setting('BINANCE_API_SECRET')
+        if self.__valid:
+            logging.info(f"Initialized {self.name()} Exchange")
+        else:
+            logging.warning(f"{self.name()} Is Missing Configuration")
+
+    def name(self) -> str:
+        return NAME
+
+    async def __send_signed_request(self, url_path: str):
+        return await ASYNC_TRANSPORT.get_json(self.__auth.signed_url(url_path), headers=self.__auth.headers())
+
+    async def get_positions(self) -> Dict[str, Position]:
+        if not self.__valid:
+            return {}
+        logging.info(f"{self.name()} get_positions")
+        try:
+            account, margin_account, price_book, usdt_to_fiat = await asyncio.gather(
+                self.__send_signed_request(ACCOUNT),
+                self.__send_signed_request(MARGIN_ACCOUNT),
+                PRICE_ORACLE.aprice_book(),
+                PRICE_ORACLE.ausdt_to_fiat(self.fiat))
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(e)
+            return {}
+        return to_positions(self.fiat, self.DUST_THRESHOLD, account['balances'], margin_account['assets'],
+                            price_book, usdt_to_fiat)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from exchanges.interface import SyncExchange
+    load_dotenv(dotenv_path='../../.env')
+    logger.setLevel(logging.DEBUG)
+
+    exchange = SyncExchange(AsyncBinance())
+    positions = exchange.get_positions()
+    {print(json.dumps(position.to_dict(), indent=2)) for _, position in positions.items()}
@@ -1,4 +1,4 @@
-from urllib.parse import urlencode
+from functools import partial
 import hashlib
 import hmac
 import json
@@ -7,13 +7,12 @@ import os
 import time
 from typing import Dict
 from urllib.parse import urlencode
-import requests
-from ratelimit import limits, RateLimitException
-from backoff import on_exception, expo
 
+from exchanges.transport import TRANSPORT
+
+logger = logging.getLogger(__name__)
 
 BASE_URL = 'https://api.binance.com'
-ONE_MINUTE = 60
 
 
 def get_timestamp():
@@ -21,14 +20,12 @@ def get_timestamp():
 
 
 class BinanceAuth:
-    def __init__(self, api_key: str, api_secret: str):
+    def __init__(self, api_key: str, api_secret: str, base_url: str = BASE_URL):
         self.__API_KEY = api_key
         self.__API_SECRET = api_secret
+        self.__base_url = base_url
 
-    # used for sending request requires the signature
-    @on_exception(expo, RateLimitException, max_tries=10)
-    @limits(calls=20, period=ONE_MINUTE)
-    def send_signed_request(self, http_method, url_path, payload=None):
+    def signed_url(self, url_path, payload=None) -> str:
         if payload is None:
             payload = {}
         query_string = urlencode(payload, True)
@@ -36,24 +33,36 @@ class BinanceAuth:
             query_string = "{}&timestamp={}".format(query_string, get_timestamp())
         else:
             query_string = 'timestamp={}'.format(get_timestamp())
+        return self.__base_url + url_path + '?' + query_string + '&signature=' + self.__hashing(query_string)
+
+    def public_url(self, url_path, payload=None) -> str:
+        if payload is None:
+            payload = {}
+        query_string = urlencode(payload, True)
+        url = self.__base_url + url_path
+        if query_string:
+            url = url + '?' + query_string
+        return url
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            'Content-Type': 'application/json;charset=utf-8',
+            'X-MBX-APIKEY': self.__API_KEY
+        }
 
-        url = BASE_URL + url_path + '?' + query_string + '&signature=' + self.__hashing(query_string)
-        print("{} {}".format(http_method, url))
+    # used for sending request requires the signature, request weights are accounted for by the shared transport
+    def send_signed_request(self, http_method, url_path, payload=None):
+        url = self.signed_url(url_path, payload)
+        # The query string carries the signature, only the path is logged
+        logger.debug(f"{http_method} {url_path}")
         params = {'url': url, 'params': {}}
         response = self.__dispatch_request(http_method)(**params)
         return response.json()
 
     # used for sending public data request
-    @on_exception(expo, RateLimitException, max_tries=10)
-    @limits(calls=20, period=ONE_MINUTE)
     def send_public_request(self, url_path, payload=None):
-        if payload is None:
-            payload = {}
-        query_string = urlencode(payload, True)
-        url = BASE_URL + url_path
-        if query_string:
-            url = url + '?' + query_string
-        print("{}".format(url))
+        url = self.public_url(url_path, payload)
+        logger.debug(f"GET {url}")
         response = self.__dispatch_request('GET')(url=url)
         return response.json()
 
@@ -61,14 +70,4 @@ class BinanceAuth:
         return hmac.new(self.__API_SECRET.encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256).hexdigest()
 
     def __dispatch_request(self, http_method):
-        session = requests.Session()
-        session.headers.update({
-            'Content-Type': 'application/json;charset=utf-8',
-            'X-MBX-APIKEY': self.__API_KEY
-        })
-        return {
-            'GET': session.get,
-            'DELETE': session.delete,
-            'PUT': session.put,
-            'POST': session.post,
-        }.get(http_method, 'GET')
\ No newline at end of file
+        return partial(TRANSPORT.request, http_method, headers=self.headers())
@@ -0,0 +1,53 @@
+from typing import Dict, List
+
+USDT = 'USDT'
+# Quote assets an asset can be routed through when it has no direct USDT pair, in order of preference
+BRIDGES = ['BTC', 'ETH', 'BNB']
+
+
+# Values every asset listed on Binance in USDT from one ticker snapshot.
+# Rates are precomputed once: a direct USDT pair wins, otherwise the asset is routed through the first bridge it trades against.
+class PriceBook:
+    def __init__(self, prices: Dict[str, float]):
+        self.__prices = prices
+        self.__rates = self.__build_rates(prices)
+
+    @staticmethod
+    def from_ticker(ticker: List[Dict]) -> 'PriceBook':
+        # Accepts both /api/v3/ticker/price ('price') and /api/v3/ticker/24hr ('lastPrice') payloads
+        return PriceBook({item['symbol']: float(item.get('price') or item.get('lastPrice') or 0) for item in ticker})
+
+    @staticmethod
+    def __build_rates(prices: Dict[str, float]) -> Dict[str, float]:
+        rates = {USDT: 1.0}
+        for bridge in BRIDGES:
+            if prices.get(bridge + USDT, 0) > 0:
+                rates[bridge] = prices[bridge + USDT]
+
+        for quote in [USDT] + BRIDGES:
+            if quote not in rates:
+                continue
+            for symbol, price in prices.items():
+                # Delisted pairs stay in the ticker with a zero price
+                if price <= 0 or not symbol.endswith(quote):
+                    continue
+                base = symbol[:-len(quote)]
+                if base and base not in rates:
+                    rates[base] = price * rates[quote]
+        return rates
+
+    def prices(self) -> Dict[str, float]:
+        return self.__prices
+
+    def symbols(self) -> [str]:
+        return list(self.__prices.keys())
+
+    def price(self, symbol: str) -> float:
+        return self.__prices.get(symbol, 0)
+
+    def has(self, asset: str) -> bool:
+        return asset in self.__rates
+
+    # Assets Binance can't price are valued at 1 USDT, same as before the price book existed
+    def to_usdt(self, asset: str, default: float = 1) -> float:
+        return self.__rates.get(asset, default)
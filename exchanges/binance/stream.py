@@ -0,0 +1,120 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+from exchanges.binance.prices import PriceBook
+
+logger = logging.getLogger(__name__)
+
+STREAM_URL = 'wss://stream.binance.com:9443/ws'
+# Every symbol whose price changed in the last second, pushed once a second
+ALL_MARKET_MINI_TICKERS = '!miniTicker@arr'
+# Prices older than this are not trusted for valuations
+STREAM_MAX_AGE = float(os.getenv('BINANCE_PRICE_STREAM_MAX_AGE') or 30)
+MAX_BACKOFF = 60
+
+
+# Keeps a live copy of every Binance price from the all-market ticker stream on a background thread.
+# The book is seeded from a REST snapshot, since the stream only sends symbols that traded, and the connection is
+# re-established (and the streams re-subscribed) with exponential backoff whenever it drops.
+class PriceStream:
+    def __init__(self, seed: Callable[[], List[Dict]] = None, url: str = STREAM_URL,
+                 streams: List[str] = None, max_backoff: float = MAX_BACKOFF):
+        self.__seed = seed
+        self.__url = url
+        self.__streams = streams or [ALL_MARKET_MINI_TICKERS]
+        self.__max_backoff = max_backoff
+        self.__ids = itertools.count(1)
+        self.__lock = threading.Lock()
+        self.__prices: Dict[str, float] = {}
+        self.__updated_at = 0.0
+        self.__book: Optional[PriceBook] = None
+        self.__book_at = -1.0
+        self.__ready = threading.Event()
+        self.__stop = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=lambda: asyncio.run(self.__run()), name='binance-stream',
+                                             daemon=True)
+            self.__thread.start()
+
+    # Cancels the connection from the stream's own loop and waits up to timeout seconds for the thread to end
+    def stop(self, timeout: float = 5):
+        self.__stop.set()
+        if self.__loop is not None:
+            try:
+                self.__loop.call_soon_threadsafe(self.__cancel)
+            except RuntimeError:
+                # The loop already closed
+                pass
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+    @staticmethod
+    def __cancel():
+        for task in asyncio.all_tasks():
+            task.cancel()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        return self.__ready.wait(timeout)
+
+    def is_fresh(self, max_age: float = STREAM_MAX_AGE) -> bool:
+        return self.__ready.is_set() and time.monotonic() - self.__updated_at <= max_age
+
+    def update(self, prices: Dict[str, float]):
+        with self.__lock:
+            self.__prices.update(prices)
+            self.__updated_at = time.monotonic()
+        self.__ready.set()
+
+    # Rebuilt at most once per update, so valuations between ticks share one precomputed book
+    def price_book(self) -> PriceBook:
+        with self.__lock:
+            if self.__book is None or self.__book_at != self.__updated_at:
+                self.__book = PriceBook(dict(self.__prices))
+                self.__book_at = self.__updated_at
+            return self.__book
+
+    async def __run(self):
+        import websockets
+        self.__loop = asyncio.get_event_loop()
+        backoff = 1.0
+        while not self.__stop.is_set():
+            try:
+                if self.__seed is not None:
+                    self.update(PriceBook.from_ticker(await self.__loop.run_in_executor(None, self.__seed))
+                                .prices())
+                async with websockets.connect(self.__url) as socket:
+                    await socket.send(json.dumps({'method': 'SUBSCRIBE', 'params': self.__streams,
+                                                  'id': next(self.__ids)}))
+                    logger.info(f"Subscribed to {', '.join(self.__streams)}")
+                    async for message in socket:
+                        self.__on_message(json.loads(message))
+                        backoff = 1.0
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(f"Binance price stream dropped: {e}")
+            if self.__stop.is_set():
+                break
+            logger.info(f"Reconnecting to the Binance price stream in {backoff:.0f}s")
+            try:
+                await asyncio.sleep(backoff)
+            except asyncio.CancelledError:
+                break
+            backoff = min(backoff * 2, self.__max_backoff)
+
+    def __on_message(self, message):
+        # Subscription acks look like {"result": null, "id": 1}, ticker pushes are lists of {"s": symbol, "c": close}
+        if isinstance(message, list):
+            self.update({ticker['s']: float(ticker['c']) for ticker in message})
@@ -1,34 +1,37 @@
 import json
 import logging
-import os
-import requests
 from typing import Dict
 import traceback
 
-from backoff import on_exception, expo
-from ratelimit import limits, RateLimitException
 from requests import Response
 
+from exchanges.coinbase.accounts import ACCOUNT_CACHE, AccountCache, Page, get_accounts, parse_page
 from exchanges.coinbase.auth import CoinbaseWalletAuth
 from exchanges.interface import Exchange, Position
+from exchanges.oracle import PRICE_ORACLE
+from exchanges.plan import FetchPlan
+from exchanges.transport import TRANSPORT
+from metrics import span
 
 logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO, datefmt='%m/%d/%Y %I:%M:%S %p')
 logger = logging.getLogger(__name__)
 
 NAME = 'COINBASE'
 BASE_URL = 'https://api.coinbase.com'
-LIST_ACCOUNTS = '/v2/accounts'
 EXCHANGE_RATES = '/v2/exchange-rates?currency='
-SIXTY_MINUTES = 3600
+# Price oracle key of the rates table, which is cached for PRICE_TTL
+COINBASE_RATES = 'COINBASE_RATES'
 
 
 class Coinbase(Exchange):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, base_url: str = BASE_URL, settings: Dict[str, str] = None):
+        super().__init__(settings=settings)
+        self.__base_url = base_url
+        self.__cache = AccountCache(self.setting('COINBASE_ACCOUNT_CACHE') or ACCOUNT_CACHE)
         self.__auth = CoinbaseWalletAuth(
-            api_key=os.getenv('COINBASE_API_KEY'),
-            secret_key=os.getenv('COINBASE_API_SECRET'))
-        self.__valid = os.getenv('COINBASE_API_KEY') and os.getenv('COINBASE_API_SECRET')
+            api_key=self.setting('COINBASE_API_KEY'),
+            secret_key=self.setting('COINBASE_API_SECRET'))
+        self.__valid = self.setting('COINBASE_API_KEY') and self.setting('COINBASE_API_SECRET')
         if self.__valid:
             logging.info(f"Initialized {self.name()} Exchange")
         else:
@@ -37,54 +40,54 @@ class Coinbase(Exchange):
     def name(self) -> str:
         return NAME
 
-    @on_exception(expo, RateLimitException, max_tries=8)
-    @limits(calls=10000, period=SIXTY_MINUTES)
+    # Coinbase's 10000 requests an hour are enforced by the shared transport
     def call_api(self, method: str, url: str) -> Response:
-        return requests.request(method=method, url=url, auth=self.__auth)
-
-    def __get_exchange_rates(self):
-        try:
-            logging.info(f"{self.name()} GET: {EXCHANGE_RATES+self.fiat}")
-            r = self.call_api('GET', BASE_URL + EXCHANGE_RATES + self.fiat)
+        return TRANSPORT.request(method=method, url=url, auth=self.__auth)
+
+    def __get_exchange_rates(self) -> Dict[str, str]:
+        def load():
+            logging.info(f"{self.name()} GET: {EXCHANGE_RATES + self.fiat}")
+            # Public, sent unsigned so the response can be cached
+            r = TRANSPORT.get(self.__base_url + EXCHANGE_RATES + self.fiat)
+            r.raise_for_status()
             return r.json()['data']['rates']
-        except Exception as e:
-            logging.error(e)
-        return {}
-
-    def __get_accounts(self):
-        ret = []
-        next_uri = LIST_ACCOUNTS
-        while next_uri is not None:
-            r = {}
-            try:
-                logging.info(f"{self.name()} GET: {LIST_ACCOUNTS}")
-                r = self.call_api('GET', BASE_URL + next_uri)
-            except Exception as e:
-                traceback.print_exc()
-                logging.error(e)
-
-            pagination = r.json()['pagination']
-            next_uri = pagination['next_uri']
-            data = r.json()['data']
-            ret += data
-        return ret
+        return PRICE_ORACLE.get((COINBASE_RATES, self.fiat), load)
+
+    def __get_page(self, uri: str) -> Page:
+        logging.info(f"{self.name()} GET: {uri}")
+        r = self.call_api('GET', self.__base_url + uri)
+        r.raise_for_status()
+        return parse_page(r.json())
 
     def get_positions(self) -> Dict[str, Position]:
         if not self.__valid:
             return {}
         logging.info(f"{self.name()} get_positions")
-        exchange_rates = self.__get_exchange_rates()
-        accounts = self.__get_accounts()
-        ret: Dict[str, Position] = {}
-        for account in accounts:
-            symbol = account['balance']['currency']
-            spot_amount = float(account['balance']['amount']) + ret.get(symbol, 0)
-            if spot_amount <= self.DUST_THRESHOLD:
-                continue
-            spot_amount_in_fiat = spot_amount / float(exchange_rates[symbol])
-            ret[symbol] = Position(symbol, self.fiat, spot_amount, spot_amount_in_fiat, 0, 0)
-
-        return ret
+        plan = FetchPlan(self.name()) \
+            .add('rates', self.__get_exchange_rates) \
+            .add('accounts', lambda: get_accounts(self.__get_page, self.__cache))
+        try:
+            results = plan.run()
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(e)
+            return {}
+        return to_positions(self.fiat, self.DUST_THRESHOLD, results['accounts'], results['rates'])
+
+
+# Shared by Coinbase and AsyncCoinbase
+@span('aggregate', exchange=NAME)
+def to_positions(fiat: str, dust_threshold: float, accounts: [Dict], exchange_rates: Dict[str, str]) -> Dict[str, Position]:
+    ret: Dict[str, Position] = {}
+    for account in accounts:
+        symbol = account['balance']['currency']
+        spot_amount = float(account['balance']['amount']) + ret.get(symbol, 0)
+        if spot_amount <= dust_threshold:
+            continue
+        spot_amount_in_fiat = spot_amount / float(exchange_rates[symbol])
+        ret[symbol] = Position(symbol, fiat, spot_amount, spot_amount_in_fiat, 0, 0)
+
+    return ret
 
 
 if __name__ == "__main__":
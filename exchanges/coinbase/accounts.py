@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+LIST_ACCOUNTS = '/v2/accounts'
+# Largest page /v2/accounts returns, the default is 25
+PAGE_LIMIT = 100
+# Pages fetched at once when the cached account ids say where each page starts
+MAX_CONCURRENT_PAGES = 8
+ACCOUNT_CACHE = os.getenv('COINBASE_ACCOUNT_CACHE') or os.path.join('.cache', 'coinbase-accounts.json')
+
+
+class Page(NamedTuple):
+    # Accounts holding a balance, wallets of every other listed currency are dropped while parsing
+    funded: List[Dict]
+    # (account id, currency) of every account on the page
+    accounts: List[Tuple[str, str]]
+    next_uri: Optional[str]
+
+
+def accounts_uri(starting_after: str = None) -> str:
+    uri = f'{LIST_ACCOUNTS}?limit={PAGE_LIMIT}'
+    return f'{uri}&starting_after={starting_after}' if starting_after else uri
+
+
+def parse_page(body: Dict) -> Page:
+    data = body['data']
+    return Page([account for account in data if float(account['balance']['amount']) != 0],
+                [(account['id'], account['balance']['currency']) for account in data],
+                body['pagination']['next_uri'])
+
+
+def _cursor(uri: str) -> Optional[str]:
+    return parse_qs(urlsplit(uri).query).get('starting_after', [None])[0]
+
+
+# Account ids and currencies from the last sync. Pages are linked by an account id cursor, so knowing the ids
+# tells where every page starts and lets them be requested together.
+class AccountCache:
+    def __init__(self, path: str = ACCOUNT_CACHE):
+        self.__path = path
+        self.__accounts: Optional[List[Tuple[str, str]]] = None
+
+    def accounts(self) -> List[Tuple[str, str]]:
+        if self.__accounts is None:
+            try:
+                with open(self.__path) as f:
+                    self.__accounts = [tuple(account) for account in json.load(f)['accounts']]
+            except (OSError, ValueError, KeyError):
+                self.__accounts = []
+        return self.__accounts
+
+    def currencies(self) -> Dict[str, str]:
+        return dict(self.accounts())
+
+    # Cursor of each page: none for the first, then the id of the last account on the page before
+    def cursors(self) -> List[Optional[str]]:
+        ids = [account_id for account_id, _ in self.accounts()]
+        return [None] + [ids[i - 1] for i in range(PAGE_LIMIT, len(ids), PAGE_LIMIT)]
+
+    def save(self, accounts: List[Tuple[str, str]]):
+        self.__accounts = accounts
+        try:
+            os.makedirs(os.path.dirname(self.__path) or '.', exist_ok=True)
+            with open(self.__path + '.tmp', 'w') as f:
+                json.dump({'accounts': accounts}, f)
+            os.replace(self.__path + '.tmp', self.__path)
+        except OSError as e:
+            logger.warning(f"Could not cache Coinbase accounts: {e}")
+
+
+# Prefetched pages are only kept while each one starts where the page before it says the next page starts,
+# so accounts added or removed since the last sync are picked up by continuing from the first page that differs.
+# A prefetch that failed (its cursor account may be gone) is None.
+def _accept(cursors: List[Optional[str]], pages: List[Optional[Page]]) -> Tuple[List[Page], Optional[str]]:
+    accepted = [pages[0]]
+    for cursor, page in zip(cursors[1:], pages[1:]):
+        next_uri = accepted[-1].next_uri
+        if next_uri is None:
+            return accepted, None
+        if page is None or _cursor(next_uri) != cursor:
+            return accepted, next_uri
+        accepted.append(page)
+    return accepted, accepted[-1].next_uri
+
+
+def _prefetch_failed(cursor: Optional[str], e: Exception):
+    # The first page is not a guess, its errors fail the sync
+    if cursor is None:
+        raise e
+    logger.info(f"Prefetching Coinbase accounts after {cursor} failed, continuing page by page: {e}")
+
+
+def _finish(cache: AccountCache, pages: List[Page]) -> List[Dict]:
+    cache.save([account for page in pages for account in page.accounts])
+    logger.info(f"Synced {sum(len(page.accounts) for page in pages)} Coinbase accounts in {len(pages)} pages")
+    return [account for page in pages for account in page.funded]
+
+
+def get_accounts(fetch: Callable[[str], Page], cache: AccountCache) -> List[Dict]:
+    cursors = cache.cursors()
+
+    def prefetch(cursor: Optional[str]) -> Optional[Page]:
+        try:
+            return fetch(accounts_uri(cursor))
+        except Exception as e:
+            _prefetch_failed(cursor, e)
+        return None
+
+    with ThreadPoolExecutor(min(len(cursors), MAX_CONCURRENT_PAGES)) as pool:
+        pages = list(pool.map(prefetch, cursors))
+    pages, next_uri = _accept(cursors, pages)
+    while next_uri is not None:
+        page = fetch(next_uri)
+        pages.append(page)
+        next_uri = page.next_uri
+    return _finish(cache, pages)
+
+
+async def aget_accounts(fetch: Callable[[str], Awaitable[Page]], cache: AccountCache) -> List[Dict]:
+    cursors = cache.cursors()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+
+    async def prefetch(cursor: Optional[str]) -> Optional[Page]:
+        async with semaphore:
+            try:
+                return await fetch(accounts_uri(cursor))
+            except Exception as e:
+                _prefetch_failed(cursor, e)
+        return None
+
+    pages = list(await asyncio.gather(*(prefetch(cursor) for cursor in cursors)))
+    pages, next_uri = _accept(cursors, pages)
+    while next_uri is not None:
+        page = await fetch(next_uri)
+        pages.append(page)
+        next_uri = page.next_uri
+    return _finish(cache, pages)
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import logging
+import traceback
+from typing import Dict, List
+
+from exchanges.coinbase import BASE_URL, COINBASE_RATES, EXCHANGE_RATES, NAME, to_positions
+from exchanges.coinbase.accounts import ACCOUNT_CACHE, AccountCache, Page, aget_accounts, parse_page
+from exchanges.coinbase.auth import CoinbaseWalletAuth
+from exchanges.interface import AsyncExchange, Position
+from exchanges.oracle import PRICE_ORACLE
+from exchanges.transport import ASYNC_TRANSPORT
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCoinbase(AsyncExchange):
+    def __init__(self, base_url: str = BASE_URL, settings: Dict[str, str] = None):
+        super().__init__(settings=settings)
+        self.__base_url = base_url
+        self.__cache = AccountCache(self.setting('COINBASE_ACCOUNT_CACHE') or ACCOUNT_CACHE)
+        self.__auth = CoinbaseWalletAuth(
+            api_key=self.setting('COINBASE_API_KEY'),
+            secret_key=self.setting('COINBASE_API_SECRET'))
+        self.__valid = self.setting('COINBASE_API_KEY') and self.setting('COINBASE_API_SECRET')
+        if self.__valid:
+            logging.info(f"Initialized {self.name()} Exchange")
+        else:
+            logging.warning(f"{self.name()} Is Missing Configuration")
+
+    def name(self) -> str:
+        return NAME
+
+    async def call_api(self, method: str, path_url: str):
+        return await ASYNC_TRANSPORT.request_json(method, self.__base_url + path_url,
+                                                  headers=self.__auth.headers(method, path_url))
+
+    async def __get_exchange_rates(self) -> Dict[str, str]:
+        async def load():
+            logging.info(f"{self.name()} GET: {EXCHANGE_RATES + self.fiat}")
+            # Public, sent unsigned so the response can be cached
+            return (await ASYNC_TRANSPORT.get_json(self.__base_url + EXCHANGE_RATES + self.fiat))['data']['rates']
+        return await PRICE_ORACLE.aget((COINBASE_RATES, self.fiat), load)
+
+    async def __get_page(self, uri: str) -> Page:
+        logging.info(f"{self.name()} GET: {uri}")
+        return parse_page(await self.call_api('GET', uri))
+
+    # Pages are linked by next_uri, cached account ids from the last sync let them be requested concurrently
+    async def __get_accounts(self) -> List[Dict]:
+        return await aget_accounts(self.__get_page, self.__cache)
+
+    async def get_positions(self) -> Dict[str, Position]:
+        if not self.__valid:
+            return {}
+        logging.info(f"{self.name()} get_positions")
+        try:
+            exchange_rates, accounts = await asyncio.gather(self.__get_exchange_rates(), self.__get_accounts())
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(e)
+            return {}
+        return to_positions(self.fiat, self.DUST_THRESHOLD, accounts, exchange_rates)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from exchanges.interface import SyncExchange
+    load_dotenv(dotenv_path='../../.env')
+    logger.setLevel(logging.DEBUG)
+
+    exchange = SyncExchange(AsyncCoinbase())
+    positions = exchange.get_positions()
+    {print(json.dumps(position.to_dict(), indent=2)) for _, position in positions.items()}
@@ -2,6 +2,7 @@
 import hashlib
 import hmac
 import time
+from typing import Dict
 
 from requests.utils import to_native_string
 from requests.auth import AuthBase
@@ -14,8 +15,13 @@ class CoinbaseWalletAuth(AuthBase):
         self.__api_version = api_version
 
     def __call__(self, request):
+        request.headers.update(self.headers(request.method, request.path_url, request.body))
+        return request
+
+    # path_url is the path including the query string, e.g. /v2/accounts?limit=100
+    def headers(self, method: str, path_url: str, body=None) -> Dict[str, str]:
         timestamp = str(int(time.time()))
-        message = timestamp + request.method + request.path_url + (request.body or '')
+        message = timestamp + method + path_url + (body or '')
         secret = self.__api_secret_key
 
         if not isinstance(message, bytes):
@@ -24,10 +30,9 @@ class CoinbaseWalletAuth(AuthBase):
             secret = secret.encode()
 
         signature = hmac.new(secret, message, hashlib.sha256).hexdigest()
-        request.headers.update({
+        return {
             to_native_string('CB-VERSION'): self.__api_version,
             to_native_string('CB-ACCESS-KEY'): self.__api_key,
             to_native_string('CB-ACCESS-SIGN'): signature,
             to_native_string('CB-ACCESS-TIMESTAMP'): timestamp,
-        })
-        return request
\ No newline at end of file
+        }
\ No newline at end of file
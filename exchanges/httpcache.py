@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Any, List, NamedTuple, Optional, Set
+from urllib.parse import urlsplit
+
+import msgpack
+from requests import Response
+
+from metrics import count
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE = (os.getenv('HTTP_CACHE') or 'true').lower() == 'true'
+HTTP_CACHE_DIR = os.getenv('HTTP_CACHE_DIR') or os.path.join('.cache', 'http')
+DAY = 24 * 60 * 60
+
+
+class CachePolicy(NamedTuple):
+    path: str
+    # Seconds a response is served without asking again
+    ttl: float
+    # Seconds after that a stale response is still served while a fresh one is fetched in the background
+    stale: float
+
+
+# Public market data only, matched on the path prefix. Balance calls are signed and never cached.
+# Prices are never served stale: the price oracle caches what it gets for PRICE_TTL on top of the ttl here.
+CACHE_POLICIES: List[CachePolicy] = [
+    CachePolicy('/api/v3/ticker/', 30, 0),  # Binance prices
+    CachePolicy('/v1/fiat/map', DAY, 7 * DAY),  # CoinMarketCap fiat ids
+    CachePolicy('/v1/tools/price-conversion', 5 * 60, 0),  # CoinMarketCap USDT to fiat
+    CachePolicy('/v2/exchange-rates', 60, 0),  # Coinbase rates
+    CachePolicy('/api/v1/prices', 60, 0),  # KuCoin fiat prices
+]
+
+
+class Entry(NamedTuple):
+    body: bytes
+    fetched_at: float
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def response(self, url: str) -> Response:
+        response = Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'application/json'
+        response._content = self.body
+        return response
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+# Successful responses of public GET endpoints on local disk, one zlib-compressed msgpack file per URL,
+# so restarts and back to back runs skip market data that is still fresh
+class HttpCache:
+    def __init__(self, directory: str = HTTP_CACHE_DIR, policies: List[CachePolicy] = CACHE_POLICIES):
+        self.__directory = directory
+        self.__policies = policies
+        self.__refreshing: Set[str] = set()
+        self.__lock = threading.Lock()
+
+    # Only unsigned GETs of a listed endpoint are cached: anything carrying credentials goes straight to the network
+    def policy(self, method: str, url: str, **kwargs) -> Optional[CachePolicy]:
+        if method != 'GET' or kwargs.get('auth') or kwargs.get('headers') or 'signature=' in url:
+            return None
+        path = urlsplit(url).path
+        return next((policy for policy in self.__policies if path.startswith(policy.path)), None)
+
+    def __path(self, url: str) -> str:
+        return os.path.join(self.__directory, hashlib.sha1(url.encode()).hexdigest() + '.msgpack')
+
+    # The cached response if it is still usable under the policy
+    def lookup(self, url: str, policy: CachePolicy) -> Optional[Entry]:
+        try:
+            with open(self.__path(url), 'rb') as f:
+                packed = msgpack.unpackb(f.read(), raw=False)
+            entry = Entry(zlib.decompress(packed['body']), packed['fetched_at'])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cached response for {url}: {e}")
+            return None
+        return entry if packed['url'] == url and entry.age() < policy.ttl + policy.stale else None
+
+    # A response that can't be written is only logged, the caller already has it
+    def store(self, url: str, body: bytes):
+        path = self.__path(url)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.__directory, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(msgpack.packb({'url': url, 'fetched_at': time.time(), 'body': zlib.compress(body)},
+                                      use_bin_type=True))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not cache the response of {url}: {e}")
+
+    # Whether a stale entry should be served and this caller should refresh it, only one refresh runs per URL
+    def begin_refresh(self, url: str) -> bool:
+        with self.__lock:
+            if url in self.__refreshing:
+                return False
+            self.__refreshing.add(url)
+            return True
+
+    def end_refresh(self, url: str):
+        with self.__lock:
+            self.__refreshing.discard(url)
+
+    @staticmethod
+    def record(url: str, result: str):
+        count('http_cache_total', host=urlsplit(url).netloc, result=result)
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from typing import Dict, Any
@@ -32,13 +33,57 @@ class Position():
         self.margin_amount_in_fiat = margin_amount_in_fiat
 
 
+# Credentials and the fiat currency are read from settings when given, e.g. one portfolio of a batch,
+# otherwise from the environment
 class Exchange:
-    def __init__(self, fiat_currency: str = 'CAD'):
-        self.fiat = os.getenv('FIAT_CURRENCY') or 'CAD'
+    def __init__(self, fiat_currency: str = 'CAD', settings: Dict[str, str] = None):
+        self.__settings = settings
+        self.fiat = self.setting('FIAT_CURRENCY') or 'CAD'
         self.DUST_THRESHOLD = 0.0000001
 
+    def setting(self, name: str) -> str:
+        return os.getenv(name) if self.__settings is None else self.__settings.get(name)
+
     def name(self) -> str:
         raise Exception('Interface Method')
 
     def get_positions(self) -> Dict[str, Position]:
         raise Exception('Interface Method')
+
+
+class AsyncExchange:
+    def __init__(self, settings: Dict[str, str] = None):
+        self.__settings = settings
+        self.fiat = self.setting('FIAT_CURRENCY') or 'CAD'
+        self.DUST_THRESHOLD = 0.0000001
+
+    def setting(self, name: str) -> str:
+        return os.getenv(name) if self.__settings is None else self.__settings.get(name)
+
+    def name(self) -> str:
+        raise Exception('Interface Method')
+
+    async def get_positions(self) -> Dict[str, Position]:
+        raise Exception('Interface Method')
+
+
+# Exposes an AsyncExchange through the blocking Exchange interface, each call runs on its own event loop
+class SyncExchange(Exchange):
+    def __init__(self, exchange: AsyncExchange):
+        super().__init__()
+        self.__exchange = exchange
+        self.fiat = exchange.fiat
+
+    def name(self) -> str:
+        return self.__exchange.name()
+
+    def get_positions(self) -> Dict[str, Position]:
+        return asyncio.run(self.__get_positions())
+
+    async def __get_positions(self) -> Dict[str, Position]:
+        # Imported here so Position stays importable without the HTTP stack, e.g. by firestore.snapshot
+        from exchanges.transport import ASYNC_TRANSPORT
+        try:
+            return await self.__exchange.get_positions()
+        finally:
+            await ASYNC_TRANSPORT.close()
@@ -1,59 +1,87 @@
 import json
 import logging
-import os
+import traceback
 from typing import Dict
 
-from kucoin.client import User, Market
-
 from exchanges import Exchange, Position
+from exchanges.oracle import PRICE_ORACLE
+from exchanges.transport import TRANSPORT
+from exchanges.plan import FetchPlan
+from metrics import span
 
 logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO, datefmt='%m/%d/%Y %I:%M:%S %p')
 logger = logging.getLogger(__name__)
 
+NAME = 'KUCOIN'
+BASE_URL = 'https://api.kucoin.com'
+FIAT_PRICES = '/api/v1/prices?base='
 TRADE = 'trade'
 MAIN = 'main'
 MARGIN = 'margin'
+# Price oracle key of the fiat prices, which are the same for every account
+KUCOIN_PRICES = 'KUCOIN_PRICES'
 
 class KuCoin(Exchange):
 
-    def __init__(self):
-        super().__init__()
-        self.__api_key = os.getenv('KUCOIN_API_KEY')
-        self.__api_secret = os.getenv('KUCOIN_API_SECRET')
-        self.__api_passphrase = os.getenv('KUCOIN_API_PASSPHRASE')
+    def __init__(self, base_url: str = BASE_URL, settings: Dict[str, str] = None):
+        super().__init__(settings=settings)
+        self.__base_url = base_url
+        self.__api_key = self.setting('KUCOIN_API_KEY')
+        self.__api_secret = self.setting('KUCOIN_API_SECRET')
+        self.__api_passphrase = self.setting('KUCOIN_API_PASSPHRASE')
         self.__valid = self.__api_key and self.__api_secret and self.__api_passphrase
         if self.__valid:
+            # kucoin-python is only imported once there are credentials to use it with
+            from kucoin.client import User
             logging.info(f"Initialized {self.name()} Exchange")
-            self.__user = User(self.__api_key, self.__api_secret, self.__api_passphrase)
-            self.__market = Market()
+            self.__user = User(self.__api_key, self.__api_secret, self.__api_passphrase, url=base_url)
         else:
             logging.warning(f"{self.name()} Is Missing Configuration")
 
     def name(self) -> str:
-        return "KUCOIN"
+        return NAME
+
+    # Public, so requested through the shared transport to be rate limited and cached like other market data
+    def __get_fiat_prices(self) -> Dict[str, str]:
+        r = TRANSPORT.get(self.__base_url + FIAT_PRICES + self.fiat)
+        r.raise_for_status()
+        return r.json()['data']
 
     def get_positions(self) -> Dict[str, Position]:
         if not self.__valid:
             return {}
-        ret = {}
-        accounts = self.__user.get_account_list()
-        prices = self.__market.get_fiat_price(base=self.fiat)
-        for account in accounts:
-            symbol = account['currency']
-            account_type = account['type']
-            account_balance = float(account['balance'])
-            symbol_to_fiat = float(prices[symbol])
-            if account_balance <= self.DUST_THRESHOLD:
-                continue
-            position = ret.get(symbol, Position(symbol, self.fiat))
-            if account_type == TRADE or account_type == MAIN:
-                position.spot_amount += account_balance
-            elif account_type == MARGIN:
-                position.margin_amount += account_balance
-            position.spot_amount_in_fiat = position.spot_amount * symbol_to_fiat
-            position.margin_amount_in_fiat = position.margin_amount * symbol_to_fiat
-            ret[symbol] = position
-        return ret
+        plan = FetchPlan(self.name()) \
+            .add('accounts', self.__user.get_account_list) \
+            .add('prices', lambda: PRICE_ORACLE.get((KUCOIN_PRICES, self.fiat), self.__get_fiat_prices))
+        try:
+            results = plan.run()
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(e)
+            return {}
+        return to_positions(self.fiat, self.DUST_THRESHOLD, results['accounts'], results['prices'])
+
+
+# Shared by KuCoin and AsyncKuCoin
+@span('aggregate', exchange=NAME)
+def to_positions(fiat: str, dust_threshold: float, accounts: [Dict], prices: Dict[str, str]) -> Dict[str, Position]:
+    ret = {}
+    for account in accounts:
+        symbol = account['currency']
+        account_type = account['type']
+        account_balance = float(account['balance'])
+        symbol_to_fiat = float(prices[symbol])
+        if account_balance <= dust_threshold:
+            continue
+        position = ret.get(symbol, Position(symbol, fiat))
+        if account_type == TRADE or account_type == MAIN:
+            position.spot_amount += account_balance
+        elif account_type == MARGIN:
+            position.margin_amount += account_balance
+        position.spot_amount_in_fiat = position.spot_amount * symbol_to_fiat
+        position.margin_amount_in_fiat = position.margin_amount * symbol_to_fiat
+        ret[symbol] = position
+    return ret
 
 
 if __name__ == "__main__":
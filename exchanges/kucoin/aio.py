@@ -0,0 +1,64 @@
+import asyncio
+import json
+import logging
+import traceback
+from typing import Dict
+
+from exchanges.interface import AsyncExchange, Position
+from exchanges.kucoin import BASE_URL, FIAT_PRICES, KUCOIN_PRICES, NAME, to_positions
+from exchanges.kucoin.auth import KuCoinAuth
+from exchanges.oracle import PRICE_ORACLE
+from exchanges.transport import ASYNC_TRANSPORT
+
+logger = logging.getLogger(__name__)
+
+ACCOUNTS = '/api/v1/accounts'
+
+
+# Talks to KuCoin's REST API directly since kucoin-python only has a blocking client
+class AsyncKuCoin(AsyncExchange):
+
+    def __init__(self, base_url: str = BASE_URL, settings: Dict[str, str] = None):
+        super().__init__(settings=settings)
+        self.__base_url = base_url
+        self.__api_key = self.setting('KUCOIN_API_KEY')
+        self.__api_secret = self.setting('KUCOIN_API_SECRET')
+        self.__api_passphrase = self.setting('KUCOIN_API_PASSPHRASE')
+        self.__valid = self.__api_key and self.__api_secret and self.__api_passphrase
+        if self.__valid:
+            self.__auth = KuCoinAuth(self.__api_key, self.__api_secret, self.__api_passphrase)
+            logging.info(f"Initialized {self.name()} Exchange")
+        else:
+            logging.warning(f"{self.name()} Is Missing Configuration")
+
+    def name(self) -> str:
+        return NAME
+
+    async def __get(self, endpoint: str, signed: bool):
+        headers = self.__auth.headers('GET', endpoint) if signed else None
+        r = await ASYNC_TRANSPORT.get_json(self.__base_url + endpoint, headers=headers)
+        return r['data']
+
+    async def get_positions(self) -> Dict[str, Position]:
+        if not self.__valid:
+            return {}
+        try:
+            accounts, prices = await asyncio.gather(
+                self.__get(ACCOUNTS, signed=True),
+                PRICE_ORACLE.aget((KUCOIN_PRICES, self.fiat), lambda: self.__get(FIAT_PRICES + self.fiat, signed=False)))
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(e)
+            return {}
+        return to_positions(self.fiat, self.DUST_THRESHOLD, accounts, prices)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from exchanges.interface import SyncExchange
+    load_dotenv(dotenv_path='../../.env')
+    logger.setLevel(logging.DEBUG)
+
+    exchange = SyncExchange(AsyncKuCoin())
+    positions = exchange.get_positions()
+    {print(json.dumps(position.to_dict(), indent=2)) for _, position in positions.items()}
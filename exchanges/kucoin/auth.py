@@ -0,0 +1,31 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Dict
+
+ENCODING = "utf-8"
+
+
+# Signs requests for KuCoin's REST API (key version 2), for clients that don't go through kucoin-python
+class KuCoinAuth:
+    def __init__(self, api_key: str, api_secret: str, api_passphrase: str):
+        self.__api_key = api_key
+        self.__api_secret = api_secret
+        self.__api_passphrase = api_passphrase
+
+    def __sign(self, message: str) -> str:
+        digest = hmac.new(self.__api_secret.encode(ENCODING), message.encode(ENCODING), hashlib.sha256).digest()
+        return base64.b64encode(digest).decode()
+
+    # endpoint is the path including the query string, e.g. /api/v1/prices?base=CAD
+    def headers(self, method: str, endpoint: str, body: str = '') -> Dict[str, str]:
+        timestamp = str(int(time.time() * 1000))
+        return {
+            'KC-API-KEY': self.__api_key,
+            'KC-API-SIGN': self.__sign(timestamp + method + endpoint + body),
+            'KC-API-TIMESTAMP': timestamp,
+            'KC-API-PASSPHRASE': self.__sign(self.__api_passphrase),
+            'KC-API-KEY-VERSION': '2',
+            'Content-Type': 'application/json',
+        }
@@ -0,0 +1,197 @@
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from metrics import count
+
+logger = logging.getLogger(__name__)
+
+# Fraction of each published limit we allow ourselves, the rest covers other clients sharing the key or IP
+RATE_LIMIT_HEADROOM = float(os.getenv('RATE_LIMIT_HEADROOM') or 0.9)
+# Binance's request weight limit per minute and IP, raise it if the account has a higher limit
+BINANCE_WEIGHT_LIMIT = int(os.getenv('BINANCE_WEIGHT_LIMIT') or 1200)
+BINANCE_SAPI_WEIGHT_LIMIT = int(os.getenv('BINANCE_SAPI_WEIGHT_LIMIT') or 12000)
+# Pause applied after a 429 or 418 that doesn't say how long to back off
+DEFAULT_RETRY_AFTER = 60
+MINUTE = 60
+HOUR = 60 * 60
+
+
+# Tokens refill continuously, for APIs that limit requests over a sliding period
+class TokenBucket:
+    def __init__(self, capacity: float, period: float):
+        self.capacity = capacity
+        self.__rate = capacity / period
+        self.__tokens = capacity
+        self.__updated = time.monotonic()
+        self.__paused_until = 0.0
+        self.__lock = threading.Lock()
+
+    def __refill(self, now: float):
+        self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated) * self.__rate)
+        self.__updated = now
+
+    # Takes weight tokens and returns how long the caller has to wait before sending. Tokens can go negative,
+    # so concurrent callers queue up behind each other instead of all waking up at the same moment.
+    def reserve(self, weight: float) -> float:
+        with self.__lock:
+            now = time.monotonic()
+            self.__refill(now)
+            self.__tokens -= weight
+            wait = max(0.0, -self.__tokens / self.__rate, self.__paused_until - now)
+        return wait
+
+    # The server's count of weight used in the current period, which includes requests from other clients
+    def observe_used(self, used: float):
+        with self.__lock:
+            self.__refill(time.monotonic())
+            self.__tokens = min(self.__tokens, self.capacity - used)
+
+    def observe_remaining(self, remaining: float):
+        with self.__lock:
+            self.__refill(time.monotonic())
+            self.__tokens = min(self.__tokens, remaining)
+
+    def pause(self, seconds: float):
+        with self.__lock:
+            self.__paused_until = max(self.__paused_until, time.monotonic() + seconds)
+
+
+# The whole budget comes back at once on wall clock boundaries, which is how Binance counts weight.
+# Refilling continuously against a fixed window would let a burst at the end of one minute and a second burst
+# shortly after both land in the same server side window.
+class FixedWindow:
+    def __init__(self, capacity: float, period: float):
+        self.capacity = capacity
+        self.__period = period
+        self.__window = self.__current()
+        self.__used = 0.0
+        self.__paused_until = 0.0
+        self.__lock = threading.Lock()
+
+    def __current(self) -> int:
+        return math.floor(time.time() / self.__period)
+
+    def reserve(self, weight: float) -> float:
+        with self.__lock:
+            window = self.__current()
+            if window > self.__window:
+                self.__window, self.__used = window, 0.0
+            # A request that doesn't fit is booked into the next window, callers queue up window by window
+            if self.__used + weight > self.capacity and self.__used > 0:
+                self.__window, self.__used = self.__window + 1, 0.0
+            self.__used += weight
+            wait = max(0.0, self.__window * self.__period - time.time())
+            return max(wait, self.__paused_until - time.monotonic())
+
+    def observe_used(self, used: float):
+        with self.__lock:
+            if self.__window == self.__current():
+                self.__used = max(self.__used, used)
+
+    def observe_remaining(self, remaining: float):
+        self.observe_used(self.capacity - remaining)
+
+    def pause(self, seconds: float):
+        with self.__lock:
+            self.__paused_until = max(self.__paused_until, time.monotonic() + seconds)
+
+
+class HostLimit(NamedTuple):
+    host: str
+    # Longest matching path prefix wins, so one host can have separately counted endpoint families
+    prefix: str
+    bucket: Callable[[], object]
+    # Response header with the weight used so far, or the weight remaining
+    used_header: Optional[str] = None
+    remaining_header: Optional[str] = None
+    # Path -> request weight, anything else weighs 1
+    weights: Mapping[str, float] = {}
+
+
+def _headroom(limit: float) -> float:
+    return limit * RATE_LIMIT_HEADROOM
+
+
+LIMITS: List[HostLimit] = [
+    HostLimit('api.binance.com', '/api/', lambda: FixedWindow(_headroom(BINANCE_WEIGHT_LIMIT), MINUTE),
+              used_header='X-MBX-USED-WEIGHT-1M',
+              weights={'/api/v3/account': 20, '/api/v3/ticker/price': 4, '/api/v3/ticker/24hr': 80}),
+    HostLimit('api.binance.com', '/sapi/', lambda: FixedWindow(_headroom(BINANCE_SAPI_WEIGHT_LIMIT), MINUTE),
+              used_header='X-SAPI-USED-IP-WEIGHT-1M',
+              weights={'/sapi/v1/margin/isolated/account': 10}),
+    HostLimit('api.coinbase.com', '/', lambda: TokenBucket(_headroom(10000), HOUR)),
+    HostLimit('api.kucoin.com', '/', lambda: TokenBucket(_headroom(1800), MINUTE),
+              remaining_header='gw-ratelimit-remaining'),
+    HostLimit('web-api.coinmarketcap.com', '/', lambda: TokenBucket(_headroom(30), MINUTE)),
+]
+
+
+# One limiter per host and endpoint family shared by every client in the process, so the exchange adapters, the
+# price oracle and anything else calling the same host draw from the same budget
+class RateLimiter:
+    def __init__(self, limits: List[HostLimit] = None):
+        self.__limits: Dict[str, List[HostLimit]] = {}
+        for limit in LIMITS if limits is None else limits:
+            self.__limits.setdefault(limit.host, []).append(limit)
+        for host_limits in self.__limits.values():
+            host_limits.sort(key=lambda limit: len(limit.prefix), reverse=True)
+        self.__buckets: Dict[Tuple[str, str], object] = {}
+        self.__lock = threading.Lock()
+
+    def __match(self, url: str) -> Optional[HostLimit]:
+        parts = urlsplit(url)
+        for limit in self.__limits.get(parts.hostname or '', []):
+            if parts.path.startswith(limit.prefix):
+                return limit
+        return None
+
+    def __bucket(self, limit: HostLimit):
+        with self.__lock:
+            bucket = self.__buckets.get((limit.host, limit.prefix))
+            if bucket is None:
+                bucket = self.__buckets[(limit.host, limit.prefix)] = limit.bucket()
+            return bucket
+
+    # Seconds to wait before sending a request to url, the request's weight is already booked
+    def reserve(self, url: str, weight: float = None) -> float:
+        limit = self.__match(url)
+        if limit is None:
+            return 0.0
+        if weight is None:
+            weight = limit.weights.get(urlsplit(url).path, 1)
+        wait = self.__bucket(limit).reserve(weight)
+        if wait > 0:
+            host = urlsplit(url).netloc
+            logger.info(f"Rate limited by {host}{limit.prefix}, waiting {wait:.2f}s")
+            count('rate_limit_sleeps_total', host=host)
+            count('rate_limit_sleep_seconds_total', wait, host=host)
+        return wait
+
+    def acquire(self, url: str, weight: float = None):
+        wait = self.reserve(url, weight)
+        if wait > 0:
+            time.sleep(wait)
+
+    # Syncs the budget with what the server says is used, and backs off on 429 (too many requests) and 418 (banned)
+    def observe(self, url: str, status: Optional[int], headers: Mapping[str, str]):
+        limit = self.__match(url)
+        if limit is None or headers is None:
+            return
+        bucket = self.__bucket(limit)
+        if limit.used_header and headers.get(limit.used_header) is not None:
+            bucket.observe_used(float(headers[limit.used_header]))
+        elif limit.remaining_header and headers.get(limit.remaining_header) is not None:
+            bucket.observe_remaining(float(headers[limit.remaining_header]))
+        if status in (418, 429):
+            retry_after = float(headers.get('Retry-After') or DEFAULT_RETRY_AFTER)
+            logger.error(f"{urlsplit(url).netloc} answered {status}, pausing requests for {retry_after:.0f}s")
+            count('rate_limit_rejections_total', host=urlsplit(url).netloc, status=status)
+            bucket.pause(retry_after)
+
+
+RATE_LIMITER = RateLimiter()
@@ -1,89 +1,72 @@
-import hmac
 import json
 import logging
-import os
 import traceback
-from base64 import b64encode
-from datetime import datetime
-from hashlib import sha256
-from math import floor
 from typing import Dict
-import requests
 
 from exchanges import Exchange, Position
-from exchanges.utils import get_usdt_to_fiat
+from exchanges.binance.prices import PriceBook
+from exchanges.newton.auth import NewtonAuth
+from exchanges.oracle import PRICE_ORACLE
+from exchanges.plan import FetchPlan
+from exchanges.transport import TRANSPORT
+from metrics import span
 
 logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO, datefmt='%m/%d/%Y %I:%M:%S %p')
 logger = logging.getLogger(__name__)
 
-ENCODING = "utf-8"
 BASE_URL = "https://api.newton.co"
-BINANCE_BASE_URL = 'https://api.binance.com'
 BALANCES = "/v1/balances"
+NAME = "NEWTON"
 
 
 class Newton(Exchange):
 
-    def __init__(self):
-        super().__init__()
-        self.__client_id = os.getenv('NEWTON_CLIENT_ID')
-        self.__client_secret = os.getenv('NEWTON_API_SECRET')
-        self.__valid = self.__client_secret and self.__client_id and os.getenv('FIAT_CURRENCY') == 'CAD'
+    def __init__(self, base_url: str = BASE_URL, settings: Dict[str, str] = None):
+        super().__init__(settings=settings)
+        self.__base_url = base_url
+        self.__client_id = self.setting('NEWTON_CLIENT_ID')
+        self.__client_secret = self.setting('NEWTON_API_SECRET')
+        self.__valid = self.__client_secret and self.__client_id and self.fiat == 'CAD'
         if self.__valid:
+            self.__auth = NewtonAuth(self.__client_id, self.__client_secret)
             logging.info(f"Initialized {self.name()} Exchange")
         else:
             logging.warning(f"{self.name()} Is Missing Configuration")
 
-    def __get_header(self, path) -> Dict[str, str]:
-        current_time = str(floor(datetime.now().timestamp()))
-        # If the request has a body, you would use this instead of empty string below (replace BODY with actual request body):
-        # hashed_body = sha256(BODY).hexdigest()
-        signature_parameters = [
-            "GET",
-            "",
-            path,
-            "",  # If the request has a body, this would be hashed_body
-            current_time
-        ]
-        signature_data = ":".join(signature_parameters).encode(ENCODING)
-
-        computed_signature = hmac.new(
-            self.__client_secret.encode(ENCODING),
-            msg=signature_data,
-            digestmod=sha256
-        ).digest()
-
-        NewtonAPIAuth = self.__client_id + ":" + b64encode(computed_signature).decode()
-        NewtonDate = current_time
-        return {
-            "NewtonAPIAuth": NewtonAPIAuth,
-            "NewtonDate": NewtonDate
-        }
-
     def name(self) -> str:
-        return "NEWTON"
-
-    # HACK because Newton doesnt have a price endpoint
-    def __to_usdt(self, symbol) -> float:
-        return float(requests.get(f'{BINANCE_BASE_URL}/api/v3/avgPrice?symbol={symbol + "USDT"}').json()['price'])
+        return NAME
 
     def get_positions(self) -> Dict[str, Position]:
         if not self.__valid:
             return {}
+        plan = FetchPlan(self.name()) \
+            .add('balances', lambda: TRANSPORT.get(f"{self.__base_url}{BALANCES}",
+                                                   headers=self.__auth.headers(BALANCES)).json()) \
+            .add('prices', PRICE_ORACLE.price_book) \
+            .add('usdt_to_fiat', lambda: PRICE_ORACLE.usdt_to_fiat(self.fiat))
+        # HACK because Newton doesnt have a price endpoint, Binance prices are used instead
         try:
-            data = requests.get(f"{BASE_URL}{BALANCES}", headers=self.__get_header(BALANCES)).json()
+            results = plan.run()
         except Exception as e:
             traceback.print_exc()
             logging.error(e)
             return {}
-        ret = {}
-        for symbol, amount in data.items():
-            if symbol == 'CAD' or amount <= self.DUST_THRESHOLD:
-                continue
-            spot_amount = amount
-            spot_amount_in_fiat = spot_amount * self.__to_usdt(symbol) * get_usdt_to_fiat(self.fiat)
-            ret[symbol] = Position(symbol, self.fiat, spot_amount, spot_amount_in_fiat, 0, 0)
-        return ret
+        return to_positions(self.fiat, self.DUST_THRESHOLD, results['balances'], results['prices'],
+                            results['usdt_to_fiat'])
+
+
+# Shared by Newton and AsyncNewton
+@span('aggregate', exchange=NAME)
+def to_positions(fiat: str, dust_threshold: float, balances: Dict[str, float], price_book: PriceBook,
+                 usdt_to_fiat: float) -> Dict[str, Position]:
+    ret = {}
+    for symbol, amount in balances.items():
+        if symbol == 'CAD' or amount <= dust_threshold:
+            continue
+        spot_amount = amount
+        spot_amount_in_fiat = spot_amount * price_book.to_usdt(symbol) * usdt_to_fiat
+        ret[symbol] = Position(symbol, fiat, spot_amount, spot_amount_in_fiat, 0, 0)
+    return ret
 
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import logging
+import traceback
+from typing import Dict
+
+from exchanges.interface import AsyncExchange, Position
+from exchanges.newton import BALANCES, BASE_URL, NAME, to_positions
+from exchanges.newton.auth import NewtonAuth
+from exchanges.oracle import PRICE_ORACLE
+from exchanges.transport import ASYNC_TRANSPORT
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncNewton(AsyncExchange):
+
+    def __init__(self, base_url: str = BASE_URL, settings: Dict[str, str] = None):
+        super().__init__(settings=settings)
+        self.__base_url = base_url
+        self.__client_id = self.setting('NEWTON_CLIENT_ID')
+        self.__client_secret = self.setting('NEWTON_API_SECRET')
+        self.__valid = self.__client_secret and self.__client_id and self.fiat == 'CAD'
+        if self.__valid:
+            self.__auth = NewtonAuth(self.__client_id, self.__client_secret)
+            logging.info(f"Initialized {self.name()} Exchange")
+        else:
+            logging.warning(f"{self.name()} Is Missing Configuration")
+
+    def name(self) -> str:
+        return NAME
+
+    async def get_positions(self) -> Dict[str, Position]:
+        if not self.__valid:
+            return {}
+        try:
+            data, price_book, usdt_to_fiat = await asyncio.gather(
+                ASYNC_TRANSPORT.get_json(f"{self.__base_url}{BALANCES}", headers=self.__auth.headers(BALANCES)),
+                PRICE_ORACLE.aprice_book(),
+                PRICE_ORACLE.ausdt_to_fiat(self.fiat))
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(e)
+            return {}
+        return to_positions(self.fiat, self.DUST_THRESHOLD, data, price_book, usdt_to_fiat)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from exchanges.interface import SyncExchange
+    load_dotenv(dotenv_path='../../.env')
+    logger.setLevel(logging.DEBUG)
+
+    exchange = SyncExchange(AsyncNewton())
+    positions = exchange.get_positions()
+    {print(json.dumps(position.to_dict(), indent=2)) for _, position in positions.items()}
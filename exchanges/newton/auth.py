@@ -0,0 +1,40 @@
+import hmac
+from base64 import b64encode
+from datetime import datetime
+from hashlib import sha256
+from math import floor
+from typing import Dict
+
+ENCODING = "utf-8"
+
+
+class NewtonAuth:
+    def __init__(self, client_id: str, client_secret: str):
+        self.__client_id = client_id
+        self.__client_secret = client_secret
+
+    def headers(self, path) -> Dict[str, str]:
+        current_time = str(floor(datetime.now().timestamp()))
+        # If the request has a body, you would use this instead of empty string below (replace BODY with actual request body):
+        # hashed_body = sha256(BODY).hexdigest()
+        signature_parameters = [
+            "GET",
+            "",
+            path,
+            "",  # If the request has a body, this would be hashed_body
+            current_time
+        ]
+        signature_data = ":".join(signature_parameters).encode(ENCODING)
+
+        computed_signature = hmac.new(
+            self.__client_secret.encode(ENCODING),
+            msg=signature_data,
+            digestmod=sha256
+        ).digest()
+
+        NewtonAPIAuth = self.__client_id + ":" + b64encode(computed_signature).decode()
+        NewtonDate = current_time
+        return {
+            "NewtonAPIAuth": NewtonAPIAuth,
+            "NewtonDate": NewtonDate
+        }
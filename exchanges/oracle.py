@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from exchanges.binance.prices import PriceBook
+from exchanges.binance.stream import PriceStream
+from exchanges.utils import get_binance_ticker, get_fiat_map, get_usdt_to_fiat, aget_binance_ticker, \
+    aget_fiat_map, aget_usdt_to_fiat
+from metrics import count, span
+
+logger = logging.getLogger(__name__)
+
+# Seconds a quote stays fresh, long enough that one run never fetches the same rate twice
+PRICE_TTL = float(os.getenv('PRICE_TTL') or 300)
+FIAT_MAP_TTL = 24 * 60 * 60
+
+FIAT_MAP = 'FIAT_MAP'
+USDT_TO_FIAT = 'USDT_TO_FIAT'
+PRICE_BOOK = 'PRICE_BOOK'
+
+
+# Metric label for a cache key, e.g. USDT_TO_FIAT for (USDT_TO_FIAT, 'CAD')
+def _source(key: Hashable) -> str:
+    return key[0] if isinstance(key, tuple) else str(key)
+
+
+# Process-wide cache of market data shared by every exchange.
+# Concurrent lookups of the same key are coalesced: one caller loads it, the others wait for its result.
+class PriceOracle:
+    def __init__(self, ttl: float = PRICE_TTL):
+        self.__ttl = ttl
+        self.__lock = threading.Lock()
+        self.__values: Dict[Hashable, Tuple[Any, float]] = {}
+        self.__inflight: Dict[Hashable, Future] = {}
+        self.__tasks: Dict[Hashable, asyncio.Task] = {}
+        self.__stream: PriceStream = None
+
+    # Serve Binance prices from a live stream while it is fresh, REST snapshots are only used as a fallback
+    def use_stream(self, stream: PriceStream):
+        self.__stream = stream
+
+    def __streamed_book(self) -> PriceBook:
+        if self.__stream is not None and self.__stream.is_fresh():
+            return self.__stream.price_book()
+        return None
+
+    def __cached(self, key: Hashable) -> Any:
+        cached = self.__values.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        return None
+
+    def __store(self, key: Hashable, value: Any, ttl: float = None):
+        self.__values[key] = (value, time.monotonic() + (self.__ttl if ttl is None else ttl))
+
+    def get(self, key: Hashable, loader: Callable[[], Any], ttl: float = None) -> Any:
+        with self.__lock:
+            if (cached := self.__cached(key)) is not None:
+                count('price_cache_hits_total', source=_source(key))
+                return cached
+            future = self.__inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.__inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            with span('pricing', source=_source(key)):
+                value = loader()
+        except Exception as e:
+            with self.__lock:
+                self.__inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self.__lock:
+            self.__store(key, value, ttl)
+            self.__inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    # Same as get for coroutines, lookups running on the same event loop share one load
+    async def aget(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float = None) -> Any:
+        loop = asyncio.get_event_loop()
+        with self.__lock:
+            if (cached := self.__cached(key)) is not None:
+                count('price_cache_hits_total', source=_source(key))
+                return cached
+            task = self.__tasks.get(key)
+            if task is None or task.get_loop() is not loop:
+                task = self.__tasks[key] = loop.create_task(self.__timed_load(key, loader))
+                task.add_done_callback(lambda t: self.__on_loaded(key, t, ttl))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def __timed_load(key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        with span('pricing', source=_source(key)):
+            return await loader()
+
+    def __on_loaded(self, key: Hashable, task: asyncio.Task, ttl: float = None):
+        with self.__lock:
+            if self.__tasks.get(key) is task:
+                self.__tasks.pop(key)
+            if not task.cancelled() and task.exception() is None:
+                self.__store(key, task.result(), ttl)
+
+    def invalidate(self, key: Hashable = None):
+        with self.__lock:
+            if key is None:
+                self.__values.clear()
+            else:
+                self.__values.pop(key, None)
+
+    def fiat_map(self) -> Dict[str, str]:
+        return self.get(FIAT_MAP, get_fiat_map, FIAT_MAP_TTL)
+
+    def usdt_to_fiat(self, fiat: str) -> float:
+        return self.get((USDT_TO_FIAT, fiat), lambda: get_usdt_to_fiat(fiat, self.fiat_map()))
+
+    def price_book(self) -> PriceBook:
+        if (book := self.__streamed_book()) is not None:
+            return book
+        return self.get(PRICE_BOOK, lambda: PriceBook.from_ticker(get_binance_ticker()))
+
+    def to_usdt(self, asset: str) -> float:
+        return self.price_book().to_usdt(asset)
+
+    def to_fiat(self, asset: str, fiat: str) -> float:
+        return self.to_usdt(asset) * self.usdt_to_fiat(fiat)
+
+    async def afiat_map(self) -> Dict[str, str]:
+        return await self.aget(FIAT_MAP, aget_fiat_map, FIAT_MAP_TTL)
+
+    async def ausdt_to_fiat(self, fiat: str) -> float:
+        async def load():
+            return await aget_usdt_to_fiat(fiat, await self.afiat_map())
+        return await self.aget((USDT_TO_FIAT, fiat), load)
+
+    async def aprice_book(self) -> PriceBook:
+        if (book := self.__streamed_book()) is not None:
+            return book
+
+        async def load():
+            return PriceBook.from_ticker(await aget_binance_ticker())
+        return await self.aget(PRICE_BOOK, load)
+
+
+PRICE_ORACLE = PriceOracle()
@@ -0,0 +1,60 @@
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Runs a step on a daemon thread, like Exchanges does for a whole exchange, so a step stuck on a hanging API or
+# waiting out a rate limit pause can't keep the process from exiting once the exchange's deadline has passed
+def _submit(name: str, fn: Callable[..., Any], *args) -> Future:
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+# The API calls one exchange makes to value its positions, as named steps with the steps they depend on.
+# Steps start as soon as their dependencies are done, so independent calls overlap and a new endpoint only
+# adds latency if it is slower than the slowest call already in the plan.
+class FetchPlan:
+    def __init__(self, name: str = ''):
+        self.__name = name
+        self.__steps: Dict[str, Tuple[Callable[..., Any], List[str]]] = {}
+
+    # fn is called with the results of the steps it runs after, in order
+    def add(self, step: str, fn: Callable[..., Any], *after: str) -> 'FetchPlan':
+        missing = [dependency for dependency in after if dependency not in self.__steps]
+        if missing:
+            raise ValueError(f"{step} depends on steps that aren't in the plan yet: {', '.join(missing)}")
+        self.__steps[step] = (fn, list(after))
+        return self
+
+    # Results by step. The first step to fail fails the plan, steps that haven't started yet are skipped and
+    # steps still running are abandoned.
+    def run(self) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        running: Dict[Future, str] = {}
+        waiting = dict(self.__steps)
+        while waiting or running:
+            for step, (fn, after) in list(waiting.items()):
+                if all(dependency in results for dependency in after):
+                    del waiting[step]
+                    future = _submit(f'{self.__name}-{step}', fn, *(results[dependency] for dependency in after))
+                    running[future] = step
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                try:
+                    results[step] = future.result()
+                except Exception:
+                    logger.error(f"{self.__name} {step} failed")
+                    raise
+        return results
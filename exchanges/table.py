@@ -0,0 +1,125 @@
+from typing import Dict, List, Union
+
+import numpy as np
+
+from exchanges.interface import Position
+
+COLUMNS = ['spot_amount', 'spot_amount_in_fiat', 'margin_amount', 'margin_amount_in_fiat']
+# One row per (exchange, symbol), names are kept once in the table's exchange and symbol lists
+POSITION = np.dtype([('exchange', '<u2'), ('symbol', '<u4')] + [(column, '<f8') for column in COLUMNS])
+
+
+# Every position of a run in one structured array, so totals and cross-exchange aggregation are
+# single NumPy passes instead of loops over nested dicts of Position objects
+class PositionTable:
+    def __init__(self, fiat: str, exchanges: List[str], symbols: List[str], rows: np.ndarray):
+        self.fiat = fiat
+        self.__exchanges = exchanges
+        self.__symbols = symbols
+        self.rows = rows
+
+    @staticmethod
+    def from_positions_by_exchange(positions_by_exchange: Dict[str, Dict[str, Position]],
+                                   fiat: str = None) -> 'PositionTable':
+        exchanges = list(positions_by_exchange)
+        symbols: Dict[str, int] = {}
+        exchange_index, symbol_index = [], []
+        columns: Dict[str, List[float]] = {column: [] for column in COLUMNS}
+        for e, position_map in enumerate(positions_by_exchange.values()):
+            for symbol, p in position_map.items():
+                fiat = fiat or p.fiat
+                exchange_index.append(e)
+                symbol_index.append(symbols.setdefault(symbol, len(symbols)))
+                for column in COLUMNS:
+                    columns[column].append(getattr(p, column))
+
+        rows = np.zeros(len(exchange_index), POSITION)
+        rows['exchange'] = exchange_index
+        rows['symbol'] = symbol_index
+        for column, values in columns.items():
+            rows[column] = values
+        return PositionTable(fiat or '', exchanges, list(symbols), rows)
+
+    # Tables pass through, so callers can take either form
+    @staticmethod
+    def of(positions: Union['PositionTable', Dict[str, Dict[str, Position]]]) -> 'PositionTable':
+        if isinstance(positions, PositionTable):
+            return positions
+        return PositionTable.from_positions_by_exchange(positions)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def exchanges(self) -> List[str]:
+        return self.__exchanges
+
+    def symbols(self) -> List[str]:
+        return self.__symbols
+
+    def fiat_values(self) -> np.ndarray:
+        return self.rows['spot_amount_in_fiat'] + self.rows['margin_amount_in_fiat']
+
+    def base_amounts(self) -> np.ndarray:
+        return self.rows['spot_amount'] + self.rows['margin_amount']
+
+    def mask(self, symbol: str = None, exchange: str = None) -> np.ndarray:
+        ret = np.ones(len(self.rows), dtype=bool)
+        if symbol is not None:
+            ret &= self.rows['symbol'] == (self.__symbols.index(symbol) if symbol in self.__symbols else -1)
+        if exchange is not None:
+            ret &= self.rows['exchange'] == (self.__exchanges.index(exchange) if exchange in self.__exchanges else -1)
+        return ret
+
+    def total_fiat(self, symbol: str = None, exchange: str = None) -> float:
+        if symbol is None and exchange is None:
+            return float(self.fiat_values().sum())
+        return float(self.fiat_values()[self.mask(symbol, exchange)].sum())
+
+    # One row per symbol summed across exchanges, symbols stay in order of first appearance
+    def aggregate(self, exchange: str = 'ALL') -> 'PositionTable':
+        rows = np.zeros(len(self.__symbols), POSITION)
+        rows['symbol'] = np.arange(len(self.__symbols))
+        for column in COLUMNS:
+            rows[column] = np.bincount(self.rows['symbol'], self.rows[column], len(self.__symbols))
+        # Symbols are only listed once they have a row, so every aggregated row is real
+        return PositionTable(self.fiat, [exchange], list(self.__symbols), rows)
+
+    def positions(self, exchange: str = None) -> Dict[str, Position]:
+        rows = np.flatnonzero(self.mask(exchange=exchange)) if exchange is not None else range(len(self.rows))
+        return {view.symbol: view for view in (PositionView(self, i) for i in rows)}
+
+    def positions_by_exchange(self) -> Dict[str, Dict[str, Position]]:
+        ret: Dict[str, Dict[str, Position]] = {exchange: {} for exchange in self.__exchanges}
+        for i in range(len(self.rows)):
+            view = PositionView(self, i)
+            ret[self.__exchanges[self.rows['exchange'][i]]][view.symbol] = view
+        return ret
+
+
+def _column(name: str):
+    def get(self) -> float:
+        return float(self._table.rows[name][self._row])
+
+    def set(self, value: float):
+        self._table.rows[name][self._row] = value
+    return property(get, set)
+
+
+# The Position API over one table row, reads and writes go straight to the table
+class PositionView(Position):
+    def __init__(self, table: PositionTable, row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def symbol(self) -> str:
+        return self._table.symbols()[self._table.rows['symbol'][self._row]]
+
+    @property
+    def fiat(self) -> str:
+        return self._table.fiat
+
+    spot_amount = _column('spot_amount')
+    spot_amount_in_fiat = _column('spot_amount_in_fiat')
+    margin_amount = _column('margin_amount')
+    margin_amount_in_fiat = _column('margin_amount_in_fiat')
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+from exchanges.httpcache import HTTP_CACHE, CachePolicy, HttpCache
+from exchanges.limiter import RATE_LIMITER, RateLimiter
+from metrics import record_http
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds applied to every request that doesn't set its own
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT') or 3.05)
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT') or 20)
+# Number of hosts to keep pools for, and keep-alive connections kept per host
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE') or 8)
+
+# Called after every request with (method, url, status code or None on error, seconds)
+LatencyHook = Callable[[str, str, Optional[int], float], None]
+
+
+# One keep-alive session shared by every HTTP client so connections (and their TLS handshakes) are reused.
+# urllib3 keeps a separate connection pool per host behind the session.
+class Transport:
+    def __init__(self, timeout: Tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+                 pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE,
+                 limiter: RateLimiter = RATE_LIMITER, cache: Optional[HttpCache] = None):
+        self.timeout = timeout
+        self.limiter = limiter
+        # Public market data responses kept on disk, None sends every request
+        self.cache = cache
+        self.__session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.__session.mount('https://', adapter)
+        self.__session.mount('http://', adapter)
+        self.__hooks: List[LatencyHook] = []
+        self.__hooks_lock = threading.Lock()
+
+    def add_latency_hook(self, hook: LatencyHook):
+        with self.__hooks_lock:
+            self.__hooks.append(hook)
+
+    def remove_latency_hook(self, hook: LatencyHook):
+        with self.__hooks_lock:
+            self.__hooks.remove(hook)
+
+    # weight overrides the rate limiter's per-endpoint request weight
+    def request(self, method: str, url: str, weight: float = None, **kwargs) -> Response:
+        policy: CachePolicy = None if self.cache is None else self.cache.policy(method, url, **kwargs)
+        if policy is None:
+            return self.__send(method, url, weight, **kwargs)
+
+        entry = self.cache.lookup(url, policy)
+        if entry is not None and entry.age() < policy.ttl:
+            self.cache.record(url, 'fresh')
+            return entry.response(url)
+        if entry is not None:
+            self.cache.record(url, 'stale')
+            if self.cache.begin_refresh(url):
+                threading.Thread(target=self.__refresh, args=(method, url, weight, kwargs),
+                                 name='http-cache-refresh', daemon=True).start()
+            return entry.response(url)
+        self.cache.record(url, 'miss')
+        return self.__send_and_store(method, url, weight, **kwargs)
+
+    def __send_and_store(self, method: str, url: str, weight: float = None, **kwargs) -> Response:
+        response = self.__send(method, url, weight, **kwargs)
+        if response.status_code == 200:
+            self.cache.store(url, response.content)
+        return response
+
+    def __refresh(self, method: str, url: str, weight: float, kwargs: Dict[str, Any]):
+        try:
+            self.__send_and_store(method, url, weight, **kwargs)
+        except Exception as e:
+            logger.warning(f"Refreshing cached {url} failed: {e}")
+        finally:
+            self.cache.end_refresh(url)
+
+    def __send(self, method: str, url: str, weight: float = None, **kwargs) -> Response:
+        kwargs.setdefault('timeout', self.timeout)
+        self.limiter.acquire(url, weight)
+        status = None
+        start = time.perf_counter()
+        try:
+            response = self.__session.request(method, url, **kwargs)
+            status = response.status_code
+            self.limiter.observe(url, status, response.headers)
+            return response
+        finally:
+            self.notify(method, url, status, time.perf_counter() - start)
+
+    def get(self, url: str, **kwargs) -> Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.__session.close()
+
+    def notify(self, method: str, url: str, status: Optional[int], elapsed: float):
+        with self.__hooks_lock:
+            hooks = list(self.__hooks)
+        for hook in hooks:
+            try:
+                hook(method, url, status, elapsed)
+            except Exception as e:
+                logger.error(f"Latency hook failed: {e}")
+
+
+# asyncio counterpart of Transport built on aiohttp, which is only imported once an async client is used.
+# aiohttp sessions are bound to an event loop, so one pooled session is kept per running loop.
+# Latency hooks and the rate limiter of the sync transport are used for async requests too.
+class AsyncTransport:
+    def __init__(self, hooks: Transport, timeout: Tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+                 limit_per_host: int = POOL_MAXSIZE):
+        self.timeout = timeout
+        self.__hooks = hooks
+        self.__limit_per_host = limit_per_host
+        self.__sessions: Dict[asyncio.AbstractEventLoop, Any] = {}
+
+    def __session(self):
+        import aiohttp
+        loop = asyncio.get_event_loop()
+        session = self.__sessions.get(loop)
+        if session is None or session.closed:
+            connect, read = self.timeout
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.__limit_per_host),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read))
+            self.__sessions[loop] = session
+        return session
+
+    # Public market data goes through the sync transport's cache, stale entries are refreshed by a task on this loop
+    async def request_json(self, method: str, url: str, weight: float = None, **kwargs) -> Any:
+        cache = self.__hooks.cache
+        policy: CachePolicy = None if cache is None else cache.policy(method, url, **kwargs)
+        if policy is None:
+            return json.loads((await self.__send(method, url, weight, **kwargs))[1])
+
+        entry = cache.lookup(url, policy)
+        if entry is not None and entry.age() < policy.ttl:
+            cache.record(url, 'fresh')
+            return entry.json()
+        if entry is not None:
+            cache.record(url, 'stale')
+            if cache.begin_refresh(url):
+                asyncio.get_event_loop().create_task(self.__refresh(method, url, weight, kwargs))
+            return entry.json()
+        cache.record(url, 'miss')
+        return json.loads(await self.__send_and_store(method, url, weight, **kwargs))
+
+    async def __send_and_store(self, method: str, url: str, weight: float = None, **kwargs) -> bytes:
+        status, body = await self.__send(method, url, weight, **kwargs)
+        if status == 200:
+            self.__hooks.cache.store(url, body)
+        return body
+
+    async def __refresh(self, method: str, url: str, weight: float, kwargs: Dict[str, Any]):
+        try:
+            await self.__send_and_store(method, url, weight, **kwargs)
+        except Exception as e:
+            logger.warning(f"Refreshing cached {url} failed: {e}")
+        finally:
+            self.__hooks.cache.end_refresh(url)
+
+    async def __send(self, method: str, url: str, weight: float = None, **kwargs) -> Tuple[int, bytes]:
+        wait = self.__hooks.limiter.reserve(url, weight)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        status = None
+        start = time.perf_counter()
+        try:
+            async with self.__session().request(method, url, **kwargs) as response:
+                status = response.status
+                self.__hooks.limiter.observe(url, status, response.headers)
+                return status, await response.read()
+        finally:
+            self.__hooks.notify(method, url, status, time.perf_counter() - start)
+
+    async def get_json(self, url: str, **kwargs) -> Any:
+        return await self.request_json('GET', url, **kwargs)
+
+    # Closes the session of the running loop, call before the loop shuts down
+    async def close(self):
+        session = self.__sessions.pop(asyncio.get_event_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+TRANSPORT = Transport(cache=HttpCache() if HTTP_CACHE else None)
+# Requests per host, by status, and time spent waiting on each host
+TRANSPORT.add_latency_hook(record_http)
+ASYNC_TRANSPORT = AsyncTransport(TRANSPORT)
@@ -1,10 +1,14 @@
-from typing import Dict
+from typing import Dict, List
 
-import requests
+from exchanges.transport import TRANSPORT, ASYNC_TRANSPORT
+
+CMC_BASE_URL = 'https://web-api.coinmarketcap.com'
+BINANCE_BASE_URL = 'https://api.binance.com'
+USDT_CMC_ID = '825'
 
 
 def get_fiat_map() -> Dict[str, str]:
-    r = requests.get('https://web-api.coinmarketcap.com/v1/fiat/map')
+    r = TRANSPORT.get(f'{CMC_BASE_URL}/v1/fiat/map')
     data = r.json()['data']
     '''
     symbol -> {
@@ -14,12 +18,40 @@ def get_fiat_map() -> Dict[str, str]:
         symbol
     }
     '''
+    return _to_fiat_map(data)
+
+
+def _to_fiat_map(data: List[Dict]) -> Dict[str, str]:
     return {item['symbol']: item['id'] for item in data}
 
 
-def get_usdt_to_fiat(fiat: str = 'CAD') -> float:
-    fiat_map = get_fiat_map()
-    r = requests.get(
-        f'https://web-api.coinmarketcap.com/v1/tools/price-conversion?amount=1&convert_id=825&id={fiat_map[fiat]}')
+def _usdt_to_fiat_url(fiat_id: str) -> str:
+    return f'{CMC_BASE_URL}/v1/tools/price-conversion?amount=1&convert_id={USDT_CMC_ID}&id={fiat_id}'
+
+
+def get_usdt_to_fiat(fiat: str = 'CAD', fiat_map: Dict[str, str] = None) -> float:
+    if fiat_map is None:
+        fiat_map = get_fiat_map()
+    r = TRANSPORT.get(_usdt_to_fiat_url(fiat_map[fiat]))
     data = r.json()['data']
-    return 1 / data['quote']['825']['price']
\ No newline at end of file
+    return 1 / data['quote'][USDT_CMC_ID]['price']
+
+
+def get_binance_ticker() -> List[Dict]:
+    return TRANSPORT.get(f'{BINANCE_BASE_URL}/api/v3/ticker/price').json()
+
+
+async def aget_fiat_map() -> Dict[str, str]:
+    data = (await ASYNC_TRANSPORT.get_json(f'{CMC_BASE_URL}/v1/fiat/map'))['data']
+    return _to_fiat_map(data)
+
+
+async def aget_usdt_to_fiat(fiat: str = 'CAD', fiat_map: Dict[str, str] = None) -> float:
+    if fiat_map is None:
+        fiat_map = await aget_fiat_map()
+    data = (await ASYNC_TRANSPORT.get_json(_usdt_to_fiat_url(fiat_map[fiat])))['data']
+    return 1 / data['quote'][USDT_CMC_ID]['price']
+
+
+async def aget_binance_ticker() -> List[Dict]:
+    return await ASYNC_TRANSPORT.get_json(f'{BINANCE_BASE_URL}/api/v3/ticker/price')
@@ -1,60 +1,197 @@
 import logging
+import threading
 import time
+import traceback
 from datetime import date
-import firebase_admin
+from typing import Dict, List, Optional, Tuple
 import os
-from firebase_admin import credentials, firestore
+
+import numpy as np
+
+from exchanges.table import PositionTable
+from firestore.retention import RETENTION_POLICY, RetentionTier, compact
+from firestore.shards import shard_id, shard_ids
+from firestore.snapshot import Snapshot, decode, encode
+from metrics import timed
 
 logger = logging.getLogger(__name__)
 
-FIRESTORE_JSON = os.getenv('FIRESTORE_ADMIN')
-if FIRESTORE_JSON is None:
-    logger.warning("LOCAL USE")
-else:
-    with open("firestore-admin.json", "w") as jsonFile:
-        jsonFile.write(FIRESTORE_JSON)
+_client = None
+_client_lock = threading.Lock()
+
+
+# firebase_admin pulls in gRPC and the Google Cloud SDK, so it is imported and initialized on the first Firestore call
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            with timed('import firebase_admin'):
+                import firebase_admin
+                from firebase_admin import credentials, firestore
+            with timed('init firestore'):
+                firestore_json = os.getenv('FIRESTORE_ADMIN')
+                if firestore_json is None:
+                    logger.warning("LOCAL USE")
+                else:
+                    with open("firestore-admin.json", "w") as jsonFile:
+                        jsonFile.write(firestore_json)
+
+                cred = credentials.Certificate('firestore-admin.json')
+                firebase_admin.initialize_app(cred)
+                _client = firestore.client()
+        return _client
+
+
+def delete_field():
+    from firebase_admin import firestore
+    return firestore.DELETE_FIELD
 
-cred = credentials.Certificate('firestore-admin.json')
-firebase_admin.initialize_app(cred)
-FIRESTORE_CLIENT = firestore.client()
 
 HISTORY = 'HISTORY'
+SNAPSHOTS = 'SNAPSHOTS'
 BALANCE = 'BALANCE'
+# Firestore rejects batches with more writes than this
+MAX_BATCH_WRITES = 500
+# Firestore rejects bytes fields larger than this
+MAX_FIELD_BYTES = 1024 * 1024 - 89
 
 
 class FireStore:
-    def __init__(self):
-        self.__fiat = os.getenv('FIAT_CURRENCY')
-    
-    def _get_historic_balances_map(self):
-        doc_ref = FIRESTORE_CLIENT.collection(BALANCE).document(self.__fiat)
-        balance_json = doc_ref.get().to_dict()
-        if balance_json is None:
-            return {}
-        return balance_json
-
-    def get_historic_balances(self):
-        balance_json = self._get_historic_balances_map()
-        balances = [(int(t), balance) for t, balance in balance_json.items()]
+    # document: BALANCE/<document> holding the history, the fiat currency unless one of several portfolios
+    def __init__(self, document: str = None):
+        self.__fiat = document or os.getenv('FIAT_CURRENCY')
+
+    # BALANCE/<fiat> used to hold every point, history now lives in its HISTORY sub-collection, one document per month
+    def __balance_ref(self):
+        return get_client().collection(BALANCE).document(self.__fiat)
+
+    def __history_ref(self):
+        return self.__balance_ref().collection(HISTORY)
+
+    # Per-exchange, per-asset snapshots live next to the totals, one document per snapshot named by its timestamp,
+    # so no document grows with the number of runs
+    def __snapshots_ref(self):
+        return self.__balance_ref().collection(SNAPSHOTS)
+
+    # Shard id -> {timestamp: balance} for the shards overlapping [start, end], or every shard without a start
+    def _get_historic_shards(self, start: int = None, end: int = None) -> Dict[str, Dict[str, float]]:
+        if start is None:
+            snapshots = self.__history_ref().stream()
+        else:
+            end = int(time.time()) if end is None else end
+            refs = [self.__history_ref().document(shard) for shard in shard_ids(start, end)]
+            snapshots = get_client().get_all(refs)
+        return {snapshot.id: snapshot.to_dict() for snapshot in snapshots if snapshot.exists}
+
+    def get_historic_balances(self, start: int = None, end: int = None) -> List[Tuple[int, float]]:
+        balances = []
+        for shard in self._get_historic_shards(start, end).values():
+            balances += [(int(t), balance) for t, balance in shard.items()]
+        if start is not None:
+            balances = [b for b in balances if b[0] >= start]
+        if end is not None:
+            balances = [b for b in balances if b[0] <= end]
         balances.sort(key=lambda x: x[0])
         return balances
 
-    def update_historic_balances(self, positions_by_exchange, current_time: int = int(time.time())):
-        total_fiat = 0
-        for exchange, position_map in positions_by_exchange.items():
-            for position in position_map.values():
-                total_fiat += position.total_fiat()
+    def update_historic_balances(self, positions, current_time: int = None) -> Tuple[int, float]:
+        if current_time is None:
+            current_time = int(time.time())
+        table = PositionTable.of(positions)
+        total_fiat = table.total_fiat()
 
-        doc_ref = FIRESTORE_CLIENT.collection(BALANCE).document(self.__fiat)
-        doc_ref.set({str(current_time): total_fiat}, merge=True)
+        self.__history_ref().document(shard_id(current_time)).set({str(current_time): total_fiat}, merge=True)
+        # Written on its own, so the total is kept even if the snapshot can't be
+        try:
+            data = encode(table)
+            if len(data) > MAX_FIELD_BYTES:
+                raise ValueError(f"Snapshot of {len(data)} bytes is larger than Firestore allows")
+            self.__snapshots_ref().document(str(current_time)).set({'time': current_time, 'snapshot': data})
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(e)
+        return current_time, total_fiat
+
+    def get_snapshots(self, start: int, end: int = None) -> List[Tuple[int, Snapshot]]:
+        end = int(time.time()) if end is None else end
+        documents = self.__snapshots_ref().where('time', '>=', start).where('time', '<=', end).order_by('time').stream()
+        return [(document.get('time'), decode(document.get('snapshot'))) for document in documents]
+
+    # The newest snapshot, or None before the first one
+    def get_last_snapshot(self) -> Optional[Tuple[int, Snapshot]]:
+        documents = self.__snapshots_ref().order_by('time', direction='DESCENDING').limit(1).stream()
+        return next(((document.get('time'), decode(document.get('snapshot'))) for document in documents), None)
+
+    # Fiat value over time of one asset, one exchange, or one asset on one exchange, without asking the exchanges
+    def get_asset_history(self, start: int, end: int = None, symbol: str = None,
+                          exchange: str = None) -> Tuple[np.ndarray, np.ndarray]:
+        snapshots = self.get_snapshots(start, end)
+        timestamps = np.fromiter((t for t, _ in snapshots), np.int64, len(snapshots))
+        values = np.fromiter((s.total_fiat(symbol, exchange) for _, s in snapshots), np.float64, len(snapshots))
+        return timestamps, values
+
+    # Fiat value over time of every exchange, from one read of the snapshots
+    def get_exchange_histories(self, start: int, end: int = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        snapshots = self.get_snapshots(start, end)
+        timestamps = np.fromiter((t for t, _ in snapshots), np.int64, len(snapshots))
+        exchanges = sorted({exchange for _, s in snapshots for exchange in s.exchanges})
+        return timestamps, {exchange: np.fromiter((s.total_fiat(exchange=exchange) for _, s in snapshots), np.float64,
+                                                  len(snapshots))
+                            for exchange in exchanges}
+
+    # Applies {timestamp: value or DELETE_FIELD} changes with one merge per shard, batched into as few commits as possible
+    def __commit(self, changes: Dict[int, object]) -> int:
+        by_shard: Dict[str, Dict[str, object]] = {}
+        for t, value in changes.items():
+            by_shard.setdefault(shard_id(t), {})[str(t)] = value
+
+        shards = list(by_shard.items())
+        for i in range(0, len(shards), MAX_BATCH_WRITES):
+            batch = get_client().batch()
+            for shard, fields in shards[i:i + MAX_BATCH_WRITES]:
+                batch.set(self.__history_ref().document(shard), fields, merge=True)
+            batch.commit()
+        return (len(shards) + MAX_BATCH_WRITES - 1) // MAX_BATCH_WRITES
 
     def delete_below(self, threshold: float):
-        balance_map = self._get_historic_balances_map()
-        for t, value in balance_map.items():
-            if value > threshold:
-                continue
-            doc_ref = FIRESTORE_CLIENT.collection(BALANCE).document(self.__fiat)
-            doc_ref.set({str(t): firestore.DELETE_FIELD}, merge=True)
+        balances = self.get_historic_balances()
+        commits = self.__commit({t: delete_field() for t, value in balances if value <= threshold})
+        logger.info(f"Deleted balances below {threshold} in {commits} batched writes")
+
+    # Downsamples old history according to the retention policy, e.g. hourly after a week and daily after 90 days
+    def compact(self, policy: List[RetentionTier] = RETENTION_POLICY, now: int = None) -> int:
+        now = int(time.time()) if now is None else now
+        # Nothing younger than the first tier can change
+        balances = self.get_historic_balances(end=now - min(tier.age for tier in policy))
+        if not balances:
+            return 0
+        timestamps = np.fromiter((b[0] for b in balances), np.int64, len(balances))
+        values = np.fromiter((b[1] for b in balances), np.float64, len(balances))
+        compaction = compact(timestamps, values, policy, now)
+
+        changes: Dict[int, object] = {int(t): delete_field() for t in compaction.deletes}
+        changes.update(compaction.writes)
+        commits = self.__commit(changes)
+        logger.info(f"Compacted {len(compaction.deletes)} balances into {len(compaction.writes)} rollups "
+                    f"in {commits} batched writes")
+        return len(compaction.deletes)
+
+    # One-off move of points stored in the pre-shard BALANCE/<fiat> document into the monthly shards
+    def migrate_legacy_history(self):
+        legacy = self.__balance_ref().get().to_dict() or {}
+        if not legacy:
+            return
+        shards: Dict[str, Dict[str, float]] = {}
+        for t, balance in legacy.items():
+            shards.setdefault(shard_id(int(t)), {})[t] = balance
+
+        batch = get_client().batch()
+        for shard, balance_map in shards.items():
+            batch.set(self.__history_ref().document(shard), balance_map, merge=True)
+        batch.set(self.__balance_ref(), {t: delete_field() for t in legacy}, merge=True)
+        batch.commit()
+        logger.info(f"Migrated {len(legacy)} balances into {len(shards)} shards")
+
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
@@ -62,6 +199,7 @@ if __name__ == "__main__":
     load_dotenv(dotenv_path='../.env')
 
     f_client = FireStore()
+    f_client.migrate_legacy_history()
     f_client.delete_below(10000)
     balances = f_client.get_historic_balances()
 
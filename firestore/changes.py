@@ -0,0 +1,120 @@
+import hashlib
+import logging
+import os
+import time
+import traceback
+from typing import NamedTuple, Optional
+
+import msgpack
+
+from exchanges.table import PositionTable
+from firestore import FireStore
+from firestore.mirror import HISTORY_CACHE_DIR
+from firestore.snapshot import decode, encode
+
+logger = logging.getLogger(__name__)
+
+# A run is worth publishing when the total moved by at least this much fiat or this fraction of the last total,
+# 0 turns a threshold off
+CHANGE_MIN_FIAT = float(os.getenv('CHANGE_MIN_FIAT') or 0)
+CHANGE_MIN_RELATIVE = float(os.getenv('CHANGE_MIN_RELATIVE') or 0.01)
+# Seconds after which a run is published even if nothing moved, 0 publishes every run
+CHANGE_HEARTBEAT = float(os.getenv('CHANGE_HEARTBEAT') or 6 * 60 * 60)
+# Amounts are compared at this many decimals so float noise from summing balances isn't a change
+AMOUNT_DECIMALS = 8
+
+
+class Change(NamedTuple):
+    reason: Optional[str]
+    total_fiat: float
+    delta_fiat: float
+
+    @property
+    def significant(self) -> bool:
+        return self.reason is not None
+
+
+# Hash of what is held where, independent of prices: it only changes on trades, deposits and withdrawals
+def fingerprint(positions) -> str:
+    table = PositionTable.of(positions)
+    exchanges, symbols = table.exchanges(), table.symbols()
+    digest = hashlib.sha1()
+    for row in sorted((exchanges[row['exchange']], symbols[row['symbol']],
+                       round(float(row['spot_amount']), AMOUNT_DECIMALS),
+                       round(float(row['margin_amount']), AMOUNT_DECIMALS)) for row in table.rows):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+# The last snapshot that was persisted and what changed since. The newest snapshot in Firestore is the baseline,
+# cached on local disk next to the history mirror so a long-running process or a warm disk doesn't read it every run.
+class LastSnapshot:
+    # firestore: where snapshots are persisted, without one the local file is the only baseline
+    def __init__(self, name: str, firestore: FireStore = None, directory: str = HISTORY_CACHE_DIR,
+                 min_fiat: float = CHANGE_MIN_FIAT, min_relative: float = CHANGE_MIN_RELATIVE,
+                 heartbeat: float = CHANGE_HEARTBEAT):
+        os.makedirs(directory, exist_ok=True)
+        self.__path = os.path.join(directory, f'{name}.last')
+        self.__firestore = firestore
+        self.__min_fiat = min_fiat
+        self.__min_relative = min_relative
+        self.__heartbeat = heartbeat
+
+    def __load(self) -> Optional[dict]:
+        if os.path.exists(self.__path):
+            try:
+                with open(self.__path, 'rb') as f:
+                    return msgpack.unpackb(f.read(), raw=False)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable last snapshot {self.__path}: {e}")
+        if self.__firestore is None:
+            return None
+        try:
+            last = self.__firestore.get_last_snapshot()
+        except Exception as e:
+            # Without a baseline the run publishes, as it did before change detection
+            traceback.print_exc()
+            logging.error(e)
+            return None
+        if last is None:
+            return None
+        t, snapshot = last
+        table = snapshot.table('')
+        record = {'time': t, 'fingerprint': fingerprint(table), 'snapshot': encode(table)}
+        self.__write(record)
+        return record
+
+    def __write(self, record: dict):
+        with open(self.__path + '.tmp', 'wb') as f:
+            f.write(msgpack.packb(record, use_bin_type=True))
+        os.replace(self.__path + '.tmp', self.__path)
+
+    def diff(self, positions, now: int = None) -> Change:
+        now = int(time.time()) if now is None else now
+        table = PositionTable.of(positions)
+        total = table.total_fiat()
+        last = self.__load()
+        if last is None:
+            return Change('no previous snapshot', total, total)
+
+        previous = decode(last['snapshot']).total_fiat()
+        delta = total - previous
+        if last['fingerprint'] != fingerprint(table):
+            reason = 'holdings changed'
+        elif self.__min_fiat > 0 and abs(delta) >= self.__min_fiat:
+            reason = f'total moved {delta:+.2f}'
+        elif self.__min_relative > 0 and delta and abs(delta) >= self.__min_relative * abs(previous):
+            reason = f'total moved {delta / previous if previous else float("inf"):+.2%}'
+        elif now - last['time'] >= self.__heartbeat:
+            reason = f"nothing published for {now - last['time']}s"
+        else:
+            reason = None
+        return Change(reason, total, delta)
+
+    def save(self, positions, now: int = None):
+        table = PositionTable.of(positions)
+        self.__write({
+            'time': int(time.time()) if now is None else now,
+            'fingerprint': fingerprint(table),
+            'snapshot': encode(table),
+        })
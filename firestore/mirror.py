@@ -0,0 +1,116 @@
+import logging
+import os
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from firestore.rollup import DAY, HOUR, ROLLUP, rollup
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE_DIR = os.getenv('HISTORY_CACHE_DIR') or os.path.join('.cache', 'history')
+TIMESTAMP = np.dtype('<i8')
+VALUE = np.dtype('<f8')
+ROLLUP_PERIODS = {'hourly': HOUR, 'daily': DAY}
+# A series is drawn from the finest resolution that has at most this many points per output point
+POINTS_PER_PIXEL = 8
+
+
+# Append-only copy of a balance series on local disk, stored as two flat files of timestamps and values.
+# Reads memory-map the files so the series is never parsed or sorted in Python, whatever its length.
+class HistoryMirror:
+    def __init__(self, name: str, directory: str = HISTORY_CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.__timestamps_path = os.path.join(directory, f'{name}.ts')
+        self.__values_path = os.path.join(directory, f'{name}.values')
+        self.__rollup_paths = {period: os.path.join(directory, f'{name}.{label}')
+                               for label, period in ROLLUP_PERIODS.items()}
+        self.__series: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        # Values are written before timestamps, so a run killed mid-append leaves at most an unreferenced value
+        if not os.path.exists(self.__timestamps_path) or not os.path.exists(self.__values_path):
+            return 0
+        return min(os.path.getsize(self.__timestamps_path) // TIMESTAMP.itemsize,
+                   os.path.getsize(self.__values_path) // VALUE.itemsize)
+
+    def series(self) -> Tuple[np.ndarray, np.ndarray]:
+        count = len(self)
+        if self.__series is None or len(self.__series[0]) != count:
+            if count == 0:
+                self.__series = np.empty(0, TIMESTAMP), np.empty(0, VALUE)
+            else:
+                self.__series = (np.memmap(self.__timestamps_path, dtype=TIMESTAMP, mode='r', shape=(count,)),
+                                 np.memmap(self.__values_path, dtype=VALUE, mode='r', shape=(count,)))
+        return self.__series
+
+    # Newest timestamp mirrored so far, the cursor the next sync resumes from
+    def high_water_mark(self) -> Optional[int]:
+        timestamps, _ = self.series()
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def append(self, points: Iterable[Tuple[int, float]]):
+        hwm = self.high_water_mark()
+        points = sorted(p for p in points if hwm is None or p[0] > hwm)
+        if not points:
+            return
+        count = len(self)
+        timestamps = np.fromiter((p[0] for p in points), TIMESTAMP, len(points))
+        values = np.fromiter((p[1] for p in points), VALUE, len(points))
+        for path, array, dtype in ((self.__values_path, values, VALUE), (self.__timestamps_path, timestamps, TIMESTAMP)):
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                # Drop any tail left behind by an interrupted append before writing
+                f.truncate(count * dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(array.tobytes())
+        self.__series = None
+        self.__update_rollups()
+
+    def rollups(self, period: int) -> np.ndarray:
+        path = self.__rollup_paths[period]
+        count = os.path.getsize(path) // ROLLUP.itemsize if os.path.exists(path) else 0
+        if count == 0:
+            return np.empty(0, ROLLUP)
+        return np.memmap(path, dtype=ROLLUP, mode='r', shape=(count,))
+
+    # Rollups are kept up to date on append: only the last (possibly partial) bucket and the new points are recomputed
+    def __update_rollups(self):
+        timestamps, values = self.series()
+        for period, path in self.__rollup_paths.items():
+            existing = self.rollups(period)
+            keep = max(len(existing) - 1, 0)
+            start = np.searchsorted(timestamps, existing['start'][-1]) if len(existing) else 0
+            rolled = rollup(timestamps[start:], values[start:], period)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                f.truncate(keep * ROLLUP.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(rolled.tobytes())
+
+    # Raw points when there are few enough of them, otherwise the closing balance of hourly or daily rollups,
+    # so the cost of drawing depends on the output width rather than on how much history exists
+    def series_at_resolution(self, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        timestamps, values = self.series()
+        budget = width * POINTS_PER_PIXEL
+        if len(timestamps) <= budget:
+            return timestamps, values
+        for period in sorted(self.__rollup_paths):
+            rolled = self.rollups(period)
+            if len(rolled) <= budget:
+                break
+        return rolled['start'], rolled['close']
+
+    # Pulls only the points newer than the high-water mark, usually just the current month's shard
+    def sync(self, firestore) -> int:
+        hwm = self.high_water_mark()
+        points = firestore.get_historic_balances(start=None if hwm is None else hwm + 1)
+        before = len(self)
+        self.append(points)
+        logger.info(f"Synced {len(self) - before} balances into local history ({len(self)} total)")
+        return len(self) - before
+
+    # Forget the local copy, e.g. after points were deleted or compacted in Firestore
+    def reset(self):
+        self.__series = None
+        for path in (self.__timestamps_path, self.__values_path, *self.__rollup_paths.values()):
+            if os.path.exists(path):
+                os.remove(path)
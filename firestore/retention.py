@@ -0,0 +1,65 @@
+import os
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from firestore.rollup import DAY, HOUR
+
+UNITS = {'m': 60, 'h': HOUR, 'd': DAY}
+
+
+class RetentionTier(NamedTuple):
+    # Points older than age (seconds) are merged into one point per period (seconds)
+    age: int
+    period: int
+
+
+# Raw points for a week, hourly after that, daily after 90 days
+DEFAULT_POLICY = [RetentionTier(7 * DAY, HOUR), RetentionTier(90 * DAY, DAY)]
+
+
+def _seconds(duration: str) -> int:
+    return int(duration[:-1]) * UNITS[duration[-1]]
+
+
+# Parses a policy such as "7d:1h,90d:1d"
+def parse_policy(policy: str) -> List[RetentionTier]:
+    tiers = []
+    for tier in policy.split(','):
+        age, period = tier.strip().split(':')
+        tiers.append(RetentionTier(_seconds(age), _seconds(period)))
+    return sorted(tiers)
+
+
+RETENTION_POLICY = parse_policy(os.getenv('RETENTION_POLICY')) if os.getenv('RETENTION_POLICY') else DEFAULT_POLICY
+
+
+class Compaction(NamedTuple):
+    # Timestamps to remove, and the merged points (bucket start -> mean) that replace them
+    deletes: np.ndarray
+    writes: Dict[int, float]
+
+
+# Works out in one vectorized pass which points a policy merges.
+# A bucket is only merged once all of it is past the tier's age, so every point in it went through the previous tier
+# and means are taken over evenly spaced points. Buckets already reduced to a single point at their start are left alone.
+def compact(timestamps: np.ndarray, values: np.ndarray, policy: List[RetentionTier], now: int) -> Compaction:
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(timestamps) == 0:
+        return Compaction(np.empty(0, np.int64), {})
+
+    keys = timestamps.copy()
+    for tier in sorted(policy):
+        starts = timestamps // tier.period * tier.period
+        aged = starts + tier.period <= now - tier.age
+        keys[aged] = starts[aged]
+
+    unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    means = np.bincount(inverse, weights=values) / counts
+    merged = (counts > 1) | (np.bincount(inverse, weights=(timestamps != keys)) > 0)
+
+    in_merged = merged[inverse]
+    deletes = timestamps[in_merged & (timestamps != keys)]
+    writes = {int(key): float(mean) for key, mean in zip(unique[merged], means[merged])}
+    return Compaction(deletes, writes)
@@ -0,0 +1,35 @@
+import numpy as np
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+ROLLUP = np.dtype([
+    ('start', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('mean', '<f8'),
+    ('count', '<i8'),
+])
+
+
+# Buckets a sorted series into fixed periods (aligned to the epoch) with open/high/low/close/mean per bucket
+def rollup(timestamps: np.ndarray, values: np.ndarray, period: int) -> np.ndarray:
+    if len(timestamps) == 0:
+        return np.empty(0, ROLLUP)
+    timestamps = np.asarray(timestamps)
+    values = np.asarray(values, dtype=np.float64)
+    buckets = timestamps // period
+    firsts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[firsts, len(values)])
+
+    ret = np.empty(len(firsts), ROLLUP)
+    ret['start'] = buckets[firsts] * period
+    ret['open'] = values[firsts]
+    ret['high'] = np.maximum.reduceat(values, firsts)
+    ret['low'] = np.minimum.reduceat(values, firsts)
+    ret['close'] = values[firsts + counts - 1]
+    ret['mean'] = np.add.reduceat(values, firsts) / counts
+    ret['count'] = counts
+    return ret
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+# History is split into one document per calendar month (UTC), named like 2021-03
+SHARD_FORMAT = '%Y-%m'
+DAY = 24 * 60 * 60
+
+
+def shard_id(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime(SHARD_FORMAT)
+
+
+def _next_month(year: int, month: int) -> Tuple[int, int]:
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+# Ids of every shard overlapping [start, end], oldest first
+def shard_ids(start: int, end: int) -> List[str]:
+    first = datetime.fromtimestamp(start, tz=timezone.utc)
+    last = datetime.fromtimestamp(end, tz=timezone.utc)
+    year, month = first.year, first.month
+    ret = []
+    while (year, month) <= (last.year, last.month):
+        ret.append(f'{year:04d}-{month:02d}')
+        year, month = _next_month(year, month)
+    return ret
+
+
+# [start, end) timestamps covered by a shard
+def shard_bounds(shard: str) -> Tuple[int, int]:
+    year, month = (int(part) for part in shard.split('-'))
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(*_next_month(year, month), 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
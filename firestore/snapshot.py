@@ -0,0 +1,89 @@
+from typing import Dict, List, NamedTuple
+
+import msgpack
+import numpy as np
+
+from exchanges.interface import Position
+from exchanges.table import POSITION, PositionTable
+
+VERSION = 1
+COLUMNS = ['spot_amount', 'spot_amount_in_fiat', 'margin_amount', 'margin_amount_in_fiat']
+FLOAT = np.dtype('<f8')
+INDEX = np.dtype('<u2')
+
+
+# Every position of one run as columns: row i is exchanges[exchange[i]] / symbols[symbol[i]]
+class Snapshot(NamedTuple):
+    exchanges: List[str]
+    symbols: List[str]
+    exchange: np.ndarray
+    symbol: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+    def mask(self, symbol: str = None, exchange: str = None) -> np.ndarray:
+        ret = np.ones(len(self.symbol), dtype=bool)
+        if symbol is not None:
+            ret &= self.symbol == (self.symbols.index(symbol) if symbol in self.symbols else -1)
+        if exchange is not None:
+            ret &= self.exchange == (self.exchanges.index(exchange) if exchange in self.exchanges else -1)
+        return ret
+
+    def total_fiat(self, symbol: str = None, exchange: str = None) -> float:
+        mask = self.mask(symbol, exchange)
+        return float(self.columns['spot_amount_in_fiat'][mask].sum() + self.columns['margin_amount_in_fiat'][mask].sum())
+
+    def table(self, fiat: str) -> PositionTable:
+        rows = np.zeros(len(self.symbol), POSITION)
+        rows['exchange'] = self.exchange
+        rows['symbol'] = self.symbol
+        for column in COLUMNS:
+            rows[column] = self.columns[column]
+        return PositionTable(fiat, list(self.exchanges), list(self.symbols), rows)
+
+    def positions_by_exchange(self, fiat: str) -> Dict[str, Dict[str, Position]]:
+        return self.table(fiat).positions_by_exchange()
+
+
+# Layout: exchange and symbol name dictionaries, row counts per exchange, symbol indexes sorted within each exchange
+# and stored as deltas (small numbers), then one little-endian float64 array per column, all packed with msgpack
+def encode(positions) -> bytes:
+    table = PositionTable.of(positions)
+    exchanges = table.exchanges()
+    # Rank of each of the table's symbols among the sorted names
+    order = np.argsort(np.array(table.symbols(), dtype=object), kind='stable')
+    rank = np.empty(len(order), np.int64)
+    rank[order] = np.arange(len(order))
+
+    rows = table.rows[np.lexsort((rank[table.rows['symbol']], table.rows['exchange']))]
+    counts = np.bincount(rows['exchange'], minlength=len(exchanges))
+    symbol = rank[rows['symbol']]
+    deltas = np.diff(symbol, prepend=0)
+    # Each exchange's first row is stored as its absolute index
+    firsts = (np.cumsum(counts) - counts)[counts > 0]
+    deltas[firsts] = symbol[firsts]
+
+    return msgpack.packb({
+        'version': VERSION,
+        'exchanges': exchanges,
+        'symbols': [table.symbols()[i] for i in order],
+        'counts': counts.astype(INDEX).tobytes(),
+        'symbol_deltas': deltas.astype(INDEX).tobytes(),
+        'columns': {column: np.ascontiguousarray(rows[column], FLOAT).tobytes() for column in COLUMNS},
+    }, use_bin_type=True)
+
+
+def decode(data: bytes) -> Snapshot:
+    packed = msgpack.unpackb(data, raw=False)
+    counts = np.frombuffer(packed['counts'], INDEX).astype(np.int64)
+    deltas = np.frombuffer(packed['symbol_deltas'], INDEX).astype(np.int64)
+
+    exchange = np.repeat(np.arange(len(counts)), counts)
+    # Undo the per-exchange delta encoding: running sum minus the running sum before each exchange's first row
+    running = np.cumsum(deltas)
+    firsts = np.cumsum(counts) - counts
+    present = counts > 0
+    base = np.repeat(running[firsts[present]] - deltas[firsts[present]], counts[present])
+    symbol = running - base
+
+    columns = {column: np.frombuffer(values, FLOAT) for column, values in packed['columns'].items()}
+    return Snapshot(packed['exchanges'], packed['symbols'], exchange, symbol, columns)
@@ -1,43 +1,62 @@
+import base64
 import logging
 import os
-import matplotlib.pyplot as plt
-from datetime import date
-from imgurpython import ImgurClient
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+from imgur.pool import Chart, RenderPool
+from imgur.render import PRESETS
+from metrics import span, timed
 
-plt.style.use('ggplot')
 logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO, datefmt='%m/%d/%Y %I:%M:%S %p')
 logger = logging.getLogger(__name__)
 
-temp_file_name = 'temp.png'
 CRYPTO_BALANCE_CHECK = 'Crypto Balance Check'
+# One of imgur.render.PRESETS
+GRAPH_PRESET = os.getenv('GRAPH_PRESET') or 'default'
+# Days of per-exchange graphs sent next to the total, 0 sends only the total
+GRAPH_BREAKDOWN_DAYS = float(os.getenv('GRAPH_BREAKDOWN_DAYS') or 0)
+TOTAL = 'Crypto'
 
 
 class Imgur:
-    def __init__(self):
+    def __init__(self, preset: str = GRAPH_PRESET):
         client_id = os.getenv('IMGUR_CLIENT_ID')
         client_secret = os.getenv('IMGUR_CLIENT_SECRET')
         self.__fiat = os.getenv('FIAT_CURRENCY')
-        if client_id == "" or client_secret == "":
+        self.client = None
+        if not client_id or not client_secret:
             logger.warning('INVALID IMGUR CREDENTIALS')
         else:
+            with timed('import imgurpython'):
+                from imgurpython import ImgurClient
             logger.warning('IMGUR INITIALIZED')
             self.client = ImgurClient(client_id, client_secret)
+        if preset not in PRESETS:
+            logger.warning(f"Unknown graph preset {preset}, using default. Presets: {', '.join(PRESETS)}")
+            preset = 'default'
+        self.__renderer = RenderPool(PRESETS[preset])
 
-    def _create_graph(self, x, y):
-        if len(x) == 0 or len(y) == 0:
-            return ""
-        start, end = date.fromtimestamp(x[0]), date.fromtimestamp(x[-1])
-        fig, ax = plt.subplots(1, dpi=300)
-        ax.plot(x, y, alpha=0.5)
-        ax.axes.xaxis.set_visible(False)
-        ax.yaxis.set_major_formatter('${x:1.2f}')
-        ax.yaxis.set_tick_params(which='major', labelleft=False, labelright=True)
-        plt.title(f'Crypto Balance: {start} - {end}')
-        plt.xlabel('Time')
-        plt.ylabel(f'{self.__fiat} $')
-        fig.savefig(temp_file_name)
-        plt.close()
-        return temp_file_name
+    def graph_width(self) -> int:
+        return self.__renderer.width()
+
+    # Starts the render workers so the first send_graphs doesn't wait for them
+    def warm(self):
+        self.__renderer.warm()
+
+    @span('render')
+    def _create_graph(self, x, y, xlabel: str = 'Time', ylabel: str = '') -> bytes:
+        return self.__renderer.render(Chart(x, y, 'Crypto Balance', xlabel, ylabel or f'{self.__fiat} $'))
+
+    # Same request as ImgurClient.upload_from_path, but from bytes already in memory
+    @span('upload')
+    def _upload(self, image: bytes, config):
+        data = {
+            'image': base64.b64encode(image),
+            'type': 'base64',
+        }
+        data.update({meta: config[meta] for meta in set(self.client.allowed_image_fields).intersection(config.keys())})
+        return self.client.make_request('POST', 'upload', data, True)
 
     def send_graph(self, x, y, title=CRYPTO_BALANCE_CHECK, xlabel='Time', ylabel: str = '') -> str:
         if self.client is None:
@@ -49,9 +68,28 @@ class Imgur:
             'title': title,
             'description': f'{x[0]} to {x[-1]}'
         }
-        filename = self._create_graph(x, y)
+        image = self._create_graph(x, y, xlabel, ylabel)
         logger.warning('UPLOADING IMAGE')
-        return self.client.upload_from_path(filename, config)['link']
+        return self._upload(image, config)['link']
+
+    # Chart name -> link for many (x, y) series, e.g. the total and one per exchange, rendered in parallel
+    def send_graphs(self, series: Dict[str, Tuple], xlabel='Time', ylabel: str = '') -> Dict[str, str]:
+        if self.client is None:
+            logger.warning('INVALID IMGUR CREDENTIALS')
+            return {}
+        series = {name: (x, y) for name, (x, y) in series.items() if len(x)}
+        ylabel = ylabel or f'{self.__fiat} $'
+        with span('render'):
+            images = self.__renderer.render_all([Chart(x, y, f'{name} Balance', xlabel, ylabel)
+                                                 for name, (x, y) in series.items()])
+
+        def upload(name, x, image):
+            return self._upload(image, {'title': f'{CRYPTO_BALANCE_CHECK}: {name}',
+                                        'description': f'{x[0]} to {x[-1]}'})['link']
+        logger.warning(f'UPLOADING {len(images)} IMAGES')
+        with ThreadPoolExecutor(max(len(images), 1), thread_name_prefix='imgur-upload') as pool:
+            links = pool.map(upload, series.keys(), [x for x, _ in series.values()], images)
+            return dict(zip(series.keys(), links))
 
 
 if __name__ == "__main__":
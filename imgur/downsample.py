@@ -0,0 +1,28 @@
+from typing import Tuple
+
+import numpy as np
+
+
+# Largest-Triangle-Three-Buckets: keeps the threshold points that best preserve the visual shape of the line.
+# Each bucket's choice depends on the previous one, so buckets are walked in order but every bucket is scored with NumPy.
+def lttb(x, y, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    x, y = np.asarray(x), np.asarray(y)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    fx, fy = x.astype(np.float64), y.astype(np.float64)
+    # threshold - 2 buckets between the first and last point, which are always kept
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = fx[next_start:next_end].mean(), fy[next_start:next_end].mean()
+        area = np.abs((fx[a] - avg_x) * (fy[start:end] - fy[a]) - (fx[a] - fx[start:end]) * (avg_y - fy[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
@@ -0,0 +1,103 @@
+import logging
+import multiprocessing
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, NamedTuple
+
+import numpy as np
+
+from imgur.downsample import lttb
+from imgur.render import PRESETS, ChartRenderer, Preset
+
+logger = logging.getLogger(__name__)
+
+# Worker processes rendering charts, matplotlib holds the GIL so threads wouldn't draw two charts at once.
+# Kept small by default: each worker loads matplotlib, and cpu_count() is the host's cores rather than a dyno's share.
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS') or 2)
+
+
+class Chart(NamedTuple):
+    x: np.ndarray
+    y: np.ndarray
+    title: str
+    xlabel: str = 'Time'
+    ylabel: str = ''
+
+
+# Set in each worker by _init_worker, so matplotlib is imported and the figure built once per process
+_renderer: ChartRenderer = None
+
+
+def _init_worker(preset: Preset):
+    global _renderer
+    _renderer = ChartRenderer(preset)
+    _renderer.warm()
+
+
+def _render(chart: Chart) -> bytes:
+    return _renderer.render(chart.x, chart.y, chart.title, chart.xlabel, chart.ylabel)
+
+
+def _ready() -> bool:
+    return _renderer is not None
+
+
+# Renders many charts at once on a pool of worker processes that outlive a single call, so a dozen charts take
+# about as long as the slowest one. A single chart, or a pool that can't start, is rendered in this process.
+class RenderPool:
+    def __init__(self, preset: Preset = PRESETS['default'], workers: int = RENDER_WORKERS):
+        self.__preset = preset
+        self.__workers = workers
+        self.__renderer = ChartRenderer(preset)
+        self.__pool: ProcessPoolExecutor = None
+        self.__lock = threading.Lock()
+
+    def width(self) -> int:
+        return self.__renderer.width()
+
+    def __get_pool(self) -> ProcessPoolExecutor:
+        with self.__lock:
+            if self.__pool is None:
+                # Workers are spawned rather than forked, this process has network threads running
+                self.__pool = ProcessPoolExecutor(self.__workers, multiprocessing.get_context('spawn'),
+                                                  initializer=_init_worker, initargs=(self.__preset,))
+            return self.__pool
+
+    # Starts the workers ahead of the first render, e.g. while balances are being fetched
+    def warm(self):
+        if self.__workers <= 1:
+            return
+        pool = self.__get_pool()
+        try:
+            for future in [pool.submit(_ready) for _ in range(self.__workers)]:
+                future.result()
+        except BrokenProcessPool as e:
+            traceback.print_exc()
+            logger.error(f"Render workers failed to start: {e}")
+            self.close()
+
+    def render(self, chart: Chart) -> bytes:
+        return self.__renderer.render(chart.x, chart.y, chart.title, chart.xlabel, chart.ylabel)
+
+    def render_all(self, charts: List[Chart]) -> List[bytes]:
+        if len(charts) <= 1 or self.__workers <= 1:
+            return [self.render(chart) for chart in charts]
+        # Downsampled here so only as many points as the image is wide are sent to the workers
+        charts = [chart._replace(x=x, y=y) for chart in charts
+                  for x, y in [lttb(np.asarray(chart.x), np.asarray(chart.y), self.width())]]
+        try:
+            return list(self.__get_pool().map(_render, charts))
+        except BrokenProcessPool as e:
+            traceback.print_exc()
+            logger.error(f"Render workers died, rendering in process: {e}")
+            self.close()
+            return [self.render(chart) for chart in charts]
+
+    def close(self):
+        with self.__lock:
+            if self.__pool is not None:
+                self.__pool.shutdown(wait=False)
+                self.__pool = None
@@ -0,0 +1,81 @@
+import io
+import threading
+from datetime import date
+from typing import Dict, NamedTuple, Tuple
+
+from imgur.downsample import lttb
+from metrics import timed
+
+
+class Preset(NamedTuple):
+    dpi: int
+    size: Tuple[float, float]
+
+
+PRESETS: Dict[str, Preset] = {
+    'default': Preset(dpi=300, size=(6.4, 4.8)),
+    'slack': Preset(dpi=150, size=(8, 4.5)),
+    'thumbnail': Preset(dpi=100, size=(4, 3)),
+}
+
+_matplotlib_lock = threading.Lock()
+_matplotlib_loaded = False
+
+
+def _load_matplotlib():
+    global _matplotlib_loaded
+    with _matplotlib_lock:
+        if not _matplotlib_loaded:
+            with timed('import matplotlib'):
+                import matplotlib
+                matplotlib.use('Agg')
+                import matplotlib.style
+                matplotlib.style.use('ggplot')
+            _matplotlib_loaded = True
+
+
+# Renders balance charts to PNG bytes on the Agg backend without pyplot, so there is no global figure state.
+# The figure and canvas are created once and cleared between renders, a lock keeps concurrent renders apart.
+class ChartRenderer:
+    def __init__(self, preset: Preset = PRESETS['default']):
+        self.preset = preset
+        self.__figure = None
+        self.__lock = threading.Lock()
+
+    def width(self) -> int:
+        return int(self.preset.size[0] * self.preset.dpi)
+
+    def __get_figure(self):
+        if self.__figure is None:
+            _load_matplotlib()
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+            self.__figure = Figure(figsize=self.preset.size, dpi=self.preset.dpi)
+            FigureCanvasAgg(self.__figure)
+        return self.__figure
+
+    # Imports matplotlib and builds the figure ahead of the first render
+    def warm(self):
+        with self.__lock:
+            self.__get_figure()
+
+    def render(self, x, y, title: str, xlabel: str = 'Time', ylabel: str = '') -> bytes:
+        if len(x) == 0 or len(y) == 0:
+            return b''
+        start, end = date.fromtimestamp(x[0]), date.fromtimestamp(x[-1])
+        # No point drawing more vertices than the image has pixels across
+        x, y = lttb(x, y, self.width())
+        with self.__lock:
+            fig = self.__get_figure()
+            fig.clear()
+            ax = fig.add_subplot(1, 1, 1)
+            ax.plot(x, y, alpha=0.5)
+            ax.axes.xaxis.set_visible(False)
+            ax.yaxis.set_major_formatter('${x:1.2f}')
+            ax.yaxis.set_tick_params(which='major', labelleft=False, labelright=True)
+            ax.set_title(f'{title}: {start} - {end}')
+            ax.set_xlabel(xlabel)
+            ax.set_ylabel(ylabel)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png')
+            return buffer.getvalue()
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Subsystem -> seconds spent importing or initializing it, filled in as subsystems are loaded on first use
+STARTUP: Dict[str, float] = {}
+_startup_lock = threading.Lock()
+
+# json or prometheus (text exposition format)
+METRICS_FORMAT = (os.getenv('METRICS_FORMAT') or 'json').lower()
+METRICS_FILE = os.getenv('METRICS_FILE') or \
+               ('.cache/metrics/last-run.prom' if METRICS_FORMAT == 'prometheus' else '.cache/metrics/last-run.json')
+PREFIX = 'crypto_balance_check_'
+
+Labels = Tuple[Tuple[str, str], ...]
+# (stage, labels) -> [count, seconds, max seconds]
+SPANS: Dict[Tuple[str, Labels], List[float]] = {}
+# (counter, labels) -> value
+COUNTERS: Dict[Tuple[str, Labels], float] = {}
+_metrics_lock = threading.Lock()
+
+
+@contextmanager
+def timed(subsystem: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _startup_lock:
+            STARTUP[subsystem] = STARTUP.get(subsystem, 0) + elapsed
+
+
+def startup_report() -> str:
+    with _startup_lock:
+        items = sorted(STARTUP.items(), key=lambda item: item[1], reverse=True)
+    lines = [f"{subsystem.ljust(32)} {elapsed * 1000:9.1f} ms" for subsystem, elapsed in items]
+    lines.append(f"{'total'.ljust(32)} {sum(elapsed for _, elapsed in items) * 1000:9.1f} ms")
+    return "\n".join(lines)
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+# Times one pipeline stage, also usable as a decorator. Repeated spans of a stage add up.
+@contextmanager
+def span(stage: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        key = (stage, _labels(labels))
+        with _metrics_lock:
+            totals = SPANS.setdefault(key, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+            totals[2] = max(totals[2], elapsed)
+
+
+def count(counter: str, value: float = 1, **labels):
+    key = (counter, _labels(labels))
+    with _metrics_lock:
+        COUNTERS[key] = COUNTERS.get(key, 0) + value
+
+
+# Transport latency hook
+def record_http(method: str, url: str, status: int, seconds: float):
+    host = urlsplit(url).netloc
+    count('http_requests_total', host=host, status=status or 'error')
+    count('http_request_seconds_total', seconds, host=host)
+
+
+def metrics_json() -> str:
+    with _metrics_lock:
+        spans = [{'stage': stage, 'labels': dict(labels), 'count': int(totals[0]), 'seconds': totals[1],
+                  'max_seconds': totals[2]} for (stage, labels), totals in SPANS.items()]
+        counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in COUNTERS.items()]
+    with _startup_lock:
+        startup = dict(STARTUP)
+    return json.dumps({'time': int(time.time()), 'spans': spans, 'counters': counters, 'startup': startup},
+                      indent=2)
+
+
+def _prometheus_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def metrics_prometheus() -> str:
+    lines = []
+    with _metrics_lock:
+        spans = sorted(SPANS.items())
+        counters = sorted(COUNTERS.items())
+    with _startup_lock:
+        startup = sorted(STARTUP.items())
+
+    lines.append(f'# TYPE {PREFIX}stage_seconds summary')
+    for (stage, labels), (n, seconds, _) in spans:
+        labels = _prometheus_labels((('stage', stage),) + labels)
+        lines.append(f'{PREFIX}stage_seconds_sum{labels} {seconds}')
+        lines.append(f'{PREFIX}stage_seconds_count{labels} {int(n)}')
+    lines.append(f'# TYPE {PREFIX}stage_seconds_max gauge')
+    for (stage, labels), (_, _, longest) in spans:
+        lines.append(f'{PREFIX}stage_seconds_max{_prometheus_labels((("stage", stage),) + labels)} {longest}')
+
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f'# TYPE {PREFIX}{name} counter')
+            typed.add(name)
+        lines.append(f'{PREFIX}{name}{_prometheus_labels(labels)} {value}')
+
+    lines.append(f'# TYPE {PREFIX}startup_seconds gauge')
+    for subsystem, seconds in startup:
+        lines.append(f'{PREFIX}startup_seconds{_prometheus_labels((("subsystem", subsystem),))} {seconds}')
+    return '\n'.join(lines) + '\n'
+
+
+# Written to a temporary file first so a collector never reads a half written file
+def export(path: str = METRICS_FILE, fmt: str = METRICS_FORMAT) -> str:
+    text = metrics_prometheus() if fmt == 'prometheus' else metrics_json()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+    return path
@@ -0,0 +1,103 @@
+import logging
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future, TimeoutError
+from typing import Any, Callable, Dict, List, Tuple
+
+from metrics import count
+
+logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO, datefmt='%m/%d/%Y %I:%M:%S %p')
+logger = logging.getLogger(__name__)
+
+# Seconds a stage may run once its dependencies are done, before its dependents are skipped
+STAGE_TIMEOUT = float(os.getenv('STAGE_TIMEOUT') or 60)
+
+
+# Raised by a stage that has nothing to do this run, its dependents are skipped without counting as a failure
+class Skipped(Exception):
+    pass
+
+
+# The steps of one run as a DAG. Every stage runs on its own daemon thread as soon as the stages it depends on
+# have finished, so the run takes as long as its longest chain of dependent stages. A stage that raises or times out
+# is logged and only its dependents are skipped, the stages that don't need its result still run.
+class Pipeline:
+    def __init__(self):
+        self.__stages: Dict[str, Tuple[Callable[..., Any], List[str], float]] = {}
+        self.__failed: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.__stages)
+
+    # fn is called with the results of the stages it runs after, in order
+    def add(self, stage: str, fn: Callable[..., Any], *after: str, timeout: float = STAGE_TIMEOUT) -> 'Pipeline':
+        missing = [dependency for dependency in after if dependency not in self.__stages]
+        if missing:
+            raise ValueError(f"{stage} depends on stages that aren't in the pipeline yet: {', '.join(missing)}")
+        self.__stages[stage] = (fn, list(after), timeout)
+        return self
+
+    # Stages of the last run that raised or timed out
+    def failed(self) -> List[str]:
+        return list(self.__failed)
+
+    # Results of the stages that succeeded
+    def run(self) -> Dict[str, Any]:
+        self.__failed = []
+        outcomes: Dict[str, Future] = {stage: Future() for stage in self.__stages}
+        for stage, (fn, after, timeout) in self.__stages.items():
+            threading.Thread(target=self.__run_stage, args=(stage, fn, after, timeout, outcomes),
+                             name=f"{stage}-stage", daemon=True).start()
+
+        results = {}
+        for stage, outcome in outcomes.items():
+            # Bounded: every stage is bounded by its own timeout plus the timeouts of the chain before it
+            if outcome.exception() is None:
+                results[stage] = outcome.result()
+        return results
+
+    def __run_stage(self, stage: str, fn: Callable[..., Any], after: List[str], timeout: float,
+                    outcomes: Dict[str, Future]):
+        outcome = outcomes[stage]
+        inputs = []
+        for dependency in after:
+            if outcomes[dependency].exception() is not None:
+                logger.info(f"Skipping {stage}, {dependency} did not complete")
+                outcome.set_exception(Skipped(dependency))
+                return
+            inputs.append(outcomes[dependency].result())
+
+        # The stage itself runs on a second thread so a stuck call can be abandoned once it overruns
+        work = Future()
+
+        def run():
+            try:
+                work.set_result(fn(*inputs))
+            except Skipped as e:
+                work.set_exception(e)
+            except Exception as e:
+                traceback.print_exc()
+                work.set_exception(e)
+
+        start = time.monotonic()
+        threading.Thread(target=run, name=stage, daemon=True).start()
+        try:
+            outcome.set_result(work.result(timeout=timeout))
+            logger.info(f"{stage} took {time.monotonic() - start:.2f}s")
+        except Skipped as e:
+            logger.info(f"Skipping {stage}: {e}")
+            outcome.set_exception(e)
+        except TimeoutError as e:
+            logger.error(f"{stage} did not finish within {timeout}s, skipping what depends on it")
+            self.__fail(stage)
+            outcome.set_exception(e)
+        except Exception as e:
+            logger.error(f"{stage} failed: {e}")
+            self.__fail(stage)
+            outcome.set_exception(e)
+
+    def __fail(self, stage: str):
+        self.__failed.append(stage)
+        count('stage_failures_total', stage=stage)
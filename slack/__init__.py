@@ -2,17 +2,25 @@ import json
 import logging
 import os
 import sys
-from typing import Dict
+from typing import Dict, Union
+
+import numpy as np
 
-import requests
 from exchanges import Position
+from exchanges.table import PositionTable
+from exchanges.transport import TRANSPORT
 
 logger = logging.getLogger(__name__)
 
 
+# Table columns are floats, whole amounts print as "2" like the int amounts the adapters report
+def _number(value: float) -> Union[int, float]:
+    return int(value) if float(value).is_integer() else value
+
+
 class Slack:
-    def __init__(self):
-        self.__webhook = os.getenv('SLACK_WEBHOOK')
+    def __init__(self, webhook: str = None):
+        self.__webhook = webhook or os.getenv('SLACK_WEBHOOK')
         if self.__webhook is None:
             logger.error('FORGOT SLACK WEBHOOK')
             sys.exit()
@@ -25,42 +33,44 @@ class Slack:
                 "text": f"Balance Graph\n{link}"
             }
         }]
-        r = requests.post(self.__webhook,
-                          data=json.dumps({"text": "Your Crypto Balance Graph", "blocks": message_blocks}),
-                          headers={'Content-Type': 'application/json'}, verify=True)
+        r = TRANSPORT.post(self.__webhook,
+                           data=json.dumps({"text": "Your Crypto Balance Graph", "blocks": message_blocks}),
+                           headers={'Content-Type': 'application/json'}, verify=True)
 
-    def publish_all_positions_by_exchange(self, positions_by_exchange: Dict[str, Dict[str, Position]]):
+    def publish_all_positions_by_exchange(self,
+                                          positions: Union[PositionTable, Dict[str, Dict[str, Position]]]):
+        table = PositionTable.of(positions)
         mssgs: [str] = []
-        total_fiat = 0
         max_len_mssg = 0
         LEVEL = 2
-        currency = ""
-        for exchange, position_map in positions_by_exchange.items():
+        symbols = table.symbols()
+        # Plain tuples grouped by exchange, formatting reads them much faster than per-row views
+        rows = table.rows[np.argsort(table.rows['exchange'], kind='stable')].tolist()
+        counts = np.bincount(table.rows['exchange'], minlength=len(table.exchanges())).tolist()
+        start = 0
+        for exchange, n in zip(table.exchanges(), counts):
             mssgs.append(exchange.ljust(10))
-            for position in position_map.values():
-                if not currency:
-                    currency = position.fiat
-                total_fiat += position.total_fiat()
-                message = "".ljust(LEVEL) + position.symbol.ljust(5) \
+            for _, symbol, spot_amount, spot_in_fiat, margin_amount, margin_in_fiat in rows[start:start + n]:
+                message = "".ljust(LEVEL) + symbols[symbol].ljust(5) \
                           + "".ljust(17) \
-                          + " Fiat ".ljust(10) + str(round(position.total_fiat(), 2)).ljust(9)
+                          + " Fiat ".ljust(10) + str(_number(round(margin_in_fiat + spot_in_fiat, 2))).ljust(9)
                 mssgs.append(message)
                 message = "".ljust(LEVEL*2)  \
-                          + " Spot ".ljust(10) + str(round(position.spot_amount, 5)).ljust(9)
+                          + " Spot ".ljust(10) + str(_number(round(spot_amount, 5))).ljust(9)
                 mssgs.append(message)
                 message = "".ljust(LEVEL*2)  \
-                          + " Margin ".ljust(10) + str(round(position.margin_amount, 5)).ljust(9)
+                          + " Margin ".ljust(10) + str(_number(round(margin_amount, 5))).ljust(9)
                 mssgs.append(message)
                 message = "".ljust(LEVEL * 2) \
-                          + " Total ".ljust(10) + str(round(position.total_base(), 5)).ljust(9)
+                          + " Total ".ljust(10) + str(_number(round(spot_amount + margin_amount, 5))).ljust(9)
                 max_len_mssg = max(max_len_mssg, len(message))
                 mssgs.append(message)
+            start += n
             mssgs.append("-"*(LEVEL+5+17+10+16))
-        total_fiat = "$" + "{:,}".format(round(total_fiat, 2)) + f" {currency}"
+        total_fiat = "$" + "{:,}".format(_number(round(table.total_fiat(), 2))) + f" {table.fiat}"
         mssgs.append("".ljust(LEVEL + 5 + 17) + " Total ".ljust(10) + str(total_fiat).ljust(16))
 
-        for m in mssgs:
-            print(m)
+        logger.debug("\n".join(mssgs))
         message_blocks = [{
             "type": "section",
             "text": {
@@ -68,8 +78,7 @@ class Slack:
                 "text": "```" + "\n".join(mssgs) + "```"
             }
         }]
-        r = requests.post(self.__webhook,
-                          data=json.dumps({"text": "Your Crypto Summary", "blocks": message_blocks}),
-                          headers={'Content-Type': 'application/json'}, verify=True)
-        print(r.status_code)
-        print(r.text)
+        r = TRANSPORT.post(self.__webhook,
+                           data=json.dumps({"text": "Your Crypto Summary", "blocks": message_blocks}),
+                           headers={'Content-Type': 'application/json'}, verify=True)
+        logger.debug(f"Slack responded {r.status_code} {r.text}")
@@ -0,0 +1,110 @@
+import threading
+from typing import Dict, List, Tuple
+
+import pytest
+
+import firestore
+from bench.standin import StandIn
+
+DELETE = object()
+
+
+@pytest.fixture
+def stand_in():
+    server = StandIn().start()
+    yield server
+    server.stop()
+
+
+# A route that never answers until the test ends, like an exchange API that accepted the connection and hung
+@pytest.fixture
+def hang():
+    released = threading.Event()
+    yield lambda query: released.wait(120)
+    released.set()
+
+
+class FakeSnapshot:
+    def __init__(self, id: str, data: dict):
+        self.id = id
+        self.exists = data is not None
+        self.__data = data
+
+    def to_dict(self) -> dict:
+        return dict(self.__data) if self.exists else None
+
+
+class FakeDocumentRef:
+    def __init__(self, client: 'FakeClient', path: Tuple[str, ...]):
+        self.client = client
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name: str) -> 'FakeCollectionRef':
+        return FakeCollectionRef(self.client, self.path + (name,))
+
+    def get(self) -> FakeSnapshot:
+        return FakeSnapshot(self.id, self.client.documents.get(self.path))
+
+    def set(self, data: dict, merge: bool = False):
+        self.client.writes += 1
+        document = dict(self.client.documents.get(self.path) or {}) if merge else {}
+        for field, value in data.items():
+            if value is DELETE:
+                document.pop(field, None)
+            else:
+                document[field] = value
+        self.client.documents[self.path] = document
+
+
+class FakeCollectionRef:
+    def __init__(self, client: 'FakeClient', path: Tuple[str, ...]):
+        self.client = client
+        self.path = path
+
+    def document(self, id: str) -> FakeDocumentRef:
+        return FakeDocumentRef(self.client, self.path + (id,))
+
+    def stream(self):
+        return [FakeSnapshot(path[-1], data) for path, data in sorted(self.client.documents.items())
+                if path[:-1] == self.path]
+
+
+class FakeBatch:
+    def __init__(self, client: 'FakeClient'):
+        self.client = client
+        self.sets: List[Tuple[FakeDocumentRef, dict, bool]] = []
+
+    def set(self, ref: FakeDocumentRef, data: dict, merge: bool = False):
+        self.sets.append((ref, data, merge))
+
+    def commit(self):
+        self.client.batches.append(len(self.sets))
+        for ref, data, merge in self.sets:
+            ref.set(data, merge)
+
+
+# In-memory stand-in for the parts of the Firestore client FireStore uses, documents are keyed by their path
+class FakeClient:
+    def __init__(self):
+        self.documents: Dict[Tuple[str, ...], dict] = {}
+        # Writes per committed batch
+        self.batches: List[int] = []
+        self.writes = 0
+
+    def collection(self, name: str) -> FakeCollectionRef:
+        return FakeCollectionRef(self, (name,))
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+
+@pytest.fixture
+def fake_firestore(monkeypatch) -> FakeClient:
+    client = FakeClient()
+    monkeypatch.setattr(firestore, 'get_client', lambda: client)
+    monkeypatch.setattr(firestore, 'delete_field', lambda: DELETE)
+    return client
@@ -0,0 +1,99 @@
+from unittest import mock
+
+import pytest
+
+from exchanges.interface import Position
+from firestore.changes import Change, LastSnapshot, fingerprint
+from firestore.snapshot import decode, encode
+
+HOUR = 60 * 60
+
+
+def positions(btc: float = 1, btc_fiat: float = 1000, eth: float = 2, eth_fiat: float = 1000) -> dict:
+    return {'Binance': {'BTC': Position('BTC', 'CAD', btc, btc_fiat, 0, 0),
+                        'ETH': Position('ETH', 'CAD', eth, eth_fiat, 0, 0)}}
+
+
+def last_snapshot(tmp_path, firestore=None, **thresholds) -> LastSnapshot:
+    thresholds = {'min_fiat': 0, 'min_relative': 0.01, 'heartbeat': 6 * HOUR, **thresholds}
+    return LastSnapshot('CAD', firestore, str(tmp_path), **thresholds)
+
+
+def test_fingerprint_ignores_prices_and_order():
+    assert fingerprint(positions()) == fingerprint(positions(btc_fiat=5000, eth_fiat=1))
+    reordered = {'Binance': dict(reversed(list(positions()['Binance'].items())))}
+    assert fingerprint(positions()) == fingerprint(reordered)
+
+
+def test_fingerprint_ignores_float_noise():
+    assert fingerprint(positions()) == fingerprint(positions(btc=1 + 1e-12))
+    assert fingerprint(positions()) != fingerprint(positions(btc=1.001))
+
+
+def test_no_previous_snapshot(tmp_path):
+    assert last_snapshot(tmp_path).diff(positions(), 0) == Change('no previous snapshot', 2000, 2000)
+
+
+@pytest.mark.parametrize('current, thresholds, reason', [
+    (positions(), {}, None),
+    (positions(btc=1.5), {}, 'holdings changed'),
+    (positions(btc_fiat=1019), {}, None),
+    (positions(btc_fiat=1020), {}, 'total moved +1.00%'),
+    (positions(btc_fiat=980), {}, 'total moved -1.00%'),
+    (positions(btc_fiat=1020), {'min_relative': 0}, None),
+    (positions(btc_fiat=1005), {'min_fiat': 5}, 'total moved +5.00'),
+    (positions(btc_fiat=1004), {'min_fiat': 5}, None),
+])
+def test_thresholds(tmp_path, current, thresholds, reason):
+    baseline = last_snapshot(tmp_path, **thresholds)
+    baseline.save(positions(), 0)
+    change = baseline.diff(current, HOUR)
+    assert change.reason == reason
+    assert change.significant == (reason is not None)
+    assert change.delta_fiat == pytest.approx(current['Binance']['BTC'].spot_amount_in_fiat - 1000)
+
+
+def test_heartbeat(tmp_path):
+    baseline = last_snapshot(tmp_path)
+    baseline.save(positions(), 0)
+    assert not baseline.diff(positions(), 6 * HOUR - 1).significant
+    assert baseline.diff(positions(), 6 * HOUR).reason == f'nothing published for {6 * HOUR}s'
+    assert last_snapshot(tmp_path, heartbeat=0).diff(positions(), 0).significant
+
+
+def test_relative_threshold_from_a_zero_total(tmp_path):
+    baseline = last_snapshot(tmp_path)
+    baseline.save(positions(btc_fiat=0, eth_fiat=0), 0)
+    assert baseline.diff(positions(btc_fiat=0, eth_fiat=0), HOUR).reason is None
+    assert baseline.diff(positions(btc_fiat=1, eth_fiat=0), HOUR).reason == 'total moved +inf%'
+
+
+def test_baseline_from_firestore_is_cached(tmp_path):
+    firestore = mock.Mock()
+    firestore.get_last_snapshot.return_value = (0, decode(encode(positions())))
+    baseline = last_snapshot(tmp_path, firestore)
+    assert baseline.diff(positions(), HOUR).reason is None
+    assert baseline.diff(positions(btc=3), HOUR).reason == 'holdings changed'
+    assert firestore.get_last_snapshot.call_count == 1
+    # A fresh process with the cache file in place doesn't ask Firestore either
+    assert last_snapshot(tmp_path, firestore).diff(positions(), 6 * HOUR).significant
+    assert firestore.get_last_snapshot.call_count == 1
+
+
+def test_baseline_from_an_empty_firestore(tmp_path):
+    firestore = mock.Mock()
+    firestore.get_last_snapshot.return_value = None
+    assert last_snapshot(tmp_path, firestore).diff(positions(), 0).reason == 'no previous snapshot'
+
+
+def test_unreachable_firestore_publishes(tmp_path):
+    firestore = mock.Mock()
+    firestore.get_last_snapshot.side_effect = ConnectionError('offline')
+    assert last_snapshot(tmp_path, firestore).diff(positions(), 0).reason == 'no previous snapshot'
+
+
+def test_unreadable_cache_falls_back_to_firestore(tmp_path):
+    (tmp_path / 'CAD.last').write_bytes(b'not msgpack')
+    firestore = mock.Mock()
+    firestore.get_last_snapshot.return_value = (0, decode(encode(positions())))
+    assert last_snapshot(tmp_path, firestore).diff(positions(), HOUR).reason is None
@@ -0,0 +1,112 @@
+from typing import List, Tuple
+
+import pytest
+
+from exchanges.coinbase import accounts
+from exchanges.coinbase.accounts import AccountCache, Page, _accept, accounts_uri, get_accounts
+
+
+@pytest.fixture(autouse=True)
+def page_limit(monkeypatch):
+    monkeypatch.setattr(accounts, 'PAGE_LIMIT', 2)
+
+
+def account(account_id: str, amount: float = 0) -> dict:
+    return {'id': account_id, 'balance': {'amount': str(amount), 'currency': account_id.upper()}}
+
+
+# Serves /v2/accounts like Coinbase: pages of PAGE_LIMIT accounts linked by the id of the last account on each
+class FakeAccounts:
+    def __init__(self, listed: List[dict]):
+        self.listed = listed
+        self.requests: List[str] = []
+
+    def fetch(self, uri: str) -> Page:
+        self.requests.append(uri)
+        ids = [a['id'] for a in self.listed]
+        cursor = accounts._cursor(uri)
+        if cursor is not None and cursor not in ids:
+            raise LookupError(f'{cursor} not found')
+        start = 0 if cursor is None else ids.index(cursor) + 1
+        data = self.listed[start:start + accounts.PAGE_LIMIT]
+        more = start + accounts.PAGE_LIMIT < len(ids)
+        return accounts.parse_page({'data': data, 'pagination': {
+            'next_uri': accounts_uri(data[-1]['id']) if more else None}})
+
+
+def cache(tmp_path, ids: List[str]) -> AccountCache:
+    ret = AccountCache(str(tmp_path / 'accounts.json'))
+    ret.save([(account_id, account_id.upper()) for account_id in ids])
+    return ret
+
+
+def page(ids: List[str], next_cursor: str = None) -> Page:
+    return Page([], [(account_id, account_id.upper()) for account_id in ids],
+                accounts_uri(next_cursor) if next_cursor else None)
+
+
+def test_cursors(tmp_path):
+    assert AccountCache(str(tmp_path / 'missing.json')).cursors() == [None]
+    assert cache(tmp_path, ['a', 'b']).cursors() == [None]
+    assert cache(tmp_path, ['a', 'b', 'c']).cursors() == [None, 'b']
+    assert cache(tmp_path, ['a', 'b', 'c', 'd', 'e']).cursors() == [None, 'b', 'd']
+
+
+def test_cache_survives_reload(tmp_path):
+    cache(tmp_path, ['a', 'b'])
+    assert AccountCache(str(tmp_path / 'accounts.json')).currencies() == {'a': 'A', 'b': 'B'}
+
+
+def test_accept_aligned_pages():
+    pages = [page(['a', 'b'], 'b'), page(['c', 'd'], 'd'), page(['e'])]
+    assert _accept([None, 'b', 'd'], pages) == (pages, None)
+
+
+def test_accept_stops_at_first_misaligned_page():
+    # An account was added to the first page, so the second page now starts after 'x' rather than 'b'
+    pages = [page(['a', 'x'], 'x'), page(['c', 'd'], 'd'), page(['e'])]
+    assert _accept([None, 'b', 'd'], pages) == (pages[:1], accounts_uri('x'))
+
+
+def test_accept_stops_at_failed_prefetch():
+    pages = [page(['a', 'b'], 'b'), None, page(['e'])]
+    assert _accept([None, 'b', 'd'], pages) == (pages[:1], accounts_uri('b'))
+
+
+def test_accept_drops_prefetches_past_the_last_page():
+    pages = [page(['a', 'b']), page(['c', 'd'], 'd')]
+    assert _accept([None, 'b'], pages) == (pages[:1], None)
+
+
+def test_accept_continues_past_the_cached_pages():
+    pages = [page(['a', 'b'], 'b'), page(['c', 'd'], 'd')]
+    assert _accept([None, 'b'], pages) == (pages, accounts_uri('d'))
+
+
+def sync(tmp_path, cached: List[str], listed: List[dict]) -> Tuple[List[str], List[str], FakeAccounts]:
+    server = FakeAccounts(listed)
+    account_cache = cache(tmp_path, cached)
+    funded = [a['id'] for a in get_accounts(server.fetch, account_cache)]
+    return funded, [account_id for account_id, _ in account_cache.accounts()], server
+
+
+@pytest.mark.parametrize('cached, listed', [
+    (['a', 'b', 'c', 'd', 'e'], ['a', 'b', 'c', 'd', 'e']),
+    ([], ['a', 'b', 'c', 'd', 'e']),
+    (['a', 'b', 'c', 'd', 'e'], ['a', 'x', 'b', 'c', 'd', 'e']),
+    (['a', 'b', 'c', 'd', 'e'], ['a', 'c', 'd', 'e']),
+    (['a', 'b', 'c', 'd', 'e'], ['a', 'c', 'e']),
+    (['a', 'b', 'c', 'd', 'e'], ['a', 'b']),
+    (['a', 'b'], ['a', 'b', 'c', 'd', 'e', 'f', 'g']),
+])
+def test_get_accounts_matches_a_page_by_page_sync(tmp_path, cached, listed):
+    listed = [account(account_id, i % 2) for i, account_id in enumerate(listed)]
+    funded, synced, _ = sync(tmp_path, cached, listed)
+    assert funded == [a['id'] for a in listed if float(a['balance']['amount']) != 0]
+    assert synced == [a['id'] for a in listed]
+
+
+def test_unchanged_accounts_are_fetched_once_per_page(tmp_path):
+    ids = ['a', 'b', 'c', 'd', 'e']
+    _, _, server = sync(tmp_path, ids, [account(account_id) for account_id in ids])
+    assert sorted(server.requests) == sorted([accounts_uri(), accounts_uri('b'), accounts_uri('d')])
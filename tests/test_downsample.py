@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from firestore.mirror import HistoryMirror
+from firestore.rollup import DAY, HOUR, rollup
+from imgur.downsample import lttb
+
+
+@pytest.mark.parametrize('n, threshold', [(1000, 100), (1000, 3), (101, 100), (7, 5)])
+def test_lttb_keeps_endpoints_and_threshold_points(n, threshold):
+    x = np.arange(n) * 60
+    y = np.sin(np.arange(n) / 10)
+    sampled_x, sampled_y = lttb(x, y, threshold)
+    assert len(sampled_x) == len(sampled_y) == threshold
+    assert sampled_x[0] == x[0] and sampled_x[-1] == x[-1]
+    assert (np.diff(sampled_x) > 0).all()
+    assert np.array_equal(sampled_y, y[np.searchsorted(x, sampled_x)])
+
+
+def test_lttb_keeps_a_spike():
+    y = np.zeros(1000)
+    y[437] = 100
+    sampled_x, sampled_y = lttb(np.arange(1000), y, 20)
+    assert 437 in sampled_x and sampled_y.max() == 100
+
+
+@pytest.mark.parametrize('threshold', [2, 10, 11])
+def test_lttb_returns_short_series_as_is(threshold):
+    x, y = np.arange(10), np.arange(10.0)
+    sampled_x, sampled_y = lttb(x, y, threshold)
+    assert np.array_equal(sampled_x, x) and np.array_equal(sampled_y, y)
+
+
+def test_rollup():
+    timestamps = np.array([0, 600, 1800, HOUR, HOUR + 60, 3 * HOUR + 5])
+    values = np.array([5.0, 9.0, 1.0, 4.0, 6.0, 2.0])
+    rolled = rollup(timestamps, values, HOUR)
+    assert rolled['start'].tolist() == [0, HOUR, 3 * HOUR]
+    assert rolled['open'].tolist() == [5, 4, 2]
+    assert rolled['high'].tolist() == [9, 6, 2]
+    assert rolled['low'].tolist() == [1, 4, 2]
+    assert rolled['close'].tolist() == [1, 6, 2]
+    assert rolled['mean'].tolist() == [5, 5, 2]
+    assert rolled['count'].tolist() == [3, 2, 1]
+    assert len(rollup(np.empty(0), np.empty(0), HOUR)) == 0
+
+
+def series(start: int, end: int, step: int):
+    timestamps = np.arange(start, end, step)
+    return [(int(t), float(v)) for t, v in zip(timestamps, np.cos(timestamps / HOUR) * 100 + 1000)]
+
+
+def test_mirror_updates_rollups_incrementally(tmp_path):
+    points = series(DAY, 4 * DAY, 25 * 60)
+    mirror = HistoryMirror('CAD', str(tmp_path))
+    # Chunks end mid-hour and mid-day, so each append reopens the last partial bucket
+    for chunk in np.array_split(np.arange(len(points)), 7):
+        mirror.append(points[chunk[0]:chunk[-1] + 1])
+    timestamps, values = mirror.series()
+    assert len(timestamps) == len(points)
+    for period in (HOUR, DAY):
+        assert mirror.rollups(period).tolist() == rollup(timestamps, values, period).tolist()
+    # Points at or before the high-water mark are ignored
+    mirror.append(points[:10])
+    assert len(mirror) == len(points)
+
+
+def test_mirror_resolution(tmp_path):
+    mirror = HistoryMirror('CAD', str(tmp_path))
+    mirror.append(series(0, 30 * DAY, 600))
+    timestamps, _ = mirror.series_at_resolution(10000)
+    assert len(timestamps) == len(mirror)
+    timestamps, values = mirror.series_at_resolution(100)
+    assert len(timestamps) == 30 * 24
+    assert values[0] == mirror.rollups(HOUR)['close'][0]
+    timestamps, _ = mirror.series_at_resolution(10)
+    assert len(timestamps) == 30
+    mirror.reset()
+    assert len(mirror) == 0 and len(mirror.rollups(DAY)) == 0
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Dict
+
+import pytest
+
+import exchanges.utils
+from bench import fixtures
+from exchanges import AsyncExchanges, Exchanges
+from exchanges.binance import Binance
+from exchanges.binance.aio import AsyncBinance
+from exchanges.coinbase import Coinbase
+from exchanges.coinbase.aio import AsyncCoinbase
+from exchanges.kucoin import KuCoin
+from exchanges.kucoin.aio import AsyncKuCoin
+from exchanges.newton import Newton
+from exchanges.newton.aio import AsyncNewton
+from exchanges.oracle import PRICE_ORACLE
+from exchanges.transport import TRANSPORT
+
+ADAPTERS = [Binance, AsyncBinance, Coinbase, AsyncCoinbase, KuCoin, AsyncKuCoin, Newton, AsyncNewton]
+N = 30
+
+
+@pytest.fixture
+def settings(stand_in, monkeypatch, tmp_path) -> Dict[str, str]:
+    stand_in.set_routes(fixtures.routes(N))
+    monkeypatch.setattr(exchanges.utils, 'CMC_BASE_URL', stand_in.url)
+    monkeypatch.setattr(exchanges.utils, 'BINANCE_BASE_URL', stand_in.url)
+    for adapter in ADAPTERS:
+        monkeypatch.setattr(adapter.__init__, '__defaults__', (stand_in.url, None))
+    monkeypatch.setattr(TRANSPORT, 'cache', None)
+    PRICE_ORACLE.invalidate()
+    yield {'BINANCE_API_KEY': 'test', 'BINANCE_API_SECRET': 'test', 'COINBASE_API_KEY': 'test',
+           'COINBASE_API_SECRET': 'test', 'NEWTON_CLIENT_ID': 'test', 'NEWTON_API_SECRET': 'test',
+           'KUCOIN_API_KEY': 'test', 'KUCOIN_API_SECRET': 'test', 'KUCOIN_API_PASSPHRASE': 'test',
+           'FIAT_CURRENCY': fixtures.FIAT, 'COINBASE_ACCOUNT_CACHE': str(tmp_path / 'coinbase-accounts.json')}
+    PRICE_ORACLE.invalidate()
+
+
+def values(positions_by_exchange) -> Dict[str, Dict[str, tuple]]:
+    return {exchange: {symbol: tuple(round(value, 9) for value in (p.spot_amount, p.spot_amount_in_fiat,
+                                                                    p.margin_amount, p.margin_amount_in_fiat))
+                       for symbol, p in positions.items()}
+            for exchange, positions in positions_by_exchange.items()}
+
+
+def test_sync_and_async_clients_agree(settings):
+    synced = Exchanges(settings=settings).get_all_positions_by_exchange()
+    PRICE_ORACLE.invalidate()
+    fetched = AsyncExchanges(settings=settings).run()
+    assert sorted(synced) == ['BINANCE', 'COINBASE', 'KUCOIN', 'NEWTON']
+    assert all(len(positions) >= N for positions in synced.values())
+    assert values(fetched) == values(synced)
+
+
+def test_async_position_table(settings):
+    table = AsyncExchanges(settings=settings).get_position_table()
+    assert sorted(table.exchanges()) == ['BINANCE', 'COINBASE', 'KUCOIN', 'NEWTON']
+    assert table.total_fiat() > 0
+
+
+@pytest.mark.parametrize('fetcher', [lambda settings: Exchanges(timeout=1, settings=settings),
+                                     lambda settings: AsyncExchanges(timeout=1, settings=settings)])
+def test_a_hanging_exchange_is_left_out(settings, stand_in, hang, fetcher):
+    stand_in.set_routes({**fixtures.routes(N), '/api/v1/accounts': hang})
+    start = time.monotonic()
+    positions = fetcher(settings).get_position_table()
+    assert time.monotonic() - start < 5
+    assert sorted(positions.exchanges()) == ['BINANCE', 'COINBASE', 'NEWTON']
+
+
+@pytest.mark.parametrize('adapter', [KuCoin, AsyncKuCoin])
+def test_failing_exchange_returns_no_positions(settings, stand_in, adapter):
+    stand_in.set_routes({**fixtures.routes(N), '/api/v1/accounts': lambda query: 1 / 0})
+    exchange = adapter(settings=settings)
+    positions = exchange.get_positions()
+    assert (asyncio.run(positions) if asyncio.iscoroutine(positions) else positions) == {}
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from exchanges import httpcache
+from exchanges.httpcache import CachePolicy, HttpCache
+from exchanges.limiter import RateLimiter
+from exchanges.transport import AsyncTransport, Transport
+
+TICKER = '/api/v3/ticker/price'
+FIAT_MAP = '/v1/fiat/map'
+POLICIES = [CachePolicy(TICKER, 30, 0), CachePolicy(FIAT_MAP, 60, 600)]
+
+
+@pytest.fixture
+def clock(monkeypatch) -> SimpleNamespace:
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(httpcache, 'time', SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def transport(tmp_path, stand_in):
+    versions = {TICKER: 0, FIAT_MAP: 0}
+
+    def route(path):
+        def answer(query):
+            versions[path] += 1
+            return {'version': versions[path]}
+        return answer
+    stand_in.set_routes({TICKER: route(TICKER), FIAT_MAP: route(FIAT_MAP)})
+    transport = Transport(limiter=RateLimiter([]), cache=HttpCache(str(tmp_path), POLICIES))
+    yield transport
+    transport.close()
+
+
+def test_policy():
+    cache = HttpCache(policies=POLICIES)
+    url = 'https://api.binance.com' + TICKER
+    assert cache.policy('GET', url) == POLICIES[0]
+    assert cache.policy('GET', 'https://api.binance.com/api/v3/account') is None
+    assert cache.policy('POST', url) is None
+    assert cache.policy('GET', url + '?timestamp=1&signature=abc') is None
+    assert cache.policy('GET', url, auth=('key', 'secret')) is None
+    assert cache.policy('GET', url, headers={'X-MBX-APIKEY': 'key'}) is None
+
+
+def test_fresh_responses_are_served_from_disk(transport, stand_in, clock, tmp_path):
+    url = stand_in.url + TICKER
+    assert transport.get(url).json() == {'version': 1}
+    clock.now += 29
+    assert transport.get(url).json() == {'version': 1}
+    assert stand_in.requests[TICKER] == 1
+    # A new transport on the same directory, like the next run, reads the same file
+    restarted = Transport(limiter=RateLimiter([]), cache=HttpCache(str(tmp_path), POLICIES))
+    assert restarted.get(url).json() == {'version': 1}
+    restarted.close()
+
+
+def test_expired_response_without_a_stale_window_is_fetched_again(transport, stand_in, clock):
+    url = stand_in.url + TICKER
+    assert transport.get(url).json() == {'version': 1}
+    clock.now += 30
+    assert transport.get(url).json() == {'version': 2}
+    assert stand_in.requests[TICKER] == 2
+
+
+@pytest.mark.parametrize('kwargs, url', [({'auth': ('key', 'secret')}, TICKER),
+                                         ({'headers': {'X-MBX-APIKEY': 'key'}}, TICKER),
+                                         ({}, TICKER + '?timestamp=1&signature=abc')])
+def test_credentials_are_never_cached(transport, stand_in, tmp_path, kwargs, url):
+    for _ in range(3):
+        transport.get(stand_in.url + url, **kwargs)
+    assert stand_in.requests[TICKER] == 3
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stale_response_is_served_while_one_refresh_runs(transport, stand_in, clock):
+    url = stand_in.url + FIAT_MAP
+    assert transport.get(url).json() == {'version': 1}
+    clock.now += 61
+    # The refresh hangs until released, every caller meanwhile gets the stale copy straight away
+    release = threading.Event()
+    stand_in.set_routes({FIAT_MAP: lambda query: release.wait(10) and {'version': 2}})
+    try:
+        start = time.monotonic()
+        assert [transport.get(url).json() for _ in range(5)] == [{'version': 1}] * 5
+        assert time.monotonic() - start < 2
+        deadline = time.monotonic() + 5
+        while stand_in.requests.get(FIAT_MAP, 0) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        assert stand_in.requests[FIAT_MAP] == 2
+    finally:
+        release.set()
+    deadline = time.monotonic() + 5
+    while transport.get(url).json() != {'version': 2}:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert stand_in.requests[FIAT_MAP] == 2
+
+
+def test_response_past_the_stale_window_is_fetched_again(transport, stand_in, clock):
+    url = stand_in.url + FIAT_MAP
+    assert transport.get(url).json() == {'version': 1}
+    clock.now += 60 + 600
+    assert transport.get(url).json() == {'version': 2}
+    assert stand_in.requests[FIAT_MAP] == 2
+
+
+def test_errors_are_not_cached(transport, stand_in, tmp_path):
+    stand_in.set_routes({TICKER: lambda query: 1 / 0})
+    assert transport.get(stand_in.url + TICKER).status_code != 200
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unreadable_entry_is_a_miss(transport, stand_in, tmp_path):
+    url = stand_in.url + TICKER
+    transport.get(url)
+    for path in tmp_path.iterdir():
+        path.write_bytes(b'not msgpack')
+    assert transport.get(url).json() == {'version': 2}
+
+
+def test_async_transport_shares_the_cache(transport, stand_in, clock):
+    url = stand_in.url + FIAT_MAP
+    assert transport.get(url).json() == {'version': 1}
+    clock.now += 61
+    async_transport = AsyncTransport(transport)
+
+    async def get():
+        try:
+            stale = [await async_transport.get_json(url) for _ in range(3)]
+            # One refresh task, which stores the new version
+            while (await async_transport.get_json(url)) != {'version': 2}:
+                await asyncio.sleep(0.01)
+            return stale
+        finally:
+            await async_transport.close()
+    assert asyncio.run(asyncio.wait_for(get(), 5)) == [{'version': 1}] * 3
+    assert stand_in.requests[FIAT_MAP] == 2
@@ -0,0 +1,127 @@
+import pytest
+
+from exchanges import limiter
+from exchanges.limiter import FixedWindow, HostLimit, RateLimiter, TokenBucket
+
+ACCOUNT = 'https://api.binance.com/api/v3/account'
+MARGIN = 'https://api.binance.com/sapi/v1/margin/isolated/account'
+KUCOIN = 'https://api.kucoin.com/api/v1/accounts'
+
+
+# Stands in for the time module, wall clock and monotonic time move together and only when told to
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+        self.sleeps = []
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    # 10 seconds into a minute
+    clock = Clock(1000 * 60 + 10)
+    monkeypatch.setattr(limiter, 'time', clock)
+    return clock
+
+
+def test_fixed_window_books_requests_into_later_windows(clock):
+    window = FixedWindow(10, 60)
+    assert window.reserve(4) == 0
+    assert window.reserve(4) == 0
+    # Doesn't fit, so it waits for the next minute, and so does everyone queued behind it
+    assert window.reserve(4) == 50
+    assert window.reserve(6) == 50
+    assert window.reserve(1) == 110
+    clock.now += 50
+    assert window.reserve(0) == 60
+
+
+def test_fixed_window_resets_on_the_boundary(clock):
+    window = FixedWindow(10, 60)
+    assert window.reserve(9) == 0
+    clock.now += 50
+    assert window.reserve(9) == 0
+    # A single request heavier than the whole budget still goes out once the window is empty
+    clock.now += 60
+    assert window.reserve(25) == 0
+
+
+def test_token_bucket_queues_callers(clock):
+    bucket = TokenBucket(10, 10)
+    assert bucket.reserve(10) == 0
+    assert bucket.reserve(1) == pytest.approx(1)
+    assert bucket.reserve(1) == pytest.approx(2)
+    clock.now += 5
+    assert bucket.reserve(1) == 0
+    # Refills never go past the capacity
+    clock.now += 100
+    assert bucket.reserve(10) == 0
+    assert bucket.reserve(1) == pytest.approx(1)
+
+
+def test_request_weights(clock):
+    limits = RateLimiter([HostLimit('api.binance.com', '/api/', lambda: FixedWindow(30, 60),
+                                    weights={'/api/v3/account': 20})])
+    assert limits.reserve(ACCOUNT) == 0
+    assert limits.reserve('https://api.binance.com/api/v3/ticker/price') == 0
+    assert limits.reserve(ACCOUNT) == 50
+    # Unknown hosts and paths outside every prefix aren't limited
+    assert limits.reserve(MARGIN) == 0
+    assert limits.reserve('https://example.com/') == 0
+
+
+def test_observe_used_weight(clock):
+    limits = RateLimiter()
+    assert limits.reserve(ACCOUNT) == 0
+    # Other clients on the same IP used most of the minute's weight
+    limits.observe(ACCOUNT, 200, {'X-MBX-USED-WEIGHT-1M': str(limiter.BINANCE_WEIGHT_LIMIT - 100)})
+    assert limits.reserve(ACCOUNT) == 50
+    # The /sapi/ weight is counted separately
+    assert limits.reserve(MARGIN) == 0
+    # A count lower than our own bookings doesn't give budget back
+    limits.observe(ACCOUNT, 200, {'X-MBX-USED-WEIGHT-1M': '0'})
+    assert limits.reserve(ACCOUNT) == 50
+
+
+def test_observe_remaining(clock):
+    limits = RateLimiter()
+    assert limits.reserve(KUCOIN) == 0
+    limits.observe(KUCOIN, 200, {'gw-ratelimit-remaining': '0'})
+    assert limits.reserve(KUCOIN) > 0
+
+
+@pytest.mark.parametrize('url', [ACCOUNT, KUCOIN])
+def test_pause_on_429_with_retry_after(clock, url):
+    limits = RateLimiter()
+    limits.observe(url, 429, {'Retry-After': '30'})
+    assert limits.reserve(url) == 30
+    clock.now += 30
+    assert limits.reserve(url) == 0
+
+
+def test_pause_on_418_without_retry_after(clock):
+    limits = RateLimiter()
+    limits.observe(ACCOUNT, 418, {})
+    assert limits.reserve(ACCOUNT) == limiter.DEFAULT_RETRY_AFTER
+    # A shorter Retry-After doesn't cut the running pause short
+    limits.observe(ACCOUNT, 429, {'Retry-After': '1'})
+    assert limits.reserve(ACCOUNT) == limiter.DEFAULT_RETRY_AFTER
+    # Other hosts keep going
+    assert limits.reserve(KUCOIN) == 0
+
+
+def test_acquire_sleeps(clock):
+    limits = RateLimiter()
+    limits.observe(ACCOUNT, 429, {'Retry-After': '5'})
+    limits.acquire(ACCOUNT)
+    limits.acquire(ACCOUNT)
+    assert clock.sleeps == [5]
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import Pipeline, Skipped
+
+
+def test_stages_run_after_their_dependencies():
+    finished = []
+
+    def stage(name, result):
+        def run(*inputs):
+            finished.append(name)
+            return result(*inputs)
+        return run
+
+    pipeline = Pipeline() \
+        .add('fetch', stage('fetch', lambda: 2)) \
+        .add('detect', stage('detect', lambda fetched: fetched * 10), 'fetch') \
+        .add('publish', stage('publish', lambda fetched, delta: (fetched, delta)), 'fetch', 'detect') \
+        .add('graph', stage('graph', lambda delta: -delta), 'detect')
+    assert pipeline.run() == {'fetch': 2, 'detect': 20, 'publish': (2, 20), 'graph': -20}
+    assert finished[:2] == ['fetch', 'detect']
+    assert sorted(finished[2:]) == ['graph', 'publish']
+    assert pipeline.failed() == []
+
+
+def test_unknown_dependency():
+    with pytest.raises(ValueError):
+        Pipeline().add('publish', lambda fetched: fetched, 'fetch')
+
+
+def test_independent_stages_overlap():
+    barrier = threading.Barrier(3, timeout=5)
+    pipeline = Pipeline()
+    for stage in ['read history', 'start renderer', 'write history']:
+        pipeline.add(stage, barrier.wait)
+    assert sorted(pipeline.run().values()) == [0, 1, 2]
+
+
+def test_skipped_propagates_without_failing():
+    ran = []
+
+    def detect(fetched):
+        raise Skipped('no change')
+
+    pipeline = Pipeline() \
+        .add('fetch', lambda: 1) \
+        .add('detect', detect, 'fetch') \
+        .add('publish', lambda delta: ran.append('publish'), 'detect') \
+        .add('graph', lambda delta: ran.append('graph'), 'detect') \
+        .add('send', lambda graph: ran.append('send'), 'graph') \
+        .add('write history', lambda fetched: ran.append('write history'), 'fetch')
+    assert pipeline.run() == {'fetch': 1, 'write history': None}
+    assert ran == ['write history']
+    assert pipeline.failed() == []
+
+
+def test_failure_skips_only_dependents():
+    ran = []
+    pipeline = Pipeline() \
+        .add('fetch', lambda: 1) \
+        .add('detect', lambda fetched: 1 / 0, 'fetch') \
+        .add('publish', lambda delta: ran.append('publish'), 'detect') \
+        .add('write history', lambda fetched: ran.append('write history'), 'fetch')
+    assert pipeline.run() == {'fetch': 1, 'write history': None}
+    assert ran == ['write history']
+    # Dependents that were skipped aren't failures themselves
+    assert pipeline.failed() == ['detect']
+
+
+def test_timeout_abandons_a_stuck_stage():
+    released = threading.Event()
+    ran = []
+    pipeline = Pipeline() \
+        .add('fetch', lambda: released.wait(30), timeout=0.2) \
+        .add('publish', lambda fetched: ran.append('publish'), 'fetch') \
+        .add('graph', lambda: 'link', timeout=0.2)
+    start = time.monotonic()
+    try:
+        assert pipeline.run() == {'graph': 'link'}
+    finally:
+        released.set()
+    assert time.monotonic() - start < 5
+    assert ran == []
+    assert pipeline.failed() == ['fetch']
+
+
+def test_failed_is_reset_between_runs():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('first run fails')
+        return len(calls)
+
+    pipeline = Pipeline().add('fetch', flaky)
+    assert pipeline.run() == {}
+    assert pipeline.failed() == ['fetch']
+    assert pipeline.run() == {'fetch': 2}
+    assert pipeline.failed() == []
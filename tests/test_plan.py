@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from exchanges.plan import FetchPlan
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_dependencies_are_passed_in_order():
+    plan = FetchPlan('test') \
+        .add('a', lambda: 1) \
+        .add('b', lambda: 2) \
+        .add('sum', lambda a, b: a * 10 + b, 'a', 'b') \
+        .add('double', lambda total: total * 2, 'sum')
+    assert plan.run() == {'a': 1, 'b': 2, 'sum': 12, 'double': 24}
+
+
+def test_unknown_dependency():
+    with pytest.raises(ValueError):
+        FetchPlan('test').add('b', lambda a: a, 'a')
+
+
+def test_independent_steps_overlap():
+    barrier = threading.Barrier(3, timeout=5)
+    plan = FetchPlan('test')
+    for step in 'abc':
+        plan.add(step, barrier.wait)
+    assert sorted(plan.run().values()) == [0, 1, 2]
+
+
+def test_failure_skips_dependents():
+    ran = []
+    plan = FetchPlan('test') \
+        .add('a', lambda: 1 / 0) \
+        .add('b', lambda a: ran.append(a), 'a')
+    with pytest.raises(ZeroDivisionError):
+        plan.run()
+    assert ran == []
+
+
+# Every Binance endpoint hangs: the fetch gives up at EXCHANGE_TIMEOUT and the process exits right after,
+# rather than waiting for the HTTP read timeout of the steps still running
+def test_hanging_api_does_not_block_exit(stand_in, hang):
+    stand_in.set_routes({path: hang for path in ['/api/v3/account', '/sapi/v1/margin/isolated/account',
+                                                 '/api/v3/ticker/price', '/v1/fiat/map']})
+    script = textwrap.dedent(f'''
+        import exchanges.utils
+        from exchanges import Exchanges
+        from exchanges.binance import Binance
+        exchanges.utils.BINANCE_BASE_URL = exchanges.utils.CMC_BASE_URL = {stand_in.url!r}
+        Binance.__init__.__defaults__ = ({stand_in.url!r}, None)
+        print(Exchanges().get_all_positions_by_exchange())
+    ''')
+    env = {**os.environ, 'BINANCE_API_KEY': 'test', 'BINANCE_API_SECRET': 'test', 'EXCHANGE_TIMEOUT': '1',
+           'HTTP_READ_TIMEOUT': '60', 'HTTP_CACHE': 'false'}
+    for credential in ['COINBASE_API_KEY', 'NEWTON_CLIENT_ID', 'KUCOIN_API_KEY']:
+        env.pop(credential, None)
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '{}'
+    assert time.monotonic() - start < 10
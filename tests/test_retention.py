@@ -0,0 +1,141 @@
+from typing import Dict
+
+import numpy as np
+import pytest
+
+import firestore
+from firestore import FireStore
+from firestore.retention import DEFAULT_POLICY, RetentionTier, compact, parse_policy
+from firestore.rollup import DAY, HOUR
+
+MINUTE = 60
+# Half an hour past midnight, so the hour bucket holding the 7 day boundary is only half aged
+NOW = 200 * DAY + 30 * MINUTE
+
+
+def series(start: int, end: int, step: int):
+    timestamps = np.arange(start, end, step, dtype=np.int64)
+    return timestamps, np.arange(len(timestamps), dtype=np.float64)
+
+
+def apply(timestamps, values, compaction) -> Dict[int, float]:
+    points = dict(zip(timestamps.tolist(), values.tolist()))
+    for t in compaction.deletes.tolist():
+        del points[t]
+    points.update(compaction.writes)
+    return points
+
+
+def test_parse_policy():
+    assert parse_policy('90d:1d, 7d:1h') == DEFAULT_POLICY
+    assert parse_policy('30m:5m') == [RetentionTier(30 * MINUTE, 5 * MINUTE)]
+
+
+def test_empty():
+    compaction = compact(np.empty(0), np.empty(0), DEFAULT_POLICY, NOW)
+    assert len(compaction.deletes) == 0 and compaction.writes == {}
+
+
+def test_recent_points_are_kept():
+    timestamps, values = series(NOW - 7 * DAY + 30 * MINUTE, NOW, 15 * MINUTE)
+    compaction = compact(timestamps, values, DEFAULT_POLICY, NOW)
+    assert len(compaction.deletes) == 0 and compaction.writes == {}
+
+
+def test_hourly_tier_boundary():
+    timestamps, values = series(NOW - 8 * DAY, NOW, 15 * MINUTE)
+    compaction = compact(timestamps, values, DEFAULT_POLICY, NOW)
+    boundary = NOW - 7 * DAY
+    # Only whole hours that ended before the boundary are merged
+    assert max(compaction.writes) + HOUR <= boundary
+    assert max(compaction.writes) + 2 * HOUR > boundary
+    assert compaction.deletes.max() < max(compaction.writes) + HOUR
+    # The hour straddling the boundary has points on both sides and is left alone
+    straddling = boundary // HOUR * HOUR
+    assert straddling not in compaction.writes
+    assert not np.isin(timestamps[(timestamps >= straddling) & (timestamps < straddling + HOUR)],
+                       compaction.deletes).any()
+
+
+def test_means():
+    timestamps, values = series(NOW - 8 * DAY, NOW, 15 * MINUTE)
+    compaction = compact(timestamps, values, DEFAULT_POLICY, NOW)
+    for start, mean in compaction.writes.items():
+        in_bucket = (timestamps >= start) & (timestamps < start + HOUR)
+        assert mean == pytest.approx(values[in_bucket].mean())
+    # Every merged point is either deleted or sits at the bucket's start, which is overwritten with the mean
+    merged = set(timestamps[timestamps < max(compaction.writes) + HOUR].tolist())
+    assert merged == set(compaction.deletes.tolist()) | (set(compaction.writes) & merged)
+
+
+def test_daily_tier_merges_hourly_rollups():
+    midnight = NOW // DAY * DAY
+    timestamps, values = series(midnight - 95 * DAY, midnight - 88 * DAY, HOUR)
+    compaction = compact(timestamps, values, DEFAULT_POLICY, NOW)
+    boundary = NOW - 90 * DAY
+    assert sorted(compaction.writes) == [midnight - days * DAY for days in range(95, 90, -1)]
+    # Younger than 90 days the points are already one per hour at the hour's start, so nothing is left to do
+    assert (compaction.deletes < boundary).all()
+    assert compaction.writes[midnight - 94 * DAY] == pytest.approx(values[24:48].mean())
+
+
+def test_second_pass_changes_nothing():
+    timestamps, values = series(NOW - 100 * DAY, NOW, 20 * MINUTE)
+    points = apply(timestamps, values, compact(timestamps, values, DEFAULT_POLICY, NOW))
+    again = compact(np.array(list(points)), np.array(list(points.values())), DEFAULT_POLICY, NOW)
+    assert len(again.deletes) == 0 and again.writes == {}
+
+
+def test_single_point_off_the_bucket_start_is_moved():
+    compaction = compact(np.array([NOW - 10 * DAY + 5 * MINUTE]), np.array([3.0]), DEFAULT_POLICY, NOW)
+    start = (NOW - 10 * DAY) // HOUR * HOUR
+    assert compaction.deletes.tolist() == [NOW - 10 * DAY + 5 * MINUTE]
+    assert compaction.writes == {start: 3.0}
+
+
+def history(fake_firestore) -> Dict[str, dict]:
+    return {path[-1]: data for path, data in fake_firestore.documents.items() if path[-2] == firestore.HISTORY}
+
+
+def seed(fake_firestore, timestamps, values):
+    fake_firestore.documents.clear()
+    store = FireStore('CAD')
+    for t, value in zip(timestamps.tolist(), values.tolist()):
+        store.update_historic_balances({}, t)
+        ref = ('BALANCE', 'CAD', firestore.HISTORY, firestore.shard_id(t))
+        fake_firestore.documents[ref][str(t)] = value
+    fake_firestore.batches.clear()
+    fake_firestore.writes = 0
+
+
+def test_commit_merges_once_per_shard(fake_firestore):
+    # Three months of points every 6 hours, all old enough for the daily tier
+    midnight = NOW // DAY * DAY
+    timestamps, values = series(midnight - 180 * DAY, midnight - 90 * DAY, 6 * HOUR)
+    seed(fake_firestore, timestamps, values)
+    shards = len(history(fake_firestore))
+    deleted = FireStore('CAD').compact(now=NOW)
+    # Each day keeps its midnight point, overwritten with the day's mean
+    assert deleted == 90 * 3
+    assert fake_firestore.batches == [shards]
+    points = {int(t): value for shard in history(fake_firestore).values() for t, value in shard.items()}
+    assert all(t % DAY == 0 for t in points)
+    assert points[int(timestamps[0])] == pytest.approx(values[:4].mean())
+
+
+def test_commit_splits_batches(fake_firestore, monkeypatch):
+    monkeypatch.setattr(firestore, 'MAX_BATCH_WRITES', 2)
+    timestamps, values = series(NOW - 180 * DAY, NOW - 90 * DAY, 6 * HOUR)
+    seed(fake_firestore, timestamps, values)
+    shards = len(history(fake_firestore))
+    FireStore('CAD').compact(now=NOW)
+    assert sum(fake_firestore.batches) == shards
+    assert max(fake_firestore.batches) <= 2
+    assert len(fake_firestore.batches) == (shards + 1) // 2
+
+
+def test_delete_below(fake_firestore):
+    timestamps, values = series(NOW - 3 * DAY, NOW, DAY)
+    seed(fake_firestore, timestamps, values)
+    FireStore('CAD').delete_below(1)
+    assert FireStore('CAD').get_historic_balances() == [(int(timestamps[2]), 2.0)]
@@ -0,0 +1,77 @@
+import msgpack
+import numpy as np
+
+from exchanges.interface import Position
+from firestore.snapshot import INDEX, decode, encode
+
+
+def position(symbol: str, spot: float, spot_fiat: float, margin: float = 0, margin_fiat: float = 0) -> Position:
+    return Position(symbol, 'CAD', spot, spot_fiat, margin, margin_fiat)
+
+
+def rows(snapshot):
+    return sorted((snapshot.exchanges[e], snapshot.symbols[s], *(snapshot.columns[column][i] for column in
+                                                                  ['spot_amount', 'spot_amount_in_fiat',
+                                                                   'margin_amount', 'margin_amount_in_fiat']))
+                  for i, (e, s) in enumerate(zip(snapshot.exchange, snapshot.symbol)))
+
+
+def test_round_trip():
+    positions = {
+        'Binance': {'ETH': position('ETH', 2, 6000, 1, 3000), 'BTC': position('BTC', 0.5, 25000)},
+        'KuCoin': {'ADA': position('ADA', 100, 50), 'BTC': position('BTC', 0.1, 5000)},
+    }
+    snapshot = decode(encode(positions))
+    assert rows(snapshot) == [
+        ('Binance', 'BTC', 0.5, 25000, 0, 0),
+        ('Binance', 'ETH', 2, 6000, 1, 3000),
+        ('KuCoin', 'ADA', 100, 50, 0, 0),
+        ('KuCoin', 'BTC', 0.1, 5000, 0, 0),
+    ]
+    assert snapshot.total_fiat() == 39050
+    assert snapshot.total_fiat(symbol='BTC') == 30000
+    assert snapshot.total_fiat(exchange='KuCoin') == 5050
+    assert snapshot.total_fiat(symbol='BTC', exchange='KuCoin') == 5000
+
+
+def test_symbol_indexes_are_delta_encoded_per_exchange():
+    positions = {
+        'Binance': {'ETH': position('ETH', 1, 1), 'ADA': position('ADA', 1, 1), 'DOT': position('DOT', 1, 1)},
+        'KuCoin': {'BTC': position('BTC', 1, 1), 'ETH': position('ETH', 1, 1)},
+    }
+    packed = msgpack.unpackb(encode(positions), raw=False)
+    assert packed['symbols'] == ['ADA', 'BTC', 'DOT', 'ETH']
+    # Binance: ADA, DOT, ETH -> 0, +2, +1; KuCoin restarts from its absolute first index: BTC, ETH -> 1, +2
+    assert np.frombuffer(packed['symbol_deltas'], INDEX).tolist() == [0, 2, 1, 1, 2]
+    assert np.frombuffer(packed['counts'], INDEX).tolist() == [3, 2]
+    assert rows(decode(encode(positions))) == rows(decode(encode(decode(encode(positions)).table('CAD'))))
+
+
+def test_exchange_without_positions():
+    positions = {'Binance': {'BTC': position('BTC', 1, 10)}, 'Coinbase': {}, 'KuCoin': {'ETH': position('ETH', 1, 5)}}
+    snapshot = decode(encode(positions))
+    assert snapshot.exchanges == ['Binance', 'Coinbase', 'KuCoin']
+    assert rows(snapshot) == [('Binance', 'BTC', 1, 10, 0, 0), ('KuCoin', 'ETH', 1, 5, 0, 0)]
+    assert snapshot.total_fiat(exchange='Coinbase') == 0
+
+
+def test_empty():
+    snapshot = decode(encode({}))
+    assert len(snapshot.symbol) == 0
+    assert snapshot.total_fiat() == 0
+
+
+def test_unknown_symbol_or_exchange_matches_nothing():
+    snapshot = decode(encode({'Binance': {'BTC': position('BTC', 1, 10)}}))
+    assert snapshot.total_fiat(symbol='DOGE') == 0
+    assert snapshot.total_fiat(exchange='Newton') == 0
+
+
+def test_table_round_trip():
+    positions = {'Binance': {'ETH': position('ETH', 2, 6000, 1, 3000)}, 'KuCoin': {'BTC': position('BTC', 0.1, 5000)}}
+    by_exchange = decode(encode(positions)).positions_by_exchange('CAD')
+    assert {exchange: {symbol: (p.spot_amount, p.margin_amount_in_fiat) for symbol, p in positions.items()}
+            for exchange, positions in by_exchange.items()} == {
+        'Binance': {'ETH': (2, 3000)},
+        'KuCoin': {'BTC': (0.1, 0)},
+    }
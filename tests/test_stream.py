@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+import websockets
+
+from exchanges import oracle
+from exchanges.binance import stream as stream_module
+from exchanges.binance.stream import ALL_MARKET_MINI_TICKERS, PriceStream
+from exchanges.oracle import PriceOracle
+
+SEED = [{'symbol': 'BTCUSDT', 'price': '100'}, {'symbol': 'ETHUSDT', 'price': '10'}]
+
+
+# Local stand-in for the Binance websocket: acks each subscription, then pushes one BTC tick per connection.
+# The first connection is closed right after its tick, so the client has to reconnect and subscribe again.
+class StreamStandIn:
+    def __init__(self):
+        self.subscriptions: List[dict] = []
+        self.url = None
+        self.__ready = threading.Event()
+        self.__loop = None
+        self.__stop = None
+        self.__thread = threading.Thread(target=lambda: asyncio.run(self.__serve()), daemon=True)
+
+    def start(self) -> 'StreamStandIn':
+        self.__thread.start()
+        assert self.__ready.wait(5)
+        return self
+
+    def stop(self):
+        self.__loop.call_soon_threadsafe(self.__stop.set_result, None)
+        self.__thread.join(5)
+
+    async def __serve(self):
+        self.__loop = asyncio.get_running_loop()
+        self.__stop = self.__loop.create_future()
+        async with websockets.serve(self.__handle, '127.0.0.1', 0) as server:
+            self.url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            self.__ready.set()
+            await self.__stop
+
+    async def __handle(self, socket):
+        subscription = json.loads(await socket.recv())
+        self.subscriptions.append(subscription)
+        await socket.send(json.dumps({'result': None, 'id': subscription['id']}))
+        price = 100 * (len(self.subscriptions) + 1)
+        await socket.send(json.dumps([{'e': '24hrMiniTicker', 's': 'BTCUSDT', 'c': str(price)}]))
+        if len(self.subscriptions) == 1:
+            return
+        await socket.wait_closed()
+
+
+@pytest.fixture
+def stream_stand_in():
+    server = StreamStandIn().start()
+    yield server
+    server.stop()
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_stream_seeds_subscribes_and_resubscribes(stream_stand_in):
+    seeds = []
+    stream = PriceStream(seed=lambda: seeds.append(1) or SEED, url=stream_stand_in.url, max_backoff=1)
+    stream.start()
+    try:
+        assert stream.wait_ready(5)
+        wait_for(lambda: stream.price_book().price('BTCUSDT') == 200)
+        # Symbols that didn't tick keep their seeded price
+        assert stream.price_book().to_usdt('ETH') == 10
+        assert stream_stand_in.subscriptions[0] == {'method': 'SUBSCRIBE', 'params': [ALL_MARKET_MINI_TICKERS],
+                                                    'id': 1}
+        # The server dropped the first connection, the stream re-seeds, reconnects and subscribes again
+        wait_for(lambda: stream.price_book().price('BTCUSDT') == 300)
+        assert [s['id'] for s in stream_stand_in.subscriptions] == [1, 2]
+        assert all(s['params'] == [ALL_MARKET_MINI_TICKERS] for s in stream_stand_in.subscriptions)
+        assert len(seeds) == 2
+        assert stream.is_fresh()
+    finally:
+        stream.stop()
+    assert 'binance-stream' not in [thread.name for thread in threading.enumerate()]
+
+
+def test_stop_before_connecting():
+    stream = PriceStream(url='ws://127.0.0.1:9')
+    stream.start()
+    stream.stop()
+    assert 'binance-stream' not in [thread.name for thread in threading.enumerate()]
+
+
+def test_oracle_falls_back_to_rest_when_the_stream_is_stale(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(stream_module, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    rest = []
+    monkeypatch.setattr(oracle, 'get_binance_ticker',
+                        lambda: rest.append(1) or [{'symbol': 'BTCUSDT', 'price': '50'}])
+    prices = PriceOracle()
+    # Without ticks yet the stream isn't trusted
+    stream = PriceStream()
+    prices.use_stream(stream)
+    assert prices.price_book().price('BTCUSDT') == 50
+
+    stream.update({'BTCUSDT': 200.0})
+    assert prices.price_book().price('BTCUSDT') == 200
+    assert prices.price_book() is prices.price_book()
+    assert asyncio.run(prices.aprice_book()).price('BTCUSDT') == 200
+
+    clock.now += stream_module.STREAM_MAX_AGE + 1
+    assert not stream.is_fresh()
+    assert prices.price_book().price('BTCUSDT') == 50
+    assert len(rest) == 1
@@ -0,0 +1,75 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import slack
+from exchanges import aggregate_positions
+from exchanges.interface import Position
+from exchanges.table import PositionTable
+
+POSITIONS = {
+    'BINANCE': {'BTC': Position('BTC', 'CAD', 2, 60, 0, 0), 'ETH': Position('ETH', 'CAD', 3, 300, 1, 15)},
+    'KUCOIN': {'ETH': Position('ETH', 'CAD', 0.5, 50, 0, 0), 'ADA': Position('ADA', 'CAD', 100, 40, 0, 0)},
+}
+
+
+def test_from_positions_by_exchange():
+    table = PositionTable.of(POSITIONS)
+    assert table.fiat == 'CAD'
+    assert table.exchanges() == ['BINANCE', 'KUCOIN']
+    assert table.symbols() == ['BTC', 'ETH', 'ADA']
+    assert table.total_fiat() == 465
+    assert table.total_fiat(symbol='ETH') == 365
+    assert table.total_fiat(exchange='KUCOIN') == 90
+    assert table.total_fiat(symbol='BTC', exchange='KUCOIN') == 0
+    assert table.total_fiat(symbol='DOGE') == 0
+
+
+def test_aggregate():
+    aggregated = PositionTable.of(POSITIONS).aggregate()
+    assert aggregated.exchanges() == ['ALL']
+    positions = aggregated.positions()
+    assert list(positions) == ['BTC', 'ETH', 'ADA']
+    eth = positions['ETH']
+    assert (eth.spot_amount, eth.spot_amount_in_fiat, eth.margin_amount, eth.margin_amount_in_fiat) == (3.5, 350, 1, 15)
+    assert eth.total_fiat() == 365 and eth.total_base() == 4.5
+    assert aggregated.total_fiat() == 465
+    assert [p.to_dict() for p in aggregate_positions(POSITIONS)] == [p.to_dict() for p in positions.values()]
+
+
+def test_views_write_through_to_the_table():
+    table = PositionTable.of(POSITIONS)
+    eth = table.positions_by_exchange()['KUCOIN']['ETH']
+    assert eth.symbol == 'ETH' and eth.fiat == 'CAD'
+    eth.spot_amount_in_fiat = 80
+    assert table.total_fiat(exchange='KUCOIN') == 120
+    assert table.positions(exchange='KUCOIN')['ETH'].spot_amount_in_fiat == 80
+    # The BINANCE ETH row is untouched
+    assert table.positions(exchange='BINANCE')['ETH'].spot_amount_in_fiat == 300
+
+
+def test_slack_summary_prints_whole_amounts_without_decimals(monkeypatch):
+    posted = []
+
+    def post(url, data, **kwargs):
+        posted.append(json.loads(data))
+        return SimpleNamespace(status_code=200, text='ok')
+    monkeypatch.setattr(slack.TRANSPORT, 'post', post)
+    slack.Slack('http://localhost').publish_all_positions_by_exchange(POSITIONS)
+    lines = posted[0]['blocks'][0]['text']['text'].strip('`').split('\n')
+    assert [line.split() for line in lines[1:5]] == [['BTC', 'Fiat', '60'], ['Spot', '2'], ['Margin', '0'],
+                                                    ['Total', '2']]
+    assert ['Spot', '0.5'] in [line.split() for line in lines]
+    assert lines[-1].split() == ['Total', '$465', 'CAD']
+
+
+def test_empty_table():
+    table = PositionTable.of({})
+    assert len(table) == 0 and table.total_fiat() == 0
+    assert table.aggregate().positions() == {}
+
+
+@pytest.mark.parametrize('value, printed', [(2.0, '2'), (0.0, '0'), (0.12345, '0.12345'), (1e-05, '1e-05')])
+def test_number(value, printed):
+    assert str(slack._number(value)) == printed